@@ -1,30 +1,20 @@
+import asyncio
 import logging
 import json
 import os
-from google.oauth2 import service_account
-from vertexai import init
+import threading
 from abc import ABCMeta, abstractmethod
 import dotenv
 from pathlib import Path
-try:
-    import tomllib  # Python 3.11+
-except ImportError:
-    import tomli as tomllib  # Fallback for older Python versions
-from typing import Optional
+from typing import Iterator, Optional
+from backend.agents.client_pool import client_pool
+from backend.agents.prompt_registry import prompt_registry
 from backend.utils.logging_config import get_module_logger
+from backend.utils.request_timing import span
 # from google.cloud import aiplatform
 
 # from anthropic import Anthropic, APIStatusError, APIConnectionError
 
-try:
-    import vertexai
-    from vertexai.generative_models import GenerativeModel
-    VERTEX_AI_AVAILABLE = True
-except ImportError:
-    vertexai = None
-    GenerativeModel = None
-    VERTEX_AI_AVAILABLE = False
-
 # from src.media_lens.common import LOGGER_NAME, AI_PROVIDER, ANTHROPIC_MODEL, VERTEX_AI_PROJECT_ID, VERTEX_AI_LOCATION, VERTEX_AI_MODEL
 
 logger = get_module_logger('agent')
@@ -33,18 +23,37 @@ class Agent(metaclass=ABCMeta):
     """
     Base class for all agents.
     """
+    _shared_agents = {}
+    _shared_lock = threading.Lock()
+
     def __init__(self, system_prompt: str):
         self.system_prompt = system_prompt
 
     @abstractmethod
-    def invoke(self, user_prompt: str, chat_context:str, doc_context:str) -> str:
+    def invoke(self, user_prompt: str, chat_context:str, doc_context:str, system_prompt: Optional[str] = None) -> str:
         """
         Send the prompts to the LLM and return the response.
         :param user_prompt: specific user prompt
+        :param system_prompt: per-call system prompt, overrides the one the agent was built with
         :return: text of response
         """
         pass
 
+    async def ainvoke(self, user_prompt: str, chat_context:str, doc_context:str, system_prompt: Optional[str] = None) -> str:
+        """
+        Async variant of invoke. Agents without a native async client run invoke in a worker thread.
+        :return: text of response
+        """
+        return await asyncio.to_thread(self.invoke, user_prompt, chat_context, doc_context, system_prompt=system_prompt)
+
+    def stream(self, user_prompt: str, chat_context:str, doc_context:str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        """
+        Send the prompts to the LLM and yield the response text as it is generated.
+        Agents without native streaming yield the full response as a single chunk.
+        :return: iterator over text chunks
+        """
+        yield self.invoke(user_prompt, chat_context, doc_context, system_prompt=system_prompt)
+
     @property
     @abstractmethod
     def model(self) -> str:
@@ -59,19 +68,7 @@ class Agent(metaclass=ABCMeta):
         """
         Helper method to load and format the prompt. Assumes prompt_ref = "name:vers"
         """
-        if not prompt_dir_path.is_dir():
-            raise NotADirectoryError(f"Prompt directory not found: {prompt_dir_path}")
-
-        fname, vers = prompt_ref.split(":")
-        with open(str(prompt_dir_path / f"{fname}.toml"), 'rb') as file:
-            toml_content = tomllib.load(file)
-
-        if vers == "latest":
-            versions = [key for key in toml_content.keys() if key.startswith('v')]
-            version = max(versions, key=lambda v: int(v[1:]))
-        else:
-            version = f"v{vers}"
-        return toml_content[version]
+        return prompt_registry.resolve(prompt_ref, prompt_dir_path)
 
     @classmethod
     def get_agent(cls, agent_type: str, prompt_name: str, flag: int) -> "Agent":
@@ -83,6 +80,22 @@ class Agent(metaclass=ABCMeta):
             agent: Agent = GoogleVertexAIAgent(prompt_name, os.getenv("GOOGLE_CLOUD_PROJECT"), os.getenv("GEMINI_LOCATION"), os.getenv("GEMINI_PRO_2_5_ID"), flag)
             return agent
 
+    @classmethod
+    def get_shared_agent(cls, agent_type: str) -> "Agent":
+        """
+        Return the process-wide agent for agent_type. It has no system prompt of its own;
+        callers pass one to invoke() on every call.
+        """
+        with span("agent"):
+            agent = cls._shared_agents.get(agent_type)
+            if agent is None:
+                with cls._shared_lock:
+                    agent = cls._shared_agents.get(agent_type)
+                    if agent is None:
+                        agent = cls.get_agent(agent_type, "", 0)
+                        cls._shared_agents[agent_type] = agent
+            return agent
+
 # class ClaudeLLMAgent(Agent):
 #     """
 #     Anthropic Claude LLM agent.
@@ -125,41 +138,39 @@ class GoogleVertexAIAgent(Agent):
     """
     Google Vertex AI LLM agent.
     """
+    GENERATION_CONFIG = {
+        "temperature": 0.3,
+        "max_output_tokens": 20000,  # Increased from 4096, still well under 64K limit
+    }
+
     def __init__(self, prompt_name: str, project_id: str, location: str, model: str, flag: int):
         if flag == 1:
             system_prompt = self._load_system_prompt(prompt_name, Path("backend/config/prompts"))
         else:
             system_prompt = prompt_name
         super().__init__(system_prompt)
-        if not VERTEX_AI_AVAILABLE:
-            raise ImportError("google-cloud-aiplatform package is required for Google Vertex AI support")
-        logger.info("attempting to load Google Vertex AI")
-        credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
-        if credentials_json:
-            logger.info("successfully loading Google Vertex AI credentials")
-            credentials_info = json.loads(credentials_json)
-            credentials = service_account.Credentials.from_service_account_info(credentials_info)
-            # Initialize Vertex AI with explicit credentials
-            init(project=project_id, credentials=credentials, location=location)
-        else:
-            logger.warning("failed to load Google Vertex AI credentials")
-        self.client = GenerativeModel(model)
+        # Credentials, vertexai.init and the GenerativeModel are shared process-wide
+        self.client = client_pool.get_client(project_id, location, model)
         self._model = model
 
-    def invoke(self, user_prompt: str, chat_context:str, doc_context:str) -> str:
-        try:
-            # Combine system and user prompts for Vertex AI
+    def _build_full_prompt(self, user_prompt: str, chat_context:str, doc_context:str, system_prompt: Optional[str]) -> str:
+        # Combine system and user prompts for Vertex AI
+        if system_prompt is None:
+            system_prompt = self.system_prompt
 
-            # TODO   change this to use placeholder vs concatenating
-            full_prompt = f"{self.system_prompt.format(chat=chat_context, doc=doc_context)}\n\n{user_prompt}"
+        # TODO   change this to use placeholder vs concatenating
+        return f"{system_prompt.format(chat=chat_context, doc=doc_context)}\n\n{user_prompt}"
 
-            response = self.client.generate_content(
-                full_prompt,
-                generation_config={
-                    "temperature": 0.3,
-                    "max_output_tokens": 20000,  # Increased from 4096, still well under 64K limit
-                }
-            )
+    def invoke(self, user_prompt: str, chat_context:str, doc_context:str, system_prompt: Optional[str] = None) -> str:
+        try:
+            with span("format_prompt"):
+                full_prompt = self._build_full_prompt(user_prompt, chat_context, doc_context, system_prompt)
+
+            with span("vertex"):
+                response = self.client.generate_content(
+                    full_prompt,
+                    generation_config=self.GENERATION_CONFIG
+                )
 
             logger.debug(f"Vertex AI raw response: {response.text}")
             logger.debug(f".. response: {len(response.text)} bytes / {len(response.text.split())} words")
@@ -170,6 +181,59 @@ class GoogleVertexAIAgent(Agent):
             logger.error(f"Vertex AI API error: {str(e)}")
             raise
 
+    async def ainvoke(self, user_prompt: str, chat_context:str, doc_context:str, system_prompt: Optional[str] = None) -> str:
+        try:
+            with span("format_prompt"):
+                full_prompt = self._build_full_prompt(user_prompt, chat_context, doc_context, system_prompt)
+
+            with span("vertex"):
+                response = await self.client.generate_content_async(
+                    full_prompt,
+                    generation_config=self.GENERATION_CONFIG
+                )
+
+            logger.debug(f".. response: {len(response.text)} bytes / {len(response.text.split())} words")
+
+            return response.text
+
+        except Exception as e:
+            logger.error(f"Vertex AI API error: {str(e)}")
+            raise
+
+    def stream(self, user_prompt: str, chat_context:str, doc_context:str, system_prompt: Optional[str] = None) -> Iterator[str]:
+        try:
+            with span("format_prompt"):
+                full_prompt = self._build_full_prompt(user_prompt, chat_context, doc_context, system_prompt)
+
+            with span("vertex"):
+                responses = iter(self.client.generate_content(
+                    full_prompt,
+                    generation_config=self.GENERATION_CONFIG,
+                    stream=True
+                ))
+
+            total_chars = 0
+            while True:
+                # Only the wait for the next chunk is upstream time, not the caller's work between chunks
+                with span("vertex"):
+                    response = next(responses, None)
+                if response is None:
+                    break
+                # Chunks without candidates (e.g. trailing usage metadata) have no text
+                try:
+                    text = response.text
+                except ValueError:
+                    continue
+                if text:
+                    total_chars += len(text)
+                    yield text
+
+            logger.debug(f"Vertex AI streamed response: {total_chars} bytes")
+
+        except Exception as e:
+            logger.error(f"Vertex AI API error: {str(e)}")
+            raise
+
     @property
     def model(self) -> str:
         return self._model
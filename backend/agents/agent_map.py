@@ -1,3 +1,58 @@
+from typing import Dict, Optional, Set, Tuple
+
+# Earlier stages whose document sections (and story facts) each stage needs in its prompt,
+# by stage id (prompt name). The stage's own section is always included. Stages not listed
+# here get every section, nearest stages first.
+STAGE_RELEVANCE: Dict[str, Tuple[str, ...]] = {
+    "big_idea": (),
+    "working_title": ("big_idea",),
+    "genre": ("big_idea", "working_title"),
+    "main_vibe": ("big_idea", "genre"),
+    "one_sentence_pitch": ("big_idea", "working_title", "genre", "main_vibe"),
+
+    "setting": ("big_idea", "genre", "main_vibe", "one_sentence_pitch"),
+    "time_period": ("genre", "setting"),
+    "map": ("setting", "time_period"),
+    "environment": ("setting", "map"),
+    "magic_exist": ("big_idea", "genre", "setting"),
+
+    "magic_rules": ("genre", "setting", "magic_exist"),
+    "history": ("setting", "time_period", "magic_rules"),
+    "cultures": ("setting", "environment", "history"),
+    "government": ("history", "cultures"),
+    "everyday_life": ("setting", "time_period", "magic_rules", "cultures", "government"),
+    "creatures": ("setting", "environment", "magic_rules"),
+    "plants_resources": ("map", "environment", "creatures"),
+
+    "hero": ("big_idea", "one_sentence_pitch", "setting", "cultures"),
+    "hero_goal": ("one_sentence_pitch", "hero"),
+    "hero_obstacle": ("setting", "government", "hero", "hero_goal"),
+    "villain": ("one_sentence_pitch", "government", "hero", "hero_goal", "hero_obstacle"),
+    "villain_motive": ("hero", "villain"),
+    "ally": ("hero", "hero_goal", "villain"),
+    "other_chars": ("cultures", "hero", "villain", "ally"),
+    "char_secrets": ("hero", "villain", "villain_motive", "ally", "other_chars"),
+
+    "story_shape": ("genre", "one_sentence_pitch", "hero_goal"),
+    "inciting_incident": ("hero", "hero_goal", "villain", "story_shape"),
+    "turning_point1": ("hero", "hero_obstacle", "story_shape", "inciting_incident"),
+    "midpoint": ("hero", "villain", "char_secrets", "story_shape", "turning_point1"),
+    "turning_point2": ("hero", "villain", "ally", "story_shape", "midpoint"),
+    "climax": ("magic_rules", "hero", "hero_goal", "villain", "villain_motive", "story_shape", "turning_point2"),
+    "resolution": ("main_vibe", "hero", "hero_goal", "climax"),
+
+    "stakes": ("hero_goal", "villain_motive", "inciting_incident", "climax"),
+    "theme": ("big_idea", "main_vibe", "hero", "villain_motive", "resolution"),
+    "subplots": ("ally", "other_chars", "char_secrets", "story_shape"),
+    "foreshadowing": ("magic_rules", "char_secrets", "midpoint", "climax"),
+
+    "pov": ("genre", "main_vibe", "hero", "other_chars"),
+    "tone": ("genre", "main_vibe", "theme"),
+    "audience": ("genre", "main_vibe", "tone"),
+    "length_goal": ("genre", "story_shape", "subplots", "audience"),
+}
+
+
 class AgentMap:
     def __init__(self):
         prompt_list = [
@@ -66,7 +121,22 @@ class AgentMap:
             agent_map[i] = prompt
             i = i + 1
         self.stage_map = agent_map
+        self.stage_numbers = {prompt.split(":")[0]: number for number, prompt in agent_map.items()}
 
     def get_prompt(self, stage: int):
         return self.stage_map[stage]
 
+    def stage_id(self, stage: int) -> str:
+        """The stage's prompt name without its version, e.g. "villain_motive"."""
+        return self.stage_map[stage].split(":")[0]
+
+    def relevant_stages(self, stage: int) -> Optional[Set[int]]:
+        """
+        Stage numbers whose sections stage needs in its prompt (itself included), or None if
+        it needs all of them (see STAGE_RELEVANCE).
+        """
+        relevant = STAGE_RELEVANCE.get(self.stage_id(stage)) if stage in self.stage_map else None
+        if relevant is None:
+            return None
+        return {stage} | {self.stage_numbers[stage_id] for stage_id in relevant}
+
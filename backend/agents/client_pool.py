@@ -0,0 +1,127 @@
+"""
+Vertex AI Client Pool for WorldWeaver
+
+Builds Vertex AI credentials, runs vertexai.init and constructs GenerativeModel clients
+once per process, keyed by (model, location), so that every request reuses the same
+client (and its underlying connections and auth tokens) instead of renegotiating them.
+
+The Vertex AI and Google auth SDKs are imported on first use, not at import time, so
+stub mode and processes that never call the model do not pay for them at startup.
+"""
+import json
+import os
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('client_pool')
+
+_vertex_sdk: Optional[SimpleNamespace] = None
+_vertex_sdk_lock = threading.Lock()
+
+
+def vertex_sdk() -> SimpleNamespace:
+    """
+    Import the Vertex AI and Google auth SDKs on first use.
+
+    Returns:
+        Namespace with init, GenerativeModel and service_account
+    """
+    global _vertex_sdk
+    if _vertex_sdk is None:
+        with _vertex_sdk_lock:
+            if _vertex_sdk is None:
+                try:
+                    from google.oauth2 import service_account
+                    from vertexai import init
+                    from vertexai.generative_models import GenerativeModel
+                except ImportError as e:
+                    raise ImportError("google-cloud-aiplatform package is required for Google Vertex AI support") from e
+                _vertex_sdk = SimpleNamespace(init=init, GenerativeModel=GenerativeModel, service_account=service_account)
+    return _vertex_sdk
+
+
+class VertexClientPool:
+    """
+    Process-wide cache of GenerativeModel clients.
+
+    The system prompt is not part of the client; agents pass it with every call, so a
+    single client per (model, location) serves every stage.
+    """
+
+    def __init__(self, model_factory: Optional[Callable[[str], Any]] = None):
+        """
+        Args:
+            model_factory: Callable building a client from a model name. Defaults to
+                vertexai's GenerativeModel; a fake can be passed to count constructions
+        """
+        self._model_factory = model_factory
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._credentials_loaded = False
+        self._initialized_target: Optional[Tuple[str, str]] = None
+        self.created_count = 0
+
+    def get_client(self, project_id: str, location: str, model: str):
+        """Return the shared client for (model, location), building it on first use."""
+        key = (model, location)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create_client(project_id, location, model)
+                self._clients[key] = client
+        return client
+
+    def clear(self):
+        """Drop every cached client (credentials are kept)."""
+        with self._lock:
+            self._clients.clear()
+            self._initialized_target = None
+
+    def _create_client(self, project_id: str, location: str, model: str):
+        if self._model_factory is not None:
+            factory = self._model_factory
+        else:
+            self._init_vertex(project_id, location)
+            factory = vertex_sdk().GenerativeModel
+
+        logger.info(f"Creating Vertex AI client for model {model} ({location})")
+        client = factory(model)
+        self.created_count += 1
+        return client
+
+    def _init_vertex(self, project_id: str, location: str):
+        # vertexai.init sets global state that GenerativeModel reads at construction time,
+        # so it only needs to run again when a client for a different target is built
+        if self._initialized_target == (project_id, location):
+            return
+
+        credentials = self._load_credentials()
+        if credentials is not None:
+            vertex_sdk().init(project=project_id, credentials=credentials, location=location)
+        self._initialized_target = (project_id, location)
+
+    def _load_credentials(self):
+        if self._credentials_loaded:
+            return self._credentials
+
+        logger.info("attempting to load Google Vertex AI")
+        credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
+        if credentials_json:
+            logger.info("successfully loading Google Vertex AI credentials")
+            credentials_info = json.loads(credentials_json)
+            self._credentials = vertex_sdk().service_account.Credentials.from_service_account_info(credentials_info)
+        else:
+            logger.warning("failed to load Google Vertex AI credentials")
+        self._credentials_loaded = True
+        return self._credentials
+
+
+# Global pool instance
+client_pool = VertexClientPool()
@@ -0,0 +1,228 @@
+"""
+Context Assembler for WorldWeaver
+
+The frontend sends the whole chat history and the whole TipTap document on every turn, and
+both end up in the stage prompt through {chat} and {doc}. ContextAssembler fits them into a
+per-stage token budget (backend/config/context_budget.toml) so prompt size stops growing with
+the session:
+
+- chat: the history is normalized to "role: text" turns (backend/utils/chat_history.py) and
+  the most recent turns are kept, newest first, until the budget is used; older turns
+  are dropped (the newest turn is truncated rather than dropped if it alone is too large)
+- summaries of other completed stages (see stage_summarizer.py) go before the chat, under
+  their own budget: the stages nearest the current stage are kept first, and kept summaries
+  are emitted in stage order
+- doc: the document is rendered as compact text (backend/utils/tiptap_text.py) and split
+  into "Stage N: ..." sections at its headings (see section_index.py); the current stage's
+  section is kept first, then the preamble, then the other stages nearest the current stage
+  first. Stages listed in STAGE_RELEVANCE (agent_map.py) only get the sections of the stages
+  they need. The first section that does not fit is truncated, anything after it is
+  dropped, and the kept sections are emitted in document order.
+
+Selection depends only on the inputs, so the same request always produces the same context.
+"""
+import os
+from pathlib import Path
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib  # Fallback for older Python versions
+from typing import Any, Dict, List, Optional, Set, Tuple
+from backend.agents.agent_map import AgentMap
+from backend.agents.section_index import SectionIndex
+from backend.utils.chat_history import history_lines
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('context_assembler')
+
+BUDGET_PATH = Path(__file__).resolve().parents[2] / "backend" / "config" / "context_budget.toml"
+DEFAULT_BUDGET = {"chat_tokens": 3000, "doc_tokens": 4000, "summary_tokens": 1500,
+                  "story_bible_tokens": 600, "story_bible_from_stage": 18}
+
+CHARS_PER_TOKEN = 4
+# Remainders smaller than this are not worth a truncated fragment
+MIN_TRUNCATED_TOKENS = 32
+TRUNCATION_MARK = " ...[truncated]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, model-independent token estimate (about 4 characters per token)."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Keep the head of text so that the result, including the truncation mark, fits in tokens."""
+    if estimate_tokens(text) <= tokens:
+        return text
+    keep = max(tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK), 0)
+    return text[:keep].rstrip() + TRUNCATION_MARK
+
+
+class AssembledContext:
+    """Budgeted chat/doc context plus what was left out."""
+    __slots__ = ("chat", "doc", "chat_tokens", "doc_tokens", "summary_tokens", "summaries",
+                 "dropped_messages", "dropped_sections")
+
+    def __init__(self, chat: str, doc: str, dropped_messages: int = 0, dropped_sections: int = 0,
+                 summary_tokens: int = 0, summaries: int = 0):
+        self.chat = chat
+        self.doc = doc
+        # chat_tokens includes the stage summaries at the start of chat
+        self.chat_tokens = estimate_tokens(chat)
+        self.doc_tokens = estimate_tokens(doc)
+        self.summary_tokens = summary_tokens
+        self.summaries = summaries
+        self.dropped_messages = dropped_messages
+        self.dropped_sections = dropped_sections
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chat_tokens": self.chat_tokens,
+            "doc_tokens": self.doc_tokens,
+            "summary_tokens": self.summary_tokens,
+            "summaries": self.summaries,
+            "dropped_messages": self.dropped_messages,
+            "dropped_sections": self.dropped_sections,
+        }
+
+
+class ContextAssembler:
+    """Fits chat history and document context into a per-stage token budget."""
+
+    def __init__(self, budget_path: Path = None):
+        self.budget_path = Path(budget_path) if budget_path else Path(os.getenv('CONTEXT_BUDGET_PATH', BUDGET_PATH))
+        self._default, self._stages = self._load_budgets()
+        self.agent_map = AgentMap()
+
+    def _load_budgets(self) -> Tuple[Dict[str, int], Dict[int, Dict[str, int]]]:
+        try:
+            with open(self.budget_path, 'rb') as f:
+                config = tomllib.load(f)
+        except FileNotFoundError:
+            logger.warning(f"No context budget file at {self.budget_path}; using defaults")
+            return dict(DEFAULT_BUDGET), {}
+        default = dict(DEFAULT_BUDGET, **config.get("default", {}))
+        stages = {int(stage): dict(default, **values) for stage, values in config.get("stages", {}).items()}
+        return default, stages
+
+    def budget(self, stage: int) -> Dict[str, int]:
+        return self._stages.get(stage, self._default)
+
+    def assemble(self, stage: int, chat_history: Any, document: Any,
+                 summaries: Optional[Dict[int, str]] = None) -> AssembledContext:
+        """
+        Args:
+            stage: Current stage number
+            chat_history: List of frontend message dicts (or its JSON), or already-rendered text
+            document: TipTap JSON document (dict or JSON string), its SectionIndex, or plain text
+            summaries: Summaries of other completed stages, by stage number
+
+        Returns:
+            AssembledContext with chat and doc as prompt-ready strings
+        """
+        budget = self.budget(stage)
+        chat, dropped_messages = self.assemble_chat(chat_history, budget["chat_tokens"])
+        doc, dropped_sections = self.assemble_doc(stage, document, budget["doc_tokens"])
+        summary, kept_summaries = self.assemble_summaries(stage, summaries or {}, budget["summary_tokens"])
+        if summary:
+            chat = f"{summary}\n{chat}" if chat else summary
+        return AssembledContext(chat, doc, dropped_messages, dropped_sections, estimate_tokens(summary), kept_summaries)
+
+    # Chat ________________________________
+
+    def assemble_chat(self, chat_history: Any, max_tokens: int) -> Tuple[str, int]:
+        """Returns (chat text, number of turns dropped)."""
+        lines = history_lines(chat_history)
+        if lines is None:
+            text = "" if chat_history is None else str(chat_history)
+            if estimate_tokens(text) <= max_tokens:
+                return text, 0
+            # Plain-text history: the end is the most recent part
+            keep = max(max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK), 0)
+            return TRUNCATION_MARK.strip() + " " + text[len(text) - keep:].lstrip(), 0
+
+        kept: List[str] = []
+        remaining = max_tokens
+        for line in reversed(lines):
+            cost = estimate_tokens(line) + 1  # + newline
+            if cost <= remaining:
+                kept.append(line)
+                remaining -= cost
+            elif not kept:
+                # Never drop the latest turn entirely
+                kept.append(truncate_to_tokens(line, remaining))
+                remaining = 0
+            else:
+                break
+
+        dropped = len(lines) - len(kept)
+        kept.reverse()
+        if dropped:
+            kept.insert(0, f"[{dropped} earlier messages omitted]")
+        return "\n".join(kept), dropped
+
+    # Stage summaries ________________________________
+
+    def assemble_summaries(self, stage: int, summaries: Dict[int, str], max_tokens: int) -> Tuple[str, int]:
+        """Returns (summaries text, number of summaries kept)."""
+        kept: Dict[int, str] = {}
+        remaining = max_tokens
+        for summarized in sorted(summaries, key=lambda s: (abs(s - stage), s)):
+            line = f"[Stage {summarized} summary] {summaries[summarized]}"
+            cost = estimate_tokens(line) + 1
+            if cost > remaining:
+                break
+            kept[summarized] = line
+            remaining -= cost
+        return "\n".join(kept[s] for s in sorted(kept)), len(kept)
+
+    # Document ________________________________
+
+    def assemble_doc(self, stage: int, document: Any, max_tokens: int) -> Tuple[str, int]:
+        """Returns (document text, number of sections dropped)."""
+        index = document if isinstance(document, SectionIndex) else SectionIndex.build(document)
+        if index is None:
+            text = "" if document is None else str(document)
+            return truncate_to_tokens(text, max_tokens), 0
+
+        sections = index.sections()
+        relevant = self.agent_map.relevant_stages(stage)
+        order = sorted(
+            (i for i in range(len(sections)) if self._is_relevant(sections[i][0], relevant)),
+            key=lambda i: self._section_priority(sections[i][0], stage, i)
+        )
+
+        chosen: Dict[int, str] = {}
+        remaining = max_tokens
+        for i in order:
+            text = sections[i][1]
+            cost = estimate_tokens(text) + 1
+            if cost <= remaining:
+                chosen[i] = text
+                remaining -= cost
+                continue
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                chosen[i] = truncate_to_tokens(text, remaining - 1)
+            break
+
+        dropped = len(sections) - len(chosen)
+        doc = "\n".join(chosen[i] for i in sorted(chosen))
+        if dropped:
+            doc += f"\n[{dropped} document sections omitted]"
+        return doc, dropped
+
+    @staticmethod
+    def _is_relevant(section_stage: Optional[int], relevant: Optional[Set[int]]) -> bool:
+        return relevant is None or section_stage is None or section_stage in relevant
+
+    @staticmethod
+    def _section_priority(section_stage: Optional[int], stage: int, index: int) -> Tuple[int, int, int]:
+        if section_stage == stage:
+            return (0, 0, index)
+        if section_stage is None:
+            return (1, 0, index)
+        return (2, abs(section_stage - stage), index)
+
+
+# Global assembler instance
+context_assembler = ContextAssembler()
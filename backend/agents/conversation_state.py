@@ -0,0 +1,458 @@
+"""
+Server-side conversation state for WorldWeaver
+
+The server keeps each conversation's chat messages (one ordered list per stage, as the
+planner shows them) and its current planning document, so a chat turn only has to upload
+the new user message, the revision the client last saw, and the document if it changed.
+
+Every change bumps the conversation's revision. A client whose revision does not match the
+server's (a second tab, a lost turn, a server that lost its state) is asked to resync by
+uploading its full history and document once.
+
+Once the server has the document, a changed document is sent as block-level operations
+against it (see backend/utils/document_delta.py) rather than in full. Operations that do not
+fit the server's copy are answered with the same resync.
+
+Completed stages also get a short summary (see stage_summarizer.py), kept with the state
+but outside the revision sequence: the client never sends or receives them. The facts each
+stage inserted into the document are kept as well, for the story bible (see story_bible.py).
+
+State lives in CONVERSATION_STATE_DIR (default <tmp>/worldweaver_state) so every worker
+process sees it: one append-only JSONL log of operations per conversation, replayed
+incrementally by each process and compacted into a single snapshot line once it grows long.
+Appends are serialized across processes with an advisory file lock where available.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from backend.agents.section_index import SectionIndex
+from backend.agents.story_bible import document_fact
+from backend.utils.document_delta import DeltaError, apply_ops, block_count
+from backend.utils.logging_config import get_module_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+logger = get_module_logger('conversation_state')
+
+_REPLACE = "replace"
+_APPEND = "append"
+_SUMMARY = "summary"
+
+
+class RevisionMismatch(Exception):
+    """The client's revision is not the server's; the client has to resync."""
+
+    def __init__(self, conversation_id: str, expected: Optional[int], revision: int, reason: str = "revision"):
+        super().__init__(f"Conversation {conversation_id} is at revision {revision}, client sent {expected} ({reason})")
+        self.revision = revision
+        # "revision", or "document" when the client's document operations did not apply
+        self.reason = reason
+
+
+class ConversationState:
+    """A conversation's messages, summaries and story facts per stage and current document, at a revision."""
+
+    __slots__ = ("conversation_id", "revision", "messages", "summaries", "facts", "document", "_index",
+                 "_ops", "_offset", "_inode")
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.revision = 0
+        self.messages: Dict[str, List[Any]] = {}
+        self.summaries: Dict[str, str] = {}
+        self.facts: Dict[str, str] = {}
+        self.document: Any = ""
+        self._index: Optional[SectionIndex] = None
+        # Operations since the last snapshot, and how far into the log file this process has read
+        self._ops = 0
+        self._offset = 0
+        self._inode = None
+
+    def stage_messages(self, stage: int) -> List[Any]:
+        return self.messages.get(str(stage), [])
+
+    def other_summaries(self, stage: int) -> Dict[int, str]:
+        """Summaries of every stage but stage (whose raw turns are used instead), by stage number."""
+        return {int(summarized): summary for summarized, summary in self.summaries.items() if int(summarized) != stage}
+
+    def story_facts(self) -> Dict[int, str]:
+        return {int(stage): fact for stage, fact in self.facts.items()}
+
+    def section_index(self) -> Optional[SectionIndex]:
+        """Stage sections of the document (None if it is not a TipTap document), kept up to date as operations arrive."""
+        if self._index is None:
+            self._index = SectionIndex.build(self.document)
+        return self._index
+
+    def _apply(self, op: Dict[str, Any]):
+        if op["op"] == _SUMMARY:
+            self.summaries[str(op["stage"])] = op["summary"]
+        elif op["op"] == _REPLACE and op.get("stage") is None:
+            # Whole-conversation snapshot (written by compaction)
+            self.messages = {stage: list(messages) for stage, messages in op["messages"].items()}
+            self.summaries = dict(op.get("summaries", {}))
+            self.facts = dict(op.get("facts", {}))
+        elif op["op"] == _REPLACE:
+            self.messages[str(op["stage"])] = list(op["messages"])
+        else:
+            self.messages.setdefault(str(op["stage"]), []).extend(op["messages"])
+            self.facts.update(op.get("facts", {}))
+        if "document" in op:
+            self.document = op["document"]
+            self._index = None
+        elif "document_ops" in op:
+            self.document = apply_ops(self.document, op["document_ops"])
+            if self._index is not None:
+                self._index = self._index.apply_ops(op["document_ops"])
+        self.revision = op["rev"]
+        self._ops += 1
+
+
+class ConversationStateStore:
+    """Revisioned conversation state shared by all worker processes through state_dir."""
+
+    def __init__(self, state_dir: Optional[str] = None, compact_after: int = None, max_cached: int = None):
+        """
+        Args:
+            state_dir: Directory for the per-conversation logs. Uses CONVERSATION_STATE_DIR env var
+                or <tmp>/worldweaver_state
+            compact_after: Rewrite a log as one snapshot after this many operations.
+                Uses CONVERSATION_STATE_COMPACT_AFTER env var or 50
+            max_cached: Conversations kept replayed in memory. Uses CONVERSATION_STATE_CACHE env var or 256
+        """
+        self.state_dir = Path(state_dir or os.getenv('CONVERSATION_STATE_DIR') or Path(tempfile.gettempdir()) / "worldweaver_state")
+        self.compact_after = compact_after if compact_after is not None else int(os.getenv('CONVERSATION_STATE_COMPACT_AFTER', '50'))
+        self.max_cached = max_cached if max_cached is not None else int(os.getenv('CONVERSATION_STATE_CACHE', '256'))
+        self._states: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dir_ready = False
+        self.resyncs = 0
+        self.mismatches = 0
+
+    def get(self, conversation_id: str) -> ConversationState:
+        """Current state of the conversation (revision 0 and empty if it has none yet)."""
+        with self._lock:
+            return self._refresh(conversation_id)
+
+    def replace(self, conversation_id: str, stage: int, messages: List[Any], document: Any) -> ConversationState:
+        """Take the client's full history for stage and its document as the new state (a resync)."""
+        with self._lock, self._file_lock(conversation_id):
+            state = self._refresh(conversation_id)
+            self._write(state, {"op": _REPLACE, "stage": stage, "messages": list(messages or []), "document": document})
+            self.resyncs += 1
+            return state
+
+    def update(self, conversation_id: str, base_revision: int, stage: int, messages: List[Any] = (),
+               document: Any = None, document_changed: bool = False,
+               document_ops: Optional[List[Dict[str, Any]]] = None, fact: Optional[str] = None) -> ConversationState:
+        """
+        Append messages to stage's history (and set the document, or apply document_ops
+        to it, and set the stage's story fact) if the conversation is still at base_revision.
+
+        Raises:
+            RevisionMismatch: another change got in first
+        """
+        with self._lock, self._file_lock(conversation_id):
+            state = self._refresh(conversation_id)
+            if state.revision != base_revision:
+                self.mismatches += 1
+                raise RevisionMismatch(conversation_id, base_revision, state.revision)
+            op = {"op": _APPEND, "stage": stage, "messages": list(messages)}
+            if fact is not None:
+                op["facts"] = {str(stage): fact}
+            if document_ops is not None:
+                # Validated against this revision's document by the caller; only the operations are logged
+                op["document_ops"] = document_ops
+            elif document_changed:
+                op["document"] = document
+            self._write(state, op)
+            return state
+
+    def set_summary(self, conversation_id: str, stage: int, summary: str) -> ConversationState:
+        """Store stage's summary. Does not change the revision, so clients stay in sync."""
+        with self._lock, self._file_lock(conversation_id):
+            state = self._refresh(conversation_id)
+            self._write(state, {"op": _SUMMARY, "stage": stage, "summary": summary}, bump=False)
+            return state
+
+    def check(self, conversation_id: str, revision: Optional[int]) -> ConversationState:
+        """
+        The conversation's state, if the client's revision matches it.
+
+        Raises:
+            RevisionMismatch: the client has to resync
+        """
+        state = self.get(conversation_id)
+        if revision is None or revision != state.revision:
+            with self._lock:
+                self.mismatches += 1
+            raise RevisionMismatch(conversation_id, revision, state.revision)
+        return state
+
+    def delete(self, conversation_id: str):
+        with self._lock:
+            self._states.pop(conversation_id, None)
+            for path in (self._path(conversation_id), self._lock_path(conversation_id)):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"cached": len(self._states), "resyncs": self.resyncs, "mismatches": self.mismatches}
+
+    # Log files ________________________________
+
+    def _path(self, conversation_id: str) -> Path:
+        # Conversation ids are uuid hex strings from the session; never let one name a path
+        return self.state_dir / f"{Path(conversation_id).name}.jsonl"
+
+    def _refresh(self, conversation_id: str) -> ConversationState:
+        """Cached state, brought up to date with anything other processes appended."""
+        state = self._states.get(conversation_id)
+        if state is None:
+            state = ConversationState(conversation_id)
+            self._states[conversation_id] = state
+            while len(self._states) > self.max_cached:
+                self._states.popitem(last=False)
+        self._states.move_to_end(conversation_id)
+
+        path = self._path(conversation_id)
+        try:
+            with open(path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != state._inode:
+                    # First read, or another process compacted the log: replay from the start
+                    fresh = ConversationState(conversation_id)
+                    fresh._inode = inode
+                    state = self._states[conversation_id] = fresh
+                f.seek(state._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Partially written by another process; read it next time
+                        break
+                    state._apply(json.loads(line))
+                    state._offset += len(line)
+        except FileNotFoundError:
+            if state._inode is not None:
+                # Deleted by another process
+                state = self._states[conversation_id] = ConversationState(conversation_id)
+        return state
+
+    def _write(self, state: ConversationState, op: Dict[str, Any], bump: bool = True):
+        op["rev"] = state.revision + 1 if bump else state.revision
+        if state._ops + 1 > self.compact_after:
+            state._apply(op)
+            self._compact(state)
+            return
+        self._ensure_dir()
+        line = json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with open(self._path(state.conversation_id), 'a', encoding='utf-8') as f:
+            f.write(line)
+            inode = os.fstat(f.fileno()).st_ino
+        if state._inode is None:
+            state._inode = inode
+        state._apply(op)
+        state._offset += len(line.encode("utf-8"))
+
+    def _compact(self, state: ConversationState):
+        """Rewrite the log as one snapshot of the current state."""
+        self._ensure_dir()
+        snapshot = {"op": _REPLACE, "stage": None, "messages": state.messages, "summaries": state.summaries,
+                    "facts": state.facts, "document": state.document, "rev": state.revision}
+        line = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")) + "\n"
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(line)
+            inode = os.fstat(f.fileno()).st_ino
+        os.replace(tmp_path, self._path(state.conversation_id))
+        state._inode = inode
+        state._offset = len(line.encode("utf-8"))
+        state._ops = 1
+
+    def _ensure_dir(self):
+        if not self._dir_ready:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            self._dir_ready = True
+
+    def _lock_path(self, conversation_id: str) -> Path:
+        return self.state_dir / f".{Path(conversation_id).name}.lock"
+
+    def _file_lock(self, conversation_id: str):
+        return _FileLock(self._lock_path(conversation_id), self._ensure_dir)
+
+
+class _FileLock:
+    """Exclusive advisory lock on a lock file, so check-and-append is atomic across processes."""
+
+    def __init__(self, path: Path, ensure_dir):
+        self.path = path
+        self.ensure_dir = ensure_dir
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        self.ensure_dir()
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        return False
+
+
+def user_message(text: str) -> Dict[str, Any]:
+    """The chat message the planner shows for the user's input."""
+    return {"id": str(uuid.uuid4()), "type": "user", "content": text, "timestamp": int(time.time() * 1000)}
+
+
+def response_messages(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The chat messages the planner adds for an /llm response payload (see LLMChatPanel.jsx)."""
+    timestamp = int(time.time() * 1000)
+
+    def assistant(text):
+        return {"id": str(uuid.uuid4()), "type": "assistant", "content": text, "timestamp": timestamp}
+
+    def tool(data):
+        data = data if isinstance(data, dict) else {}
+        return {"id": str(uuid.uuid4()), "type": "tool", "tool": data.get("tool"), "description": data.get("description"),
+                "params": data, "timestamp": timestamp}
+
+    kind = payload.get("type")
+    if kind == "message":
+        return [assistant(payload.get("text"))]
+    if kind == "tool":
+        return [tool(payload)]
+    if kind == "document":
+        return [tool(payload.get("document"))]
+    if kind == "both":
+        return [assistant(payload.get("text")), tool(payload.get("document"))]
+    return []
+
+
+class ConversationTurn:
+    """
+    One chat request against the server-side state.
+
+    Requests that carry "revision" use the server's history: revision null (or a mismatch
+    answered by a resync) uploads the full chat_history and document, otherwise only the
+    new message is sent, plus either "document" or "document_ops" (with the resulting
+    "document_length" in blocks, as a cheap check) when the document changed. Requests
+    without "revision" (older clients) carry their full context and leave the server state alone.
+
+    Summaries of the conversation's other completed stages are in .summaries, and the facts
+    completed stages put in the document in .story_facts (server state only). The prompt
+    gets .prompt_document: the server's section index of the document when it has one.
+    """
+
+    def __init__(self, store: ConversationStateStore, conversation_id: Optional[str], stage: int, data: Dict[str, Any]):
+        """
+        Raises:
+            RevisionMismatch: the client has to resync
+        """
+        self.store = store
+        self.conversation_id = conversation_id
+        self.stage = stage
+        self.chat_history = data.get('chat_history', '')
+        self.document = data.get('document', '')
+        self.document_changed = False
+        self.document_ops = None
+        self.summaries: Dict[int, str] = {}
+        self.story_facts: Dict[int, str] = {}
+        self.section_index: Optional[SectionIndex] = None
+        self.base_revision = None
+        if conversation_id is None or 'revision' not in data:
+            return
+
+        if data['revision'] is None:
+            state = store.replace(conversation_id, stage, data.get('chat_history') or [], self.document)
+            self.section_index = state.section_index()
+        else:
+            state = store.check(conversation_id, data['revision'])
+            self.chat_history = list(state.stage_messages(stage))
+            self.document_changed = 'document' in data
+            if 'document_ops' in data and not self.document_changed:
+                self.document = self._apply_document_ops(state, data)
+                base_index = state.section_index()
+                self.section_index = base_index.apply_ops(self.document_ops) if base_index is not None else None
+            elif not self.document_changed:
+                self.document = state.document
+                self.section_index = state.section_index()
+        self.summaries = state.other_summaries(stage)
+        self.story_facts = state.story_facts()
+        self.base_revision = state.revision
+
+    @property
+    def prompt_document(self) -> Any:
+        """The document for the prompt: its section index when the server keeps one, else as sent."""
+        return self.section_index if self.section_index is not None else self.document
+
+    def _apply_document_ops(self, state: ConversationState, data: Dict[str, Any]) -> Any:
+        """The server's document with the client's operations applied (it is not changed until finish)."""
+        try:
+            document = apply_ops(state.document, data['document_ops'])
+        except DeltaError as e:
+            logger.info(f"Conversation {self.conversation_id}: {e}; asking for the full document")
+            raise RevisionMismatch(self.conversation_id, data['revision'], state.revision, reason="document")
+        expected_length = data.get('document_length')
+        if expected_length is not None and expected_length != block_count(document):
+            logger.info(f"Conversation {self.conversation_id}: document has {block_count(document)} blocks "
+                        f"after the operations, client has {expected_length}; asking for the full document")
+            raise RevisionMismatch(self.conversation_id, data['revision'], state.revision, reason="document")
+        self.document_ops = data['document_ops']
+        return document
+
+    def finish(self, user_text: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record the user's message and the response in the server-side history.
+
+        Returns:
+            payload, with the conversation's new revision added when the turn was recorded
+        """
+        if self.base_revision is None:
+            return payload
+        messages = [user_message(user_text)] + response_messages(payload)
+        try:
+            state = self.store.update(self.conversation_id, self.base_revision, self.stage, messages,
+                                      self.document, self.document_changed, self.document_ops, document_fact(payload))
+        except RevisionMismatch as e:
+            # Another tab got in first; the client will be asked to resync on its next turn
+            logger.warning(f"Turn not recorded: {e}")
+            return payload
+        return dict(payload, revision=state.revision)
+
+
+def record_tutorial(store: ConversationStateStore, conversation_id: Optional[str], stage: int,
+                    data: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add a tutorial response to the stage's server-side history when the client is in sync.
+
+    Returns:
+        payload, with the conversation's new revision added when it was recorded
+    """
+    if conversation_id is None or data.get('revision') is None:
+        return payload
+    try:
+        state = store.update(conversation_id, data['revision'], stage, response_messages(payload))
+    except RevisionMismatch:
+        return payload
+    return dict(payload, revision=state.revision)
+
+
+# Global store
+conversation_state = ConversationStateStore()
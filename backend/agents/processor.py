@@ -1,14 +1,20 @@
 from pyexpat import model
+import asyncio
 
 from backend.agents.agent import Agent
 from backend.agents.agent_map import AgentMap
+from backend.agents.context_assembler import context_assembler, estimate_tokens
 from backend.agents.prompt_combiner import PromptCombiner
+from backend.agents.prompt_registry import prompt_registry
+from backend.agents.response_cache import content_hash, tutorial_cache
+from backend.agents.single_flight import llm_single_flight
+from backend.agents.story_bible import render_story_bible
+from backend.agents.tutorial_corpus import is_blank_context, tutorial_corpus
 from backend.utils.conversation_logger import conversation_logger
+from backend.utils.metrics import llm_calls_in_flight, llm_latency, prompt_size, response_size
+from backend.utils.request_timing import span
+from backend.utils.tiptap_text import compact_document
 from pathlib import Path
-try:
-    import tomllib  # Python 3.11+
-except ImportError:
-    import tomli as tomllib  # Fallback for older Python versions
 
 class Processor:
 
@@ -17,16 +23,11 @@ class Processor:
         self.agent_map = AgentMap()
         self.prompt_combiner = PromptCombiner()
 
-    def get_llm_response(self, stage:int, user_prompt:str, chat_context:str, document_context:str):
+    def get_llm_response(self, stage:int, user_prompt:str, chat_context:str, document_context:str, summaries=None, story_facts=None):
         try:
             prompt_name: str = self.agent_map.get_prompt(stage)
         except KeyError as e:
-            error_msg = f"Invalid stage: {e}"
-            conversation_logger.log_error(
-                error_type="PROCESSOR_STAGE_ERROR",
-                error_message=error_msg,
-                context={"stage": stage, "available_stages": list(self.agent_map.stage_map.keys())}
-            )
+            error_msg = self._log_stage_error(stage, e)
             return error_msg
         
         model: str = "gemini"
@@ -37,77 +38,315 @@ class Processor:
         try:
             # Get combined prompt using PromptCombiner
             combined_prompt = self.prompt_combiner.get_combined_prompt(prompt_name.split(":")[0])
+            combined_prompt, document_context = self.apply_story_bible(stage, combined_prompt, document_context, story_facts)
             
-            # Create agent with combined prompt (flag=0 to use prompt as-is, not load from file)
-            agent: Agent = Agent.get_agent(model, combined_prompt, 0)
-            
-            response = agent.invoke(user_prompt, chat_context, document_context)
+            # Reuse the process-wide agent; the combined prompt is passed per call
+            agent: Agent = Agent.get_shared_agent(model)
+
+            context = self.assemble_context(stage, chat_context, document_context, summaries)
+            response = self._invoke(agent, combined_prompt, user_prompt, context.chat, context.doc, str(stage))
             
             # Log successful processor response
             conversation_logger.log_message(f"Processor received response from {model} ({len(response)} characters)")
             
-            return response, {"prompt_name": prompt_name, "model": model, "stage": stage, "combined": True}
+            return response, {"prompt_name": prompt_name, "model": model, "stage": stage, "combined": True, "context": context.stats()}
         
         except Exception as e:
-            error_msg = f"Agent invocation failed: {str(e)}"
-            conversation_logger.log_error(
-                error_type="PROCESSOR_AGENT_ERROR",
-                error_message=error_msg,
-                context={
-                    "stage": stage,
-                    "prompt_name": prompt_name,
-                    "model": model,
-                    "user_prompt": user_prompt[:100] + "..." if len(user_prompt) > 100 else user_prompt
-                }
-            )
-            return error_msg
+            return self._log_agent_error(f"Agent invocation failed: {str(e)}", stage, prompt_name, model, user_prompt)
+
+    def stream_llm_response(self, stage:int, user_prompt:str, chat_context:str, document_context:str, summaries=None, story_facts=None):
+        """
+        Streaming variant of get_llm_response.
+
+        Returns:
+            (chunks, metadata) where chunks is an iterator over response text chunks.
+            Errors are logged and raised rather than returned as strings, because a
+            streamed response cannot be replaced once it has started.
+        """
+        try:
+            prompt_name: str = self.agent_map.get_prompt(stage)
+        except KeyError as e:
+            error_msg = self._log_stage_error(stage, e)
+            raise ValueError(error_msg)
+
+        model: str = "gemini"
+        metadata = {"prompt_name": prompt_name, "model": model, "stage": stage, "combined": True, "streamed": True}
+
+        conversation_logger.log_message(f"Processor streaming {model} with combined prompt for '{prompt_name}' stage {stage}")
+
+        combined_prompt = self.prompt_combiner.get_combined_prompt(prompt_name.split(":")[0])
+        combined_prompt, document_context = self.apply_story_bible(stage, combined_prompt, document_context, story_facts)
+        agent: Agent = Agent.get_shared_agent(model)
+        context = self.assemble_context(stage, chat_context, document_context, summaries)
+        metadata["context"] = context.stats()
+
+        def chunks():
+            total_chars = 0
+            labels = self._metric_labels(agent, str(stage))
+            prompt_size.observe(self._prompt_chars(combined_prompt, user_prompt, context.chat, context.doc), **labels)
+            try:
+                with llm_calls_in_flight.track_inprogress(model=agent.model), llm_latency.time(**labels):
+                    for chunk in agent.stream(user_prompt, context.chat, context.doc, system_prompt=combined_prompt):
+                        total_chars += len(chunk)
+                        yield chunk
+            except Exception as e:
+                self._log_agent_error(f"Agent stream failed: {str(e)}", stage, prompt_name, model, user_prompt)
+                raise
+            response_size.observe(total_chars, **labels)
+            conversation_logger.log_message(f"Processor streamed response from {model} ({total_chars} characters)")
+
+        return chunks(), metadata
 
     def get_tutorial_response(self, stage:int, chat_context:str, document_context:str):
         try:
-            stage_list = self.get_toml_contents("tutorial_list:2", Path("backend/config/prompts/general"))
-            unformatted_prompt = self.get_toml_contents("tutorial_prompt:2", Path("backend/config/prompts/general"))
             stage_title = self.get_stage_title(stage)
-            formatted_prompt = unformatted_prompt.format(stages_list=stage_list, stage_title=stage_title, doc="{doc}", chat="{chat}")
+            with span("prompt"):
+                formatted_prompt = prompt_registry.memoize(("tutorial", stage), lambda: self.build_tutorial_prompt(stage))
+            # TipTap JSON is mostly structure; the prompt (and the cache key) only need its text
+            document_context = compact_document(document_context)
+
+            precomputed = self._precomputed_tutorial(stage, chat_context, document_context)
+            if precomputed is not None:
+                return precomputed
+
+            cache_key = self.tutorial_cache_key(stage, chat_context, document_context)
+            cached = self._cached_tutorial(cache_key, stage)
+            if cached is not None:
+                return cached
             
             # Log tutorial processor activity
             conversation_logger.log_message(f"Tutorial processor invoking {self.model} for stage {stage} ({stage_title})")
             
-            agent: Agent = Agent.get_agent(self.model, formatted_prompt, 0)
+            agent: Agent = Agent.get_shared_agent(self.model)
 
-            response = agent.invoke("", chat_context, document_context)
+            response = self._invoke(agent, formatted_prompt, "", chat_context, document_context, f"tutorial_{stage}")
             
             # Log successful tutorial response
             conversation_logger.log_message(f"Tutorial processor received response from {self.model} ({len(response)} characters)")
             
-            return response, {"prompt_name": f"tutorial_stage_{stage}", "model": self.model, "stage": stage, "stage_title": stage_title}
+            metadata = {"prompt_name": f"tutorial_stage_{stage}", "model": self.model, "stage": stage, "stage_title": stage_title}
+            tutorial_cache.set(cache_key, {"response": response, "metadata": metadata})
+            return response, metadata
         
         except Exception as e:
-            error_msg = f"Tutorial processor failed: {str(e)}"
-            conversation_logger.log_error(
-                error_type="PROCESSOR_TUTORIAL_ERROR",
-                error_message=error_msg,
-                context={
-                    "stage": stage,
-                    "model": self.model,
-                    "stage_title": self.get_stage_title(stage)
-                }
-            )
-            return error_msg
+            return self._log_tutorial_error(stage, e)
+
+    async def aget_llm_response(self, stage:int, user_prompt:str, chat_context:str, document_context:str, summaries=None, story_facts=None):
+        """Async variant of get_llm_response; awaits the model instead of blocking a worker thread."""
+        try:
+            prompt_name: str = self.agent_map.get_prompt(stage)
+        except KeyError as e:
+            return self._log_stage_error(stage, e)
+
+        model: str = "gemini"
+
+        conversation_logger.log_message(f"Processor invoking {model} (async) with combined prompt for '{prompt_name}' stage {stage}")
+
+        try:
+            combined_prompt = self.prompt_combiner.get_combined_prompt(prompt_name.split(":")[0])
+            combined_prompt, document_context = self.apply_story_bible(stage, combined_prompt, document_context, story_facts)
+            agent: Agent = Agent.get_shared_agent(model)
+
+            context = self.assemble_context(stage, chat_context, document_context, summaries)
+            response = await self._ainvoke(agent, combined_prompt, user_prompt, context.chat, context.doc, str(stage))
+
+            conversation_logger.log_message(f"Processor received response from {model} ({len(response)} characters)")
+
+            return response, {"prompt_name": prompt_name, "model": model, "stage": stage, "combined": True, "context": context.stats()}
+
+        except Exception as e:
+            return self._log_agent_error(f"Agent invocation failed: {str(e)}", stage, prompt_name, model, user_prompt)
+
+    async def aget_tutorial_response(self, stage:int, chat_context:str, document_context:str):
+        """Async variant of get_tutorial_response."""
+        try:
+            stage_title = self.get_stage_title(stage)
+            with span("prompt"):
+                formatted_prompt = prompt_registry.memoize(("tutorial", stage), lambda: self.build_tutorial_prompt(stage))
+            # TipTap JSON is mostly structure; the prompt (and the cache key) only need its text
+            document_context = compact_document(document_context)
+
+            precomputed = self._precomputed_tutorial(stage, chat_context, document_context)
+            if precomputed is not None:
+                return precomputed
+
+            # The cache may read and write its disk store; keep that off the event loop
+            cache_key = self.tutorial_cache_key(stage, chat_context, document_context)
+            cached = await asyncio.to_thread(self._cached_tutorial, cache_key, stage)
+            if cached is not None:
+                return cached
+
+            conversation_logger.log_message(f"Tutorial processor invoking {self.model} (async) for stage {stage} ({stage_title})")
+
+            agent: Agent = Agent.get_shared_agent(self.model)
+
+            response = await self._ainvoke(agent, formatted_prompt, "", chat_context, document_context, f"tutorial_{stage}")
+
+            conversation_logger.log_message(f"Tutorial processor received response from {self.model} ({len(response)} characters)")
+
+            metadata = {"prompt_name": f"tutorial_stage_{stage}", "model": self.model, "stage": stage, "stage_title": stage_title}
+            await asyncio.to_thread(tutorial_cache.set, cache_key, {"response": response, "metadata": metadata})
+            return response, metadata
+
+        except Exception as e:
+            return self._log_tutorial_error(stage, e)
+
+    def assemble_context(self, stage: int, chat_context, document_context, summaries=None):
+        """Fit the request's chat history, other stages' summaries and document into the stage's token budget."""
+        with span("context"):
+            context = context_assembler.assemble(stage, chat_context, document_context, summaries)
+        conversation_logger.log_message(
+            f"Context for stage {stage}: chat {context.chat_tokens} tokens "
+            f"({context.dropped_messages} messages dropped, {context.summaries} stage summaries "
+            f"in {context.summary_tokens} tokens), doc {context.doc_tokens} tokens "
+            f"({context.dropped_sections} sections dropped)"
+        )
+        return context
+
+    def apply_story_bible(self, stage: int, combined_prompt: str, document_context, story_facts=None):
+        """
+        From the stage's story_bible_from_stage on (context_budget.toml), put the story bible
+        (the facts of the stages it needs, see STAGE_RELEVANCE) in the prompt instead of the document.
+
+        Returns:
+            (combined prompt, document context); the document is None once the bible replaces it
+        """
+        budget = context_assembler.budget(stage)
+        if not story_facts or stage < budget["story_bible_from_stage"]:
+            return combined_prompt, document_context
+        relevant = self.agent_map.relevant_stages(stage)
+        if relevant is not None:
+            story_facts = {fact_stage: fact for fact_stage, fact in story_facts.items() if fact_stage in relevant}
+        bible = render_story_bible(stage, story_facts, budget["story_bible_tokens"])
+        conversation_logger.log_message(
+            f"Story bible for stage {stage}: {len(story_facts)} stage facts in {estimate_tokens(bible)} tokens instead of the document"
+        )
+        return self.prompt_combiner.inject_story_bible(combined_prompt, bible), None
+
+    def _invoke(self, agent: Agent, system_prompt: str, user_prompt: str, chat_context: str, document_context: str,
+                stage_label: str = "") -> str:
+        """Call the agent, sharing the upstream call with any identical request already in flight."""
+        fingerprint = content_hash(agent.model, system_prompt, user_prompt, chat_context, document_context)
+
+        def upstream():
+            # Only the leader of a coalesced call is measured
+            labels = self._metric_labels(agent, stage_label)
+            prompt_size.observe(self._prompt_chars(system_prompt, user_prompt, chat_context, document_context), **labels)
+            with llm_calls_in_flight.track_inprogress(model=agent.model), llm_latency.time(**labels):
+                response = agent.invoke(user_prompt, chat_context, document_context, system_prompt=system_prompt)
+            response_size.observe(len(response), **labels)
+            return response
+
+        # Includes waiting on a coalesced leader; the agent times the upstream call itself
+        with span("llm"):
+            return llm_single_flight.do(fingerprint, upstream)
+
+    async def _ainvoke(self, agent: Agent, system_prompt: str, user_prompt: str, chat_context: str, document_context: str,
+                       stage_label: str = "") -> str:
+        fingerprint = content_hash(agent.model, system_prompt, user_prompt, chat_context, document_context)
+
+        async def upstream():
+            labels = self._metric_labels(agent, stage_label)
+            prompt_size.observe(self._prompt_chars(system_prompt, user_prompt, chat_context, document_context), **labels)
+            with llm_calls_in_flight.track_inprogress(model=agent.model), llm_latency.time(**labels):
+                response = await agent.ainvoke(user_prompt, chat_context, document_context, system_prompt=system_prompt)
+            response_size.observe(len(response), **labels)
+            return response
+
+        with span("llm"):
+            return await llm_single_flight.ado(fingerprint, upstream)
+
+    @staticmethod
+    def _metric_labels(agent: Agent, stage_label: str) -> dict:
+        return {"stage": stage_label, "model": agent.model}
+
+    @staticmethod
+    def _prompt_chars(system_prompt: str, user_prompt: str, chat_context, document_context) -> int:
+        return len(system_prompt) + len(user_prompt) + len(str(chat_context)) + len(str(document_context))
+
+    def tutorial_prompt_version(self, stage: int) -> str:
+        """Hash of the formatted tutorial prompt for stage; changes whenever the prompt files do."""
+        return prompt_registry.memoize(
+            ("tutorial_hash", stage),
+            lambda: content_hash(prompt_registry.memoize(("tutorial", stage), lambda: self.build_tutorial_prompt(stage)))
+        )
+
+    def tutorial_cache_key(self, stage: int, chat_context: str, document_context: str) -> str:
+        """
+        Cache key for a tutorial response: stage, model, a hash of the formatted tutorial
+        prompt (so prompt edits produce new keys) and a hash of the chat/doc context.
+        """
+        prompt_version = self.tutorial_prompt_version(stage)
+        return content_hash("tutorial", stage, self.model, prompt_version, chat_context, document_context)
+
+    def _precomputed_tutorial(self, stage: int, chat_context: str, document_context: str):
+        """Serve from the precomputed corpus when the request carries no user-specific context."""
+        if not (is_blank_context(chat_context) and is_blank_context(document_context)):
+            return None
+        response = tutorial_corpus.lookup(stage, self.tutorial_prompt_version(stage), self.model)
+        if response is None:
+            return None
+        conversation_logger.log_message(f"Tutorial processor served stage {stage} from precomputed corpus")
+        metadata = {
+            "prompt_name": f"tutorial_stage_{stage}",
+            "model": self.model,
+            "stage": stage,
+            "stage_title": self.get_stage_title(stage),
+            "precomputed": True,
+            "corpus_version": tutorial_corpus.corpus_version,
+        }
+        return response, metadata
+
+    def _cached_tutorial(self, cache_key: str, stage: int):
+        cached = tutorial_cache.get(cache_key)
+        if cached is None:
+            return None
+        conversation_logger.log_message(f"Tutorial processor served stage {stage} from cache")
+        return cached["response"], dict(cached["metadata"], cached=True)
+
+    def _log_stage_error(self, stage: int, e: KeyError) -> str:
+        error_msg = f"Invalid stage: {e}"
+        conversation_logger.log_error(
+            error_type="PROCESSOR_STAGE_ERROR",
+            error_message=error_msg,
+            context={"stage": stage, "available_stages": list(self.agent_map.stage_map.keys())}
+        )
+        return error_msg
+
+    def _log_agent_error(self, error_msg: str, stage: int, prompt_name: str, model: str, user_prompt: str) -> str:
+        conversation_logger.log_error(
+            error_type="PROCESSOR_AGENT_ERROR",
+            error_message=error_msg,
+            context={
+                "stage": stage,
+                "prompt_name": prompt_name,
+                "model": model,
+                "user_prompt": user_prompt[:100] + "..." if len(user_prompt) > 100 else user_prompt
+            }
+        )
+        return error_msg
+
+    def _log_tutorial_error(self, stage: int, e: Exception) -> str:
+        error_msg = f"Tutorial processor failed: {str(e)}"
+        conversation_logger.log_error(
+            error_type="PROCESSOR_TUTORIAL_ERROR",
+            error_message=error_msg,
+            context={
+                "stage": stage,
+                "model": self.model,
+                "stage_title": self.get_stage_title(stage)
+            }
+        )
+        return error_msg
+
+    def build_tutorial_prompt(self, stage: int) -> str:
+        stage_list = self.get_toml_contents("tutorial_list:2", Path("backend/config/prompts/general"))
+        unformatted_prompt = self.get_toml_contents("tutorial_prompt:2", Path("backend/config/prompts/general"))
+        stage_title = self.get_stage_title(stage)
+        return unformatted_prompt.format(stages_list=stage_list, stage_title=stage_title, doc="{doc}", chat="{chat}")
 
     def get_toml_contents(self, file_name: str, file_dir_path: Path) -> str:
-        if not file_dir_path.is_dir():
-            raise NotADirectoryError(f"Prompt directory not found: {file_dir_path}")
-
-        fname, vers = file_name.split(":")
-        with open(str(file_dir_path / f"{fname}.toml"), 'rb') as file:
-            toml_content = tomllib.load(file)
-
-        if vers == "latest":
-            versions = [key for key in toml_content.keys() if key.startswith('v')]
-            version = max(versions, key=lambda v: int(v[1:]))
-        else:
-            version = f"v{vers}"
-        return toml_content[version]
+        return prompt_registry.resolve(file_name, file_dir_path)
 
     def get_stage_title(self, num: int) -> str:
         names = {
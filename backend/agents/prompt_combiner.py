@@ -1,10 +1,8 @@
 from pathlib import Path
-try:
-    import tomllib  # Python 3.11+
-except ImportError:
-    import tomli as tomllib  # Fallback for older Python versions
 from typing import Optional
+from backend.agents.prompt_registry import prompt_registry
 from backend.utils.logging_config import get_module_logger
+from backend.utils.request_timing import span
 
 logger = get_module_logger('prompt_combiner')
 
@@ -20,27 +18,7 @@ class PromptCombiner:
         return self._load_prompt_from_toml(prompt_name, version, self.stage_prompts_dir)
     
     def _load_prompt_from_toml(self, prompt_name: str, version: str, prompt_dir: Path) -> str:
-        if not prompt_dir.is_dir():
-            raise NotADirectoryError(f"Prompt directory not found: {prompt_dir}")
-        
-        toml_file_path = prompt_dir / f"{prompt_name}.toml"
-        if not toml_file_path.exists():
-            raise FileNotFoundError(f"Prompt file not found: {toml_file_path}")
-        
-        with open(toml_file_path, 'rb') as file:
-            toml_content = tomllib.load(file)
-        
-        if version == "latest":
-            versions = [key for key in toml_content.keys() if key.startswith('v')]
-            if not versions:
-                raise ValueError(f"No versioned content found in {toml_file_path}")
-            version_key = max(versions, key=lambda v: int(v[1:]))
-        else:
-            version_key = f"v{version}" if not version.startswith('v') else version
-            if version_key not in toml_content:
-                raise ValueError(f"Version {version_key} not found in {toml_file_path}")
-        
-        return toml_content[version_key]
+        return prompt_registry.get_prompt(prompt_dir, prompt_name, version)
     
     def combine_prompts(self, situation_tone: str, stage_prompt: str, response_style: str) -> str:
         combined = f"{situation_tone.strip()}\n\n{stage_prompt.strip()}\n\n{response_style.strip()}"
@@ -49,19 +27,39 @@ class PromptCombiner:
         
         return combined
     
+    @staticmethod
+    def inject_story_bible(combined_prompt: str, story_bible: str) -> str:
+        """
+        The combined prompt with the story bible (see story_bible.py) in place of {doc}, so
+        the stage gets the facts of the completed stages instead of the whole document.
+        """
+        # The result is still formatted with chat/doc later: escape the bible's braces
+        escaped = story_bible.replace("{", "{{").replace("}", "}}")
+        return combined_prompt.replace("{doc}", f"Story bible (decisions from completed stages):\n{escaped}")
+
     def get_combined_prompt(self, stage_prompt_name: str, 
                           situation_version: str = "latest", 
                           response_version: str = "latest") -> str:
         try:
-            situation_tone = self.load_general_prompt("situation_and_tone", situation_version)
-            stage_prompt = self.load_stage_prompt(stage_prompt_name, "latest")
-            response_style = self.load_general_prompt("response_style", response_version)
-            
-            combined = self.combine_prompts(situation_tone, stage_prompt, response_style)
-            
-            logger.info(f"Successfully combined prompts for stage: {stage_prompt_name}")
-            return combined
+            # Memoized per stage; the registry drops the entry when any prompt file changes
+            cache_key = ("combined", str(self.general_prompts_dir), str(self.stage_prompts_dir),
+                         stage_prompt_name, situation_version, response_version)
+            with span("prompt"):
+                return prompt_registry.memoize(
+                    cache_key,
+                    lambda: self._build_combined_prompt(stage_prompt_name, situation_version, response_version)
+                )
             
         except Exception as e:
             logger.error(f"Failed to combine prompts for {stage_prompt_name}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def _build_combined_prompt(self, stage_prompt_name: str, situation_version: str, response_version: str) -> str:
+        situation_tone = self.load_general_prompt("situation_and_tone", situation_version)
+        stage_prompt = self.load_stage_prompt(stage_prompt_name, "latest")
+        response_style = self.load_general_prompt("response_style", response_version)
+        
+        combined = self.combine_prompts(situation_tone, stage_prompt, response_style)
+        
+        logger.info(f"Successfully combined prompts for stage: {stage_prompt_name}")
+        return combined
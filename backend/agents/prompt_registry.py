@@ -0,0 +1,204 @@
+"""
+Prompt Registry for WorldWeaver
+
+Process-wide, in-memory cache of the TOML prompt files under backend/config/prompts.
+Files are parsed once (at startup via preload, or on first use) and served from memory
+afterwards. Edits on disk are picked up by polling file mtimes at most once every
+reload_interval seconds, so prompt changes still apply without a restart.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib  # Fallback for older Python versions
+from typing import Any, Callable, Dict, Hashable
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('prompt_registry')
+
+PROMPTS_ROOT = Path(__file__).resolve().parents[2] / "backend" / "config" / "prompts"
+
+
+class _PromptFile:
+    """A parsed TOML prompt file plus the mtime it was parsed at."""
+    __slots__ = ("path", "mtime", "content")
+
+    def __init__(self, path: Path, mtime: float, content: Dict[str, Any]):
+        self.path = path
+        self.mtime = mtime
+        self.content = content
+
+
+class PromptRegistry:
+    """
+    Holds every parsed prompt file in memory and resolves "name:latest" / "name:N" refs.
+    Derived values (e.g. combined stage prompts) can be memoized with memoize(); they are
+    dropped automatically whenever a prompt file changes on disk.
+    """
+
+    def __init__(self, root: Path = None, reload_interval: float = None):
+        """
+        Args:
+            root: Directory preloaded by preload(). Defaults to backend/config/prompts
+            reload_interval: Minimum seconds between mtime checks. Uses PROMPT_RELOAD_INTERVAL
+                env var or 2 seconds. 0 checks on every lookup, a negative value disables reloads
+        """
+        self.root = Path(root) if root else PROMPTS_ROOT
+        if reload_interval is None:
+            reload_interval = float(os.getenv('PROMPT_RELOAD_INTERVAL', '2'))
+        self.reload_interval = reload_interval
+
+        self._files: Dict[Path, _PromptFile] = {}
+        self._paths: Dict[Path, Path] = {}  # requested path -> resolved path
+        self._derived: Dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+        self._last_check = time.monotonic()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped every time a prompt file is reloaded or removed."""
+        return self._generation
+
+    def preload(self) -> int:
+        """
+        Parse every TOML file under the registry root.
+
+        Returns:
+            Number of prompt files loaded
+        """
+        if not self.root.is_dir():
+            raise NotADirectoryError(f"Prompt directory not found: {self.root}")
+
+        with self._lock:
+            for toml_file_path in sorted(self.root.rglob("*.toml")):
+                self._load_file(toml_file_path.resolve())
+            self._last_check = time.monotonic()
+            count = len(self._files)
+
+        logger.info(f"Preloaded {count} prompt files from {self.root}")
+        return count
+
+    def get_prompt(self, prompt_dir: Path, prompt_name: str, version: str = "latest") -> str:
+        """
+        Return one version of a prompt.
+
+        Args:
+            prompt_dir: Directory containing the prompt file
+            prompt_name: File name without the .toml extension
+            version: "latest", "N" or "vN"
+        """
+        prompt_dir = Path(prompt_dir)
+        toml_content = self._get_file(prompt_dir, prompt_name).content
+
+        if version == "latest":
+            versions = [key for key in toml_content.keys() if key.startswith('v')]
+            if not versions:
+                raise ValueError(f"No versioned content found in {prompt_dir / prompt_name}.toml")
+            version_key = max(versions, key=lambda v: int(v[1:]))
+        else:
+            version_key = f"v{version}" if not version.startswith('v') else version
+            if version_key not in toml_content:
+                raise ValueError(f"Version {version_key} not found in {prompt_dir / prompt_name}.toml")
+
+        return toml_content[version_key]
+
+    def resolve(self, prompt_ref: str, prompt_dir: Path) -> str:
+        """Resolve a "name:vers" reference (vers is "latest" or a number)."""
+        fname, vers = prompt_ref.split(":")
+        return self.get_prompt(prompt_dir, fname, vers)
+
+    def memoize(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, building it with factory on a miss.
+        The cache is cleared whenever a prompt file changes.
+        """
+        self._maybe_refresh()
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+
+        generation = self._generation
+        value = factory()
+        with self._lock:
+            # Only keep the value if no reload happened while it was being built
+            if generation == self._generation:
+                self._derived[key] = value
+        return value
+
+    def refresh(self) -> bool:
+        """
+        Check every cached file's mtime and reload the ones that changed.
+
+        Returns:
+            True if anything was reloaded or removed
+        """
+        changed = False
+        with self._lock:
+            self._last_check = time.monotonic()
+            for path, prompt_file in list(self._files.items()):
+                try:
+                    mtime = path.stat().st_mtime
+                except OSError:
+                    logger.info(f"Prompt file removed: {path}")
+                    del self._files[path]
+                    changed = True
+                    continue
+                if mtime != prompt_file.mtime:
+                    logger.info(f"Prompt file changed, reloading: {path}")
+                    try:
+                        self._load_file(path)
+                    except (OSError, tomllib.TOMLDecodeError) as e:
+                        # Keep serving the last good copy until the file is fixed
+                        logger.error(f"Failed to reload prompt file {path}: {e}")
+                        prompt_file.mtime = mtime
+                        continue
+                    changed = True
+            if changed:
+                self._invalidate()
+        return changed
+
+    def _maybe_refresh(self):
+        if self.reload_interval < 0:
+            return
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self.refresh()
+
+    def _get_file(self, prompt_dir: Path, prompt_name: str) -> _PromptFile:
+        self._maybe_refresh()
+        toml_file_path = prompt_dir / f"{prompt_name}.toml"
+        path = self._paths.get(toml_file_path)
+        if path is None:
+            path = self._paths[toml_file_path] = toml_file_path.resolve()
+        prompt_file = self._files.get(path)
+        if prompt_file is not None:
+            return prompt_file
+
+        # Cache miss: only now touch the filesystem
+        if not prompt_dir.is_dir():
+            raise NotADirectoryError(f"Prompt directory not found: {prompt_dir}")
+        if not path.exists():
+            raise FileNotFoundError(f"Prompt file not found: {toml_file_path}")
+        with self._lock:
+            prompt_file = self._files.get(path) or self._load_file(path)
+        return prompt_file
+
+    def _load_file(self, path: Path) -> _PromptFile:
+        mtime = path.stat().st_mtime
+        with open(path, 'rb') as file:
+            toml_content = tomllib.load(file)
+        prompt_file = _PromptFile(path, mtime, toml_content)
+        self._files[path] = prompt_file
+        return prompt_file
+
+    def _invalidate(self):
+        self._generation += 1
+        self._derived.clear()
+
+
+# Global registry instance
+prompt_registry = PromptRegistry()
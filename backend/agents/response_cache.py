@@ -0,0 +1,211 @@
+"""
+Response Cache for WorldWeaver
+
+LRU + TTL cache for generated LLM responses with an optional on-disk store that survives
+restarts and is shared by every worker process. Used in front of the tutorial processor,
+whose output for a stage depends only on the stage, the tutorial prompt and the (usually
+blank) chat/doc context.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('response_cache')
+
+
+def content_hash(*parts: Any) -> str:
+    """Stable short hash of strings / JSON-serializable values."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with per-entry TTL.
+
+    Keys are strings (build them with content_hash so that prompt edits produce new keys).
+    When store_dir is set, entries are also written there as one JSON file per key and read
+    back on a memory miss. The store is bounded too: expired files are deleted when read, and
+    every write prunes expired files and then the least recently used ones (by mtime; disk
+    hits touch their file) beyond max_entries.
+    """
+
+    def __init__(self, name: str, max_entries: int = 256, ttl: float = 86400, store_dir: Optional[Path] = None):
+        """
+        Args:
+            name: Name used in logs and stats
+            max_entries: Entries kept in memory, and files kept in the store, before the least
+                recently used is evicted
+            ttl: Seconds an entry stays valid (0 or less: never expires)
+            store_dir: Optional directory for the persistent store
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store_dir = Path(store_dir) if store_dir else None
+        if self.store_dir:
+            try:
+                self.store_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Cannot create {name} cache store {self.store_dir}: {e}")
+                self.store_dir = None
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        entry = self._read_store(key)
+        if entry is not None and not self._fresh(entry[0], now):
+            self._delete_stored(key)
+            entry = None
+        with self._lock:
+            if entry is not None:
+                self._remember(key, entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[1]
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+        self._write_store(key, entry)
+
+    def clear(self):
+        """Drop the in-memory entries (the disk store is left to expire by TTL)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "persistent": self.store_dir is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _fresh(self, created: float, now: float) -> bool:
+        return self.ttl <= 0 or now - created < self.ttl
+
+    def _remember(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_store(self, key: str) -> Optional[tuple]:
+        if not self.store_dir:
+            return None
+        path = self.store_dir / f"{key}.json"
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            entry = record["created"], record["value"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Discarding unreadable {self.name} cache entry {path}: {e}")
+            self._delete_stored(key)
+            return None
+        try:
+            # Recently used for pruning
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def _write_store(self, key: str, entry: tuple):
+        if not self.store_dir:
+            return
+        try:
+            # Write then rename so concurrent workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"created": entry[0], "value": entry[1]}, f)
+            os.replace(tmp_path, self.store_dir / f"{key}.json")
+        except (OSError, TypeError) as e:
+            logger.warning(f"Failed to persist {self.name} cache entry: {e}")
+            return
+        self._prune_store()
+
+    def _delete_stored(self, key: str):
+        try:
+            (self.store_dir / f"{key}.json").unlink()
+        except OSError:
+            # Already gone (e.g. pruned by another worker)
+            pass
+
+    def _prune_store(self):
+        """Delete expired files, then the least recently used beyond max_entries."""
+        files = []
+        try:
+            for entry in os.scandir(self.store_dir):
+                if entry.name.endswith(".json"):
+                    try:
+                        files.append((entry.stat().st_mtime, entry.name[:-len(".json")]))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Cannot prune {self.name} cache store {self.store_dir}: {e}")
+            return
+
+        now = time.time()
+        files.sort()
+        # A file's mtime is never older than its entry's creation, so a file that looks expired
+        # by mtime really is (a touched file that has expired is deleted when it is next read)
+        expired = [key for mtime, key in files if not self._fresh(mtime, now)]
+        excess = max(len(files) - len(expired) - self.max_entries, 0)
+        live = [key for mtime, key in files if self._fresh(mtime, now)]
+        for key in expired + live[:excess]:
+            self._delete_stored(key)
+
+
+def _tutorial_cache_from_env() -> ResponseCache:
+    store_dir = os.getenv('TUTORIAL_CACHE_DIR')
+    return ResponseCache(
+        "tutorial",
+        max_entries=int(os.getenv('TUTORIAL_CACHE_SIZE', '256')),
+        ttl=float(os.getenv('TUTORIAL_CACHE_TTL', '86400')),
+        store_dir=Path(store_dir) if store_dir else None,
+    )
+
+
+# Global tutorial cache instance
+tutorial_cache = _tutorial_cache_from_env()
@@ -0,0 +1,75 @@
+"""
+Stage section index of a planning document
+
+The stage prompts insert each stage's result under a "Stage N: ..." heading, so the planning
+document splits naturally into one section per stage (plus whatever comes before the first
+such heading). SectionIndex renders every top-level block once (see tiptap_text.py) and
+groups the blocks into those sections. Block operations from the client (see
+document_delta.py) update it incrementally: only inserted blocks are rendered.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from backend.utils.tiptap_text import block_text, parse_document
+
+# A heading block's text, as rendered by block_text: "## Stage 12: History Snapshot"
+_STAGE_HEADING = re.compile(r"^#*\s*Stage\s+(\d+)\b")
+
+# (stage number if the block is a "Stage N" heading, rendered text)
+_Block = Tuple[Optional[int], str]
+
+
+def _block(node: Dict[str, Any]) -> _Block:
+    text = block_text(node)
+    match = _STAGE_HEADING.match(text) if node.get("type") == "heading" else None
+    return (int(match.group(1)) if match else None, text)
+
+
+class SectionIndex:
+    """A document's top-level blocks as text, grouped into stage sections."""
+
+    __slots__ = ("_blocks", "_sections")
+
+    def __init__(self, blocks: List[_Block]):
+        self._blocks = blocks
+        self._sections: Optional[List[Tuple[Optional[int], str]]] = None
+
+    @classmethod
+    def build(cls, document: Any) -> Optional["SectionIndex"]:
+        """Index of a TipTap document (dict or JSON), or None if document is not one."""
+        node = parse_document(document)
+        if node is None:
+            return None
+        return cls([_block(child) for child in node.get("content", ())])
+
+    def apply_ops(self, ops: List[Dict[str, Any]]) -> "SectionIndex":
+        """
+        Index of the document after ops, which must already have been validated against it
+        (document_delta.apply_ops). This index is not changed.
+        """
+        blocks = list(self._blocks)
+        for op in ops:
+            count = 0 if op["op"] == "insert" else op.get("count", 0)
+            nodes = [] if op["op"] == "delete" else op.get("nodes", [])
+            blocks[op["index"]:op["index"] + count] = [_block(node) for node in nodes]
+        return SectionIndex(blocks)
+
+    def sections(self) -> List[Tuple[Optional[int], str]]:
+        """(stage number, or None for text before the first stage heading; text) in document order."""
+        if self._sections is None:
+            sections: List[Tuple[Optional[int], List[str]]] = []
+            for stage, text in self._blocks:
+                if not text:
+                    continue
+                if stage is not None or not sections:
+                    sections.append((stage, []))
+                sections[-1][1].append(text)
+            self._sections = [(stage, "\n".join(parts)) for stage, parts in sections]
+        return self._sections
+
+    def section(self, stage: int) -> Optional[str]:
+        """Text of stage's section (all of them, if the stage heading occurs more than once)."""
+        texts = [text for section_stage, text in self.sections() if section_stage == stage]
+        return "\n".join(texts) if texts else None
+
+    def stages(self) -> List[int]:
+        return sorted({stage for stage, _ in self.sections() if stage is not None})
@@ -0,0 +1,119 @@
+"""
+Single-flight request coalescing for WorldWeaver
+
+Concurrent calls with the same key share one execution: the first caller (the leader) runs
+the upstream call and every caller that arrives while it is in flight waits for and
+receives the same result (or exception). Used by Processor to collapse identical model
+calls, e.g. many users opening /planning at once or a double-submitted chat turn.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('single_flight')
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls, for both threads and asyncio tasks."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], _AsyncCall] = {}
+        self.upstream_calls = 0
+        self.shared_calls = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() unless an identical call is in flight, in which case wait for its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.upstream_calls += 1
+            else:
+                self.shared_calls += 1
+
+        if not leader:
+            logger.debug(f"{self.name}: joined in-flight call")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async variant of do(); calls are only shared within one event loop.
+
+        The upstream call runs as its own task which every caller, the leader included, waits
+        on through asyncio.shield: cancelling one caller (e.g. a client disconnect) never
+        cancels the others. The task is only cancelled once no caller is waiting for it.
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        call = self._async_calls.get(loop_key)
+        if call is None:
+            call = self._async_calls[loop_key] = _AsyncCall(asyncio.ensure_future(factory()))
+            call.task.add_done_callback(lambda _: self._forget(loop_key, call))
+            self.upstream_calls += 1
+        else:
+            self.shared_calls += 1
+            logger.debug(f"{self.name}: joined in-flight call")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller was cancelled; later callers start a fresh call
+                self._forget(loop_key, call)
+                call.task.cancel()
+
+    def _forget(self, loop_key: Tuple[int, Hashable], call: "_AsyncCall"):
+        if self._async_calls.get(loop_key) is call:
+            del self._async_calls[loop_key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._async_calls)
+        return {
+            "name": self.name,
+            "upstream_calls": self.upstream_calls,
+            "saved_calls": self.shared_calls,
+            "in_flight": in_flight,
+        }
+
+
+# Global instance shared by every Processor
+llm_single_flight = SingleFlight("llm")
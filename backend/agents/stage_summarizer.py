@@ -0,0 +1,156 @@
+"""
+Background summarization of completed stages for WorldWeaver
+
+Each stage's chat is only useful to later stages for what the user decided. When a turn
+completes a stage (the model inserts the stage's section into the planning document), the
+stage's conversation is condensed into a short summary on a small worker pool, off the
+request path, and stored with the conversation's server-side state. Later turns get those
+summaries plus the current stage's raw turns (see ContextAssembler.assemble).
+
+The pool is bounded: at most STAGE_SUMMARY_WORKERS (default 2) summaries run at once and at
+most STAGE_SUMMARY_MAX_PENDING (default 32) wait; further stages are skipped, not queued,
+and are summarized the next time they complete.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+from backend.agents.agent import Agent
+from backend.agents.context_assembler import context_assembler, estimate_tokens, truncate_to_tokens
+from backend.agents.conversation_state import ConversationStateStore, ConversationTurn, conversation_state
+from backend.agents.prompt_registry import prompt_registry
+from backend.utils.logging_config import get_module_logger
+from backend.utils.metrics import stage_summaries, summarized_tokens
+
+logger = get_module_logger('stage_summarizer')
+
+SUMMARY_PROMPT = "stage_summary:1"
+PROMPT_DIR = Path("backend/config/prompts/general")
+# Response types that carry the stage's <document> insert
+_COMPLETING_TYPES = ("document", "both")
+
+
+def is_stage_complete(payload: Dict[str, Any]) -> bool:
+    return payload.get("type") in _COMPLETING_TYPES
+
+
+class StageSummarizer:
+    """Summarizes completed stages of server-side conversations on a bounded thread pool."""
+
+    def __init__(self, store: ConversationStateStore, model: str = "gemini", max_workers: int = None,
+                 max_pending: int = None, max_input_tokens: int = None, max_summary_tokens: int = None):
+        """
+        Args:
+            store: Where conversations are read from and summaries stored
+            model: Agent used for summaries
+            max_workers: Concurrent summaries. Uses STAGE_SUMMARY_WORKERS env var or 2
+            max_pending: Summaries running or waiting. Uses STAGE_SUMMARY_MAX_PENDING env var or 32
+            max_input_tokens: Most recent part of a stage's chat that is summarized.
+                Uses STAGE_SUMMARY_INPUT_TOKENS env var or 8000
+            max_summary_tokens: Summaries are cut to this length. Uses STAGE_SUMMARY_TOKENS env var or 300
+        """
+        self.store = store
+        self.model = model
+        self.max_workers = max_workers if max_workers is not None else int(os.getenv('STAGE_SUMMARY_WORKERS', '2'))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv('STAGE_SUMMARY_MAX_PENDING', '32'))
+        self.max_input_tokens = max_input_tokens if max_input_tokens is not None else int(os.getenv('STAGE_SUMMARY_INPUT_TOKENS', '8000'))
+        self.max_summary_tokens = max_summary_tokens if max_summary_tokens is not None else int(os.getenv('STAGE_SUMMARY_TOKENS', '300'))
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._pending: Set[Tuple[str, int]] = set()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def after_turn(self, turn: ConversationTurn, payload: Dict[str, Any], stage_title: str) -> bool:
+        """Summarize the turn's stage in the background if the recorded turn completed it."""
+        if "revision" not in payload or not is_stage_complete(payload):
+            return False
+        return self.submit(turn.conversation_id, turn.stage, stage_title)
+
+    def submit(self, conversation_id: str, stage: int, stage_title: str) -> bool:
+        """
+        Queue a summary of stage. Never blocks.
+
+        Returns:
+            False if the stage is already being summarized or the pool is full
+        """
+        key = (conversation_id, stage)
+        with self._lock:
+            executor = self._ensure_executor()
+            if key in self._pending:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                stage_summaries.inc(outcome="dropped")
+                logger.warning(f"Summary pool full; not summarizing stage {stage} of {conversation_id}")
+                return False
+            self._pending.add(key)
+            self.submitted += 1
+        executor.submit(self._run, key, stage_title)
+        return True
+
+    def summarize(self, conversation_id: str, stage: int, stage_title: str) -> Optional[str]:
+        """Summarize stage now and store the summary. Returns it, or None if the stage has no chat."""
+        messages = self.store.get(conversation_id).stage_messages(stage)
+        raw_chat, _ = context_assembler.assemble_chat(messages, max_tokens=10 ** 9)
+        if not raw_chat.strip():
+            return None
+        chat, _ = context_assembler.assemble_chat(messages, self.max_input_tokens)
+
+        prompt = prompt_registry.memoize(
+            ("stage_summary", stage_title),
+            lambda: prompt_registry.resolve(SUMMARY_PROMPT, PROMPT_DIR).format(stage_title=stage_title, chat="{chat}")
+        )
+        agent: Agent = Agent.get_shared_agent(self.model)
+        summary = truncate_to_tokens(agent.invoke("", chat, "", system_prompt=prompt).strip(), self.max_summary_tokens)
+        self.store.set_summary(conversation_id, stage, summary)
+
+        before, after = estimate_tokens(raw_chat), estimate_tokens(summary)
+        summarized_tokens.inc(before, kind="chat")
+        summarized_tokens.inc(after, kind="summary")
+        logger.info(f"Summarized stage {stage} of {conversation_id}: {before} chat tokens -> {after} summary tokens")
+        return summary
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {"submitted": self.submitted, "completed": self.completed, "failed": self.failed,
+                "dropped": self.dropped, "pending": pending}
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=wait)
+
+    def _run(self, key: Tuple[str, int], stage_title: str):
+        conversation_id, stage = key
+        try:
+            self.summarize(conversation_id, stage, stage_title)
+            self.completed += 1
+            stage_summaries.inc(outcome="completed")
+        except Exception as e:
+            # The stage keeps its raw turns out of later prompts either way; it is retried when completed again
+            self.failed += 1
+            stage_summaries.inc(outcome="failed")
+            logger.error(f"Summarizing stage {stage} of {conversation_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        # Created lazily, and again in a forked child: worker threads do not survive a fork
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            # Summaries the parent process had in flight are not running here
+            self._pending = set()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage-summary")
+        return self._executor
+
+
+# Global summarizer
+stage_summarizer = StageSummarizer(conversation_state)
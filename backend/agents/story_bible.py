@@ -0,0 +1,74 @@
+"""
+Story bible for WorldWeaver
+
+Most stages settle one or two key facts (the working title, the genre, the hero, ...) and
+insert them into the planning document with the document tool. Later stages need those
+facts, not the whole TipTap document with its node and mark wrappers, so each completed
+stage's insert is also kept as one compact line of text in the conversation's server-side
+state, keyed by stage, and stages from story_bible_from_stage on (see context_budget.toml)
+get a dense rendering of those lines in place of {doc}.
+"""
+import html
+import re
+from typing import Any, Dict, List, Optional
+from backend.agents.context_assembler import estimate_tokens, truncate_to_tokens
+
+# Each stage's fact is cut to this many tokens
+MAX_FACT_TOKENS = 120
+
+_HEADING = re.compile(r"<h[1-6][^>]*>(.*?)</h[1-6]>", re.IGNORECASE | re.DOTALL)
+_LINE_BREAK = re.compile(r"<br\s*/?>|</(?:p|li|div|blockquote)>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"[ \t\r\f\v]+")
+
+
+def _text_lines(markup: str) -> List[str]:
+    text = _TAG.sub("", _LINE_BREAK.sub("\n", markup))
+    lines = (_SPACE.sub(" ", html.unescape(line)).strip() for line in text.split("\n"))
+    return [line for line in lines if line]
+
+
+def _tool_texts(document: Any) -> List[str]:
+    if isinstance(document, list):
+        return [text for item in document for text in _tool_texts(item)]
+    if isinstance(document, dict):
+        text = document.get("text")
+        if document.get("tool") in ("insert", "set", "update") and text:
+            return ["".join(text) if isinstance(text, list) else str(text)]
+        return []
+    return [document] if isinstance(document, str) and document.strip() else []
+
+
+def document_fact(payload: Dict[str, Any]) -> Optional[str]:
+    """
+    The stage's fact from a response payload's document tool output: the inserted text on
+    one line, led by its heading ("Stage 2: Working Title: The Silent Bond"). None if the
+    response changed nothing in the document.
+    """
+    if payload.get("type") not in ("document", "both"):
+        return None
+    parts = []
+    for markup in _tool_texts(payload.get("document")):
+        heading = _HEADING.search(markup)
+        title = " ".join(_text_lines(heading.group(1))) if heading else ""
+        body = "; ".join(_text_lines(_HEADING.sub("\n", markup)))
+        parts.append(f"{title}: {body}" if title and body else title or body)
+    fact = " | ".join(part for part in parts if part)
+    return truncate_to_tokens(fact, MAX_FACT_TOKENS) if fact else None
+
+
+def render_story_bible(stage: int, facts: Dict[int, str], max_tokens: int) -> str:
+    """
+    Facts of the other stages as prompt text within max_tokens: the stages nearest stage are
+    kept first, and kept facts are listed in stage order.
+    """
+    kept: Dict[int, str] = {}
+    remaining = max_tokens
+    for fact_stage in sorted(facts, key=lambda s: (abs(s - stage), s)):
+        line = f"- {facts[fact_stage]}"
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            break
+        kept[fact_stage] = line
+        remaining -= cost
+    return "\n".join(kept[s] for s in sorted(kept))
@@ -0,0 +1,153 @@
+"""
+Precomputed Tutorial Corpus for WorldWeaver
+
+The tutorial intro for a stage depends only on tutorial_prompt.toml and tutorial_list.toml
+when the request carries no user-specific context. build_tutorial_corpus.py generates the
+intro for every stage offline and writes it to a versioned JSON artifact; /tutorial then
+serves those intros with a dictionary lookup. Each entry records the hash of the prompt it
+was generated from, so an entry is ignored as soon as the prompt is edited.
+"""
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('tutorial_corpus')
+
+CORPUS_FORMAT_VERSION = 1
+DEFAULT_CORPUS_PATH = Path(__file__).resolve().parents[2] / "backend" / "config" / "tutorial_corpus.json"
+
+
+def is_blank_context(context: Any) -> bool:
+    """True for the empty / whitespace-only contexts the frontend sends when there is nothing to add."""
+    if context is None:
+        return True
+    if isinstance(context, str):
+        return not context.strip()
+    return not context
+
+
+class TutorialCorpus:
+    """Read side of the precomputed tutorial artifact."""
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else Path(os.getenv('TUTORIAL_CORPUS_PATH', DEFAULT_CORPUS_PATH))
+        self._stages: Optional[Dict[str, Dict[str, Any]]] = None
+        self._info: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """
+        (Re)load the artifact from disk. A missing or unreadable artifact leaves the corpus empty.
+
+        Returns:
+            Number of stages available
+        """
+        stages: Dict[str, Dict[str, Any]] = {}
+        info: Dict[str, Any] = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                corpus = json.load(f)
+            if corpus.get("format_version") != CORPUS_FORMAT_VERSION:
+                logger.warning(f"Ignoring tutorial corpus {self.path}: unsupported format {corpus.get('format_version')}")
+            else:
+                stages = corpus.get("stages", {})
+                info = {key: corpus.get(key) for key in ("corpus_version", "model", "generated_at")}
+        except FileNotFoundError:
+            logger.info(f"No precomputed tutorial corpus at {self.path}")
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load tutorial corpus {self.path}: {e}")
+
+        with self._lock:
+            self._stages = stages
+            self._info = info
+        if stages:
+            logger.info(f"Loaded tutorial corpus v{info.get('corpus_version')} with {len(stages)} stages")
+        return len(stages)
+
+    def lookup(self, stage: int, prompt_version: str, model: str) -> Optional[str]:
+        """Return the precomputed intro for stage, if it was generated from the current prompt and model."""
+        if self._stages is None:
+            self.load()
+        entry = self._stages.get(str(stage))
+        if not entry:
+            return None
+        if entry.get("prompt_version") != prompt_version or self._info.get("model") != model:
+            return None
+        return entry.get("text")
+
+    def clear(self):
+        """Serve nothing until the next load()."""
+        with self._lock:
+            self._stages = {}
+            self._info = {}
+
+    @property
+    def corpus_version(self) -> Optional[int]:
+        return self._info.get("corpus_version")
+
+
+def _read_artifact(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            corpus = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return corpus if isinstance(corpus, dict) else {}
+
+
+def write_corpus(path: Path, stages: Dict[int, Dict[str, Any]], model: str) -> int:
+    """
+    Merge newly generated stages into the artifact on disk and write it, bumping corpus_version.
+
+    Stages not in stages keep their existing entries, so a partial run (--stages, or stages
+    that failed) never loses precomputed intros. Existing entries are only kept when they
+    were generated with the same model and format; otherwise the artifact starts over.
+
+    Args:
+        path: Artifact location
+        stages: stage number -> {"prompt_version": ..., "text": ...}
+        model: Model the intros were generated with
+
+    Returns:
+        The new corpus version (the current one if the merge changed nothing)
+    """
+    path = Path(path)
+    existing = _read_artifact(path)
+    try:
+        previous_version = int(existing.get("corpus_version", 0))
+    except (TypeError, ValueError):
+        previous_version = 0
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    if existing.get("format_version") == CORPUS_FORMAT_VERSION and existing.get("model") == model:
+        merged.update(existing.get("stages", {}))
+    elif existing.get("stages"):
+        logger.warning(f"Dropping {len(existing['stages'])} stages of {path}: generated with "
+                       f"{existing.get('model')} (format {existing.get('format_version')}), not {model}")
+    merged.update((str(stage), entry) for stage, entry in stages.items())
+    merged = dict(sorted(merged.items(), key=lambda item: int(item[0])))
+    if merged == existing.get("stages") and existing.get("model") == model:
+        return previous_version
+
+    corpus = {
+        "format_version": CORPUS_FORMAT_VERSION,
+        "corpus_version": previous_version + 1,
+        "model": model,
+        "generated_at": datetime.now().isoformat(),
+        "stages": merged,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(corpus, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return corpus["corpus_version"]
+
+
+# Global corpus instance
+tutorial_corpus = TutorialCorpus()
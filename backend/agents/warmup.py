@@ -0,0 +1,81 @@
+"""
+Startup warmup for WorldWeaver
+
+Loads every prompt (and builds every combined stage / tutorial prompt) and constructs the
+shared LLM clients before a process starts serving, so the first real request does not pay
+for them. Under a pre-forking server, prompts are warmed in the master before the fork
+(shared copy-on-write) and clients in each worker after it (gRPC channels must not cross a
+fork).
+"""
+import threading
+from backend.agents.agent import Agent
+from backend.agents.prompt_registry import prompt_registry
+from backend.agents.tutorial_corpus import tutorial_corpus
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('warmup')
+
+_COLD = "cold"
+_WARMING = "warming"
+_READY = "ready"
+
+_state = _COLD
+_state_lock = threading.Lock()
+
+
+def begin_warmup():
+    """Mark the process as warming; /health reports 503 until finish_warmup() runs."""
+    global _state
+    with _state_lock:
+        _state = _WARMING
+
+
+def finish_warmup():
+    global _state
+    with _state_lock:
+        _state = _READY
+
+
+def is_ready() -> bool:
+    """False only while a warmup is in progress. Processes that never warm up are always ready."""
+    return _state != _WARMING
+
+
+def warm_prompts(processor) -> int:
+    """
+    Parse all prompt files and build the combined prompt for every stage plus every
+    stage's tutorial prompt, and load the precomputed tutorial corpus.
+
+    Returns:
+        Number of stages warmed
+    """
+    prompt_registry.preload()
+    stages = sorted(processor.agent_map.stage_map.keys())
+    for stage in stages:
+        prompt_name = processor.agent_map.get_prompt(stage)
+        processor.prompt_combiner.get_combined_prompt(prompt_name.split(":")[0])
+        prompt_registry.memoize(("tutorial", stage), lambda: processor.build_tutorial_prompt(stage))
+    tutorial_corpus.load()
+    logger.info(f"Warmed prompts for {len(stages)} stages")
+    return len(stages)
+
+
+def warm_clients(processor, stub: bool = False):
+    """Build the shared LLM agent (and its pooled client) used by processor."""
+    if stub:
+        logger.info("Stub mode: skipping LLM client warmup")
+        return
+    try:
+        Agent.get_shared_agent(processor.model)
+        logger.info(f"Warmed LLM client for {processor.model}")
+    except Exception as e:
+        # Serve anyway; the client is built lazily on the first request instead
+        logger.error(f"LLM client warmup failed: {e}")
+
+
+def warmup(processor, stub: bool = False):
+    """Full warmup for single-process serving."""
+    begin_warmup()
+    warm_prompts(processor)
+    warm_clients(processor, stub)
+    finish_warmup()
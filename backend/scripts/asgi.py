@@ -0,0 +1,175 @@
+"""
+ASGI entry point for WorldWeaver
+
+POST /llm and POST /tutorial are served by async handlers that await the model through
+Processor.aget_llm_response / aget_tutorial_response, so a single process can hold
+hundreds of in-flight model calls without pinning a thread per call. Turning the request
+body into the response payload is shared with the Flask routes (begin_tutorial,
+begin_llm_turn, ... in routes.py); only the body read and the model call differ. Every other request
+(pages, login, static files, /llm/stream, GET /llm) is passed through to the existing
+Flask app unchanged.
+
+Run with:
+    python main.py --asgi
+    uvicorn backend.scripts.asgi:application --port 5002
+"""
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.concurrency import run_in_threadpool
+from backend.scripts.routes import (app, login_manager, processor, conversation_session_key, log_request_timing,
+                                   ADMIN_TOKEN, PROFILED_ENDPOINTS, profile_requested, resync_payload,
+                                   begin_tutorial, stub_tutorial_payload, tutorial_payload, tutorial_error_payload,
+                                   begin_llm_turn, stub_llm_payload, llm_payload, llm_error_payload)
+from backend.agents.conversation_state import RevisionMismatch, conversation_state, record_tutorial
+from backend.utils.profiler import request_profiler
+from backend.utils.conversation_logger import conversation_logger, current_trace_id, start_trace
+from backend.utils.logging_config import get_logger
+from backend.utils.metrics import request_latency, requests_in_flight
+from backend.utils.request_timing import span, start_request_timing, stop_request_timing
+
+logger = get_logger('asgi')
+
+ASYNC_PATHS = ("/llm", "/tutorial")
+
+
+def _session_data(request: Request) -> dict:
+    """
+    Return the signed Flask session cookie's contents, or an empty dict.
+    Uses the Flask app's own session serializer, so both serving modes share logins.
+    """
+    cookie = request.cookies.get(app.config.get("SESSION_COOKIE_NAME", "session"))
+    if not cookie:
+        return {}
+    serializer = app.session_interface.get_signing_serializer(app)
+    if serializer is None:
+        return {}
+    try:
+        return serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+async def _session_user(request: Request):
+    """
+    Return the logged-in user for the signed Flask session cookie, or None, loading it with the
+    login manager's user loader the way @login_required does (so a deleted user's cookie
+    is refused). Also starts the request's trace, routes its conversation logging to the
+    session's log file and records the session's conversation id in request.state.conversation_id.
+    """
+    start_trace(request.headers.get('x-request-id'))
+    data = _session_data(request)
+    user_id = data.get("_user_id")
+    if user_id is None:
+        return None
+    # The loader queries the database; keep it off the event loop
+    user = await run_in_threadpool(login_manager.user_callback, user_id)
+    if user is None:
+        return None
+    conversation = data.get(conversation_session_key(user_id))
+    request.state.conversation_id = (conversation or {}).get('conversation_id')
+    if conversation and 'conversation_id' in conversation:
+        conversation_logger.activate(conversation_logger.resume_conversation(
+            conversation['conversation_id'], conversation.get('log_file', ''), conversation.get('start_time')
+        ))
+    return user
+
+
+def _unauthorized():
+    return JSONResponse({"type": "message", "text": "Please log in to continue."}, status_code=401)
+
+
+async def tutorial(request: Request):
+    if await _session_user(request) is None:
+        return _unauthorized()
+
+    with span("read_body"):
+        data = await request.json()
+    stage, chat_context, document_context = begin_tutorial(data)
+
+    # Conversation state reads and writes take a file lock; they run in the threadpool so a
+    # slow disk or a contended conversation never stalls the event loop
+    if app.config.get("STUB", False):
+        return JSONResponse(await run_in_threadpool(record_tutorial, conversation_state, request.state.conversation_id,
+                                                    stage, data, stub_tutorial_payload(stage)))
+    try:
+        json_output = tutorial_payload(stage, await processor.aget_tutorial_response(stage, chat_context, document_context))
+        return JSONResponse(await run_in_threadpool(record_tutorial, conversation_state, request.state.conversation_id,
+                                                    stage, data, json_output))
+    except Exception as e:
+        return JSONResponse(tutorial_error_payload(stage, chat_context, document_context, e))
+
+
+async def llm(request: Request):
+    if await _session_user(request) is None:
+        return _unauthorized()
+
+    with span("read_body"):
+        data = await request.json()
+    user_text = data.get('text', '')
+
+    # Like record_tutorial above, turns read and write the conversation state off the event loop
+    try:
+        turn = await run_in_threadpool(begin_llm_turn, data, request.state.conversation_id)
+    except RevisionMismatch as e:
+        return JSONResponse(resync_payload(e), status_code=409)
+
+    if app.config.get("STUB", False):
+        return JSONResponse(stub_llm_payload(user_text))
+
+    try:
+        conversation_logger.log_message("Attempting async llm call...")
+        processor_result = await processor.aget_llm_response(turn.stage, user_text, turn.chat_history, turn.prompt_document,
+                                                             turn.summaries, turn.story_facts)
+        return JSONResponse(await run_in_threadpool(llm_payload, turn, user_text, processor_result))
+    except Exception as e:
+        return JSONResponse(await run_in_threadpool(llm_error_payload, turn, user_text, e))
+
+
+async_app = Starlette(routes=[
+    Route("/llm", llm, methods=["POST"]),
+    Route("/tutorial", tutorial, methods=["POST"]),
+])
+flask_app = WSGIMiddleware(app)
+
+
+def _with_server_timing(send, timing):
+    """Wrap send to add the request's Server-Timing header to the response."""
+    async def send_with_timing(message):
+        if message["type"] == "http.response.start":
+            headers = list(message.get("headers", [])) + [(b"server-timing", timing.server_timing().encode("latin-1"))]
+            message = dict(message, headers=headers)
+        await send(message)
+    return send_with_timing
+
+
+async def application(scope, receive, send):
+    """Dispatch async-capable POST routes to Starlette and everything else to Flask."""
+    if scope["type"] == "lifespan":
+        await async_app(scope, receive, send)
+    elif scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in ASYNC_PATHS:
+        # Same endpoint names as the Flask routes, so both serving modes report alike
+        endpoint = scope["path"].lstrip("/")
+        timing = start_request_timing(endpoint)
+        if timing is not None:
+            send = _with_server_timing(send, timing)
+        sampler = None
+        if ADMIN_TOKEN and endpoint in PROFILED_ENDPOINTS and profile_requested(Headers(scope=scope)):
+            # Samples the event loop thread, so concurrent requests show up in the profile too
+            sampler = request_profiler.start()
+        try:
+            with requests_in_flight.track_inprogress(endpoint=endpoint), request_latency.time(endpoint=endpoint):
+                await async_app(scope, receive, send)
+        finally:
+            if sampler is not None:
+                request_profiler.finish(sampler, endpoint, current_trace_id())
+            if timing is not None:
+                stop_request_timing()
+                # The handler activated the conversation logger in this same task
+                log_request_timing(timing)
+    else:
+        await flask_app(scope, receive, send)
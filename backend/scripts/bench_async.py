@@ -0,0 +1,160 @@
+"""
+Benchmark concurrent chat turns per worker: blocking Processor path vs async path.
+
+A fake agent sleeps for --latency seconds instead of calling Vertex AI. Every user sends a
+distinct message so single-flight coalescing does not collapse the calls. The sync path runs
+get_llm_response on a pool of --threads threads (one worker's request threads); the async
+path awaits aget_llm_response for every user on a single event loop.
+
+With --lock-hold, each async user also runs a full /llm turn against a throwaway conversation
+state store, as backend/scripts/asgi.py does, while another thread (standing in for a second
+worker) keeps taking every conversation's file lock for --lock-hold seconds at a time. The
+turn's state calls run either inline on the event loop or in the threadpool, and the longest
+event loop stall is reported for both.
+
+Usage:
+    python -m backend.scripts.bench_async [--latency 1.0] [--threads 8] [--users 8 64 256] [--lock-hold 0.2]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from backend.agents.agent import Agent
+from backend.agents.conversation_state import ConversationStateStore, ConversationTurn
+from backend.agents.processor import Processor
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('bench_async')
+
+
+class SleepingAgent(Agent):
+    """Stands in for a model call that takes a fixed time."""
+
+    def __init__(self, latency: float):
+        super().__init__("")
+        self.latency = latency
+
+    def invoke(self, user_prompt: str, chat_context: str, doc_context: str, system_prompt: Optional[str] = None) -> str:
+        time.sleep(self.latency)
+        return "<message>ok</message>"
+
+    async def ainvoke(self, user_prompt: str, chat_context: str, doc_context: str, system_prompt: Optional[str] = None) -> str:
+        await asyncio.sleep(self.latency)
+        return "<message>ok</message>"
+
+    @property
+    def model(self) -> str:
+        return "sleeping"
+
+
+def run_sync(processor: Processor, users: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: processor.get_llm_response(1, f"hello {i}", "", ""), range(users)))
+    return time.perf_counter() - start
+
+
+async def run_async(processor: Processor, users: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(processor.aget_llm_response(1, f"hello {i}", "", "") for i in range(users)))
+    return time.perf_counter() - start
+
+
+async def _state_call(offload: bool, func, *args):
+    return await run_in_threadpool(func, *args) if offload else func(*args)
+
+
+async def _turn(processor: Processor, store: ConversationStateStore, user: int, offload: bool):
+    data = {"text": f"hello {user}", "revision": None, "chat_history": [], "document": ""}
+    turn = await _state_call(offload, ConversationTurn, store, f"bench-{user}", 1, data)
+    response, _ = await processor.aget_llm_response(1, data["text"], turn.chat_history, turn.prompt_document)
+    await _state_call(offload, turn.finish, data["text"], {"type": "message", "text": response})
+
+
+async def run_turns(processor: Processor, store: ConversationStateStore, users: int, offload: bool) -> Tuple[float, float]:
+    """Seconds for every user's turn, and the longest the event loop went without running a tick."""
+    done = False
+    longest = 0.0
+
+    async def ticker():
+        nonlocal longest
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            longest = max(longest, time.perf_counter() - before - 0.005)
+
+    tick = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(_turn(processor, store, i, offload) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return elapsed, longest
+
+
+def contend(store: ConversationStateStore, users: int, hold: float, stop: threading.Event):
+    """Take every user's conversation lock for hold seconds at a time until stop is set."""
+    while not stop.is_set():
+        with ExitStack() as stack:
+            for i in range(users):
+                stack.enter_context(store._file_lock(f"bench-{i}"))
+            time.sleep(hold)
+        time.sleep(hold / 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds each fake model call takes")
+    parser.add_argument("--threads", type=int, default=8, help="Request threads per sync worker")
+    parser.add_argument("--users", type=int, nargs="+", default=[8, 64, 256])
+    parser.add_argument("--lock-hold", type=float, default=0.0,
+                        help="Also run state-backed turns while conversation locks are held this long")
+    args = parser.parse_args()
+
+    # Keep per-call conversation logging out of the measurement output
+    get_module_logger('conversation').setLevel(logging.WARNING)
+
+    Agent._shared_agents["gemini"] = SleepingAgent(args.latency)
+    processor = Processor("gemini")
+
+    for users in args.users:
+        sync_time = run_sync(processor, users, args.threads)
+        async_time = asyncio.run(run_async(processor, users))
+        # Effective concurrency: how many model calls were in flight on average
+        logger.info(
+            f"{users:>5} users | sync ({args.threads} threads) {sync_time:7.2f}s, "
+            f"{users * args.latency / sync_time:6.1f} concurrent | "
+            f"async {async_time:7.2f}s, {users * args.latency / async_time:6.1f} concurrent"
+        )
+
+    if args.lock_hold <= 0:
+        return
+    for users in args.users:
+        results = {}
+        for offload in (False, True):
+            with tempfile.TemporaryDirectory() as state_dir:
+                store = ConversationStateStore(state_dir)
+                stop = threading.Event()
+                contender = threading.Thread(target=contend, args=(store, users, args.lock_hold, stop))
+                contender.start()
+                try:
+                    results[offload] = asyncio.run(run_turns(processor, store, users, offload))
+                finally:
+                    stop.set()
+                    contender.join()
+        (inline_time, inline_stall), (pool_time, pool_stall) = results[False], results[True]
+        logger.info(
+            f"{users:>5} users, locks held {args.lock_hold:.2f}s | state inline {inline_time:7.2f}s, "
+            f"longest loop stall {inline_stall * 1000:7.1f} ms | threadpool {pool_time:7.2f}s, "
+            f"longest loop stall {pool_stall * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark chat history normalization for prompts.
+
+Builds chat histories shaped like the planner's messages state (MessageItem.jsx): a tutorial
+message per stage, shown again when a stage is revisited, a few user/assistant exchanges, a
+document tool call inserting the stage's section, the odd repeated short reply, back-to-back
+tool calls, empty message and error. Reports the bytes and estimated tokens of the posted
+JSON, of every message rendered as "type: content" (tool calls as "tool: name"), and of the
+normalized turns, plus how long normalization takes.
+
+The repo has no test suite, so --checks randomized histories are first checked against
+every rule documented in backend/utils/chat_history.py (see check_invariants).
+
+Usage:
+    python -m backend.scripts.bench_chat_history [--stages 1 5 20] [--exchanges 4] [--revisits 0.3] [--repeat 50] [--checks 500]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import uuid
+from typing import Any, Dict, List, Tuple
+from backend.agents.context_assembler import estimate_tokens
+from backend.utils.chat_history import MIN_DEDUP_CHARS, history_lines, normalize_history
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('bench_chat_history')
+
+WORDS = ("the dragon riders of the northern reaches remember every bond they have broken while "
+         "a young cartographer maps the shifting glass deserts searching for her vanished mentor").split()
+SHORT_REPLIES = ("Great choice!", "Love it.", "Tell me more about that.")
+
+
+def _words(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _message(kind: str, **fields) -> Dict[str, Any]:
+    return dict({"id": str(uuid.uuid4()), "type": kind, "timestamp": int(time.time() * 1000)}, **fields)
+
+
+def build_history(stages: int, exchanges: int, revisits: float, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    tutorials = {stage: f"Welcome to Stage {stage}! " + _words(rng, 120, 200) for stage in range(1, stages + 1)}
+    history = []
+    for stage in range(1, stages + 1):
+        visits = [stage] + ([rng.randint(1, stage)] if stage > 1 and rng.random() < revisits else [])
+        for visited in visits:
+            history.append(_message("assistant", content=tutorials[visited]))
+        for _ in range(rng.randint(1, exchanges)):
+            history.append(_message("user", content=_words(rng, 5, 40)))
+            if rng.random() < 0.15:
+                history.append(_message("assistant", content=rng.choice(SHORT_REPLIES)))
+            else:
+                history.append(_message("assistant", content=_words(rng, 40, 150) + "\n\n\n" + _words(rng, 10, 30)))
+            roll = rng.random()
+            if roll < 0.1:
+                history.append(_message("error", content="Issue delivering message", details=_words(rng, 5, 10)))
+            elif roll < 0.15:
+                history.append(_message("user", content="  "))
+        for part in range(2 if rng.random() < 0.2 else 1):
+            params = {"tool": "insert", "text": f"<h2><strong>Stage {stage}: Section {part}</strong></h2>\n"
+                                                f"<p>{_words(rng, 40, 120)}</p>\n\n"}
+            history.append(_message("tool", tool="insert", description=None, params=params))
+    return history
+
+
+def _squash(text: str) -> str:
+    return " ".join(text.split())
+
+
+def expected_turns(history: List[Dict[str, Any]]) -> List[Tuple[str, Any]]:
+    """
+    The documented rules applied to history independently of chat_history.py: (role, squashed
+    text) for user and assistant turns, ("tool", number of calls) for each run of tool calls.
+    """
+    kept = [m for m in history if m["type"] == "tool" or (m["type"] != "error" and m["content"].strip())]
+    last = {}
+    for i, m in enumerate(kept):
+        if m["type"] == "assistant" and len(m["content"].strip()) >= MIN_DEDUP_CHARS:
+            last[_squash(m["content"])] = i
+    expected: List[Tuple[str, Any]] = []
+    for i, m in enumerate(kept):
+        if m["type"] == "tool":
+            if expected and expected[-1][0] == "tool":
+                expected[-1] = ("tool", expected[-1][1] + 1)
+            else:
+                expected.append(("tool", 1))
+        elif not (m["type"] == "assistant" and last.get(_squash(m["content"]), i) != i):
+            expected.append((m["type"], _squash(m["content"])))
+    return expected
+
+
+def check_invariants(history: List[Dict[str, Any]]):
+    """Assert every rule documented in chat_history.py for one history."""
+    turns = normalize_history(history)
+    actual = [(role, len(text.split("; ")) if role == "tool" else _squash(text)) for role, text in turns]
+    # Order, user turns, dropped errors and empties, tool collapsing and deduplication at once
+    assert actual == expected_turns(history), "turns differ from the documented rules"
+
+    roles = [role for role, _ in turns]
+    assert "error" not in roles and all(text for _, text in turns)
+    assert not any(a == b == "tool" for a, b in zip(roles, roles[1:])), "adjacent tool turns"
+    users = [_squash(m["content"]) for m in history if m["type"] == "user" and m["content"].strip()]
+    assert [text for role, text in actual if role == "user"] == users, "user turns lost or reordered"
+    assert sum(role == "tool" for role in roles) <= sum(m["type"] == "tool" for m in history)
+    assert sum(len(text.split("; ")) for role, text in turns if role == "tool") == \
+        sum(m["type"] == "tool" for m in history), "tool calls lost"
+    assistant = [text for role, text in turns if role == "assistant"]
+    long_replies = [text for text in assistant if len(text) >= MIN_DEDUP_CHARS]
+    assert len(long_replies) == len(set(long_replies)), "repeated tutorial kept"
+    for reply in SHORT_REPLIES:
+        assert assistant.count(reply) == sum(m["type"] == "assistant" and m["content"] == reply for m in history), \
+            f"short reply {reply!r} deduplicated"
+    for role, text in turns:
+        assert "\n\n\n" not in text and text == text.strip()
+
+
+def naive_lines(history: List[Dict[str, Any]]) -> List[str]:
+    """Every message as "type: content", tool calls as "tool: name"."""
+    return [f"tool: {m['tool']}" if m["type"] == "tool" else f"{m['type']}: {m['content']}" for m in history]
+
+
+def median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stages", type=int, nargs="+", default=[1, 5, 20], help="Stages in the history")
+    parser.add_argument("--exchanges", type=int, default=4, help="Most user/assistant exchanges per stage")
+    parser.add_argument("--revisits", type=float, default=0.3, help="Chance a stage revisits an earlier one")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--checks", type=int, default=500, help="Randomized histories checked first")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    for seed in range(args.checks):
+        history = build_history(rng.randint(1, 25), rng.randint(1, 6), rng.random(), seed=seed)
+        try:
+            check_invariants(history)
+        except AssertionError as e:
+            logger.error(f"Invariant failed for seed {seed}: {e}")
+            raise
+    logger.info(f"Invariants hold for {args.checks} randomized histories")
+
+    for stages in args.stages:
+        history = build_history(stages, args.exchanges, args.revisits)
+        # What the planner posts (JSON.stringify)
+        as_json = json.dumps(history, ensure_ascii=False, separators=(",", ":"))
+        naive = "\n".join(naive_lines(history))
+        lines = history_lines(history)
+        normalized = "\n".join(lines)
+        json_bytes, naive_bytes, text_bytes = (len(s.encode("utf-8")) for s in (as_json, naive, normalized))
+        normalize_ms = median_ms(lambda: history_lines(history), args.repeat)
+        from_json_ms = median_ms(lambda: history_lines(as_json), args.repeat)
+
+        logger.info(
+            f"{stages:>2} stages, {len(history):>3} messages -> {len(lines):>3} turns | "
+            f"JSON {json_bytes:>7} B ~{estimate_tokens(as_json):>6} tokens | "
+            f"per message {naive_bytes:>6} B ~{estimate_tokens(naive):>5} tokens | "
+            f"normalized {text_bytes:>6} B ~{estimate_tokens(normalized):>5} tokens | "
+            f"{100 * (text_bytes / json_bytes - 1):+.0f}% vs JSON, {100 * (text_bytes / naive_bytes - 1):+.0f}% vs per message | "
+            f"normalize {normalize_ms:.3f} ms, from JSON string {from_json_ms:.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
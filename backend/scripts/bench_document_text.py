@@ -0,0 +1,100 @@
+"""
+Benchmark the compact TipTap document rendering used for prompts.
+
+Builds planning documents shaped like the ones the planner sends (a bold heading per
+completed stage, as the document tool inserts them, followed by paragraphs with marks and
+the odd bullet list), then reports the bytes and estimated tokens of the JSON the client
+sends against the compact text the model gets, and how long the conversion takes.
+
+Usage:
+    python -m backend.scripts.bench_document_text [--stages 5 20 42] [--paragraphs 3] [--repeat 50]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+from backend.agents.context_assembler import estimate_tokens
+from backend.agents.processor import Processor
+from backend.utils.logging_config import get_module_logger
+from backend.utils.tiptap_text import compact_document, document_text
+
+logger = get_module_logger('bench_document_text')
+
+WORDS = ("the dragon riders of the northern reaches remember every bond they have broken while "
+         "a young cartographer maps the shifting glass deserts searching for her vanished mentor").split()
+
+
+def _text(rng: random.Random, words: int) -> List[Dict[str, Any]]:
+    """A paragraph's inline content: plain runs with the occasional bold or italic phrase."""
+    content = []
+    remaining = words
+    while remaining > 0:
+        run = min(remaining, rng.randint(3, 15))
+        node = {"type": "text", "text": " ".join(rng.choice(WORDS) for _ in range(run)) + " "}
+        roll = rng.random()
+        if roll < 0.15:
+            node["marks"] = [{"type": "bold"}]
+        elif roll < 0.25:
+            node["marks"] = [{"type": "italic"}]
+        content.append(node)
+        remaining -= run
+    return content
+
+
+def build_document(stages: int, paragraphs: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    titles = Processor("gemini").get_stage_title
+    content = []
+    for stage in range(1, stages + 1):
+        content.append({"type": "heading", "attrs": {"level": 1},
+                        "content": [{"type": "text", "marks": [{"type": "bold"}], "text": titles(stage)}]})
+        for _ in range(rng.randint(1, paragraphs)):
+            content.append({"type": "paragraph", "content": _text(rng, rng.randint(20, 80))})
+        if rng.random() < 0.3:
+            content.append({"type": "bulletList", "content": [
+                {"type": "listItem", "content": [{"type": "paragraph", "content": _text(rng, rng.randint(5, 15))}]}
+                for _ in range(rng.randint(2, 5))
+            ]})
+    return {"type": "doc", "content": content}
+
+
+def median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stages", type=int, nargs="+", default=[5, 20, 42], help="Completed stages (at most 42)")
+    parser.add_argument("--paragraphs", type=int, default=3, help="Most paragraphs per stage section")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for stages in args.stages:
+        document = build_document(stages, args.paragraphs)
+        # What the planner posts (JSON.stringify), which /tutorial prompts used to get as is
+        as_json = json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+        text = document_text(document)
+        assert sum(line.startswith("# Stage ") for line in text.splitlines()) == stages
+
+        json_bytes, text_bytes = len(as_json.encode("utf-8")), len(text.encode("utf-8"))
+        json_tokens, text_tokens = estimate_tokens(as_json), estimate_tokens(text)
+        render_ms = median_ms(lambda: document_text(document), args.repeat)
+        parse_render_ms = median_ms(lambda: compact_document(as_json), args.repeat)
+
+        logger.info(
+            f"{stages:>2} stages | JSON {json_bytes:>7} B ~{json_tokens:>6} tokens | "
+            f"text {text_bytes:>6} B ~{text_tokens:>5} tokens | "
+            f"-{100 * (1 - text_bytes / json_bytes):.0f}% | "
+            f"render {render_ms:.3f} ms, from JSON string {parse_render_ms:.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
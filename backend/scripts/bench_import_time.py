@@ -0,0 +1,96 @@
+"""
+Startup import-time benchmark with a regression budget.
+
+Imports each entry module in a fresh interpreter under `python -X importtime`, several
+times, and compares the median cumulative import time with backend/config/import_budget.toml.
+Also fails if any module listed under [lazy] was imported at startup. Prints the slowest
+imports of the last run to show where the time goes.
+
+Usage:
+    python -m backend.scripts.bench_import_time [--runs 5] [--top 15] [--budget backend/config/import_budget.toml]
+    python -m backend.scripts.bench_import_time --module backend.scripts.routes
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+from backend.utils.logging_config import get_module_logger
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib  # Fallback for older Python versions
+
+logger = get_module_logger('bench_import_time')
+
+DEFAULT_BUDGET = Path("backend/config/import_budget.toml")
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """Import module in a fresh interpreter; returns {imported module: (self us, cumulative us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|", 2))
+        if not own.isdigit():
+            continue
+        times[name] = (int(own), int(cumulative))
+    return times
+
+
+def is_imported(times: Dict[str, Tuple[int, int]], module: str) -> bool:
+    return any(name == module or name.startswith(module + ".") for name in times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=Path, default=DEFAULT_BUDGET)
+    parser.add_argument("--module", action="append", help="Entry module to measure (default: those in the budget)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Show this many slowest imports")
+    args = parser.parse_args()
+
+    with open(args.budget, 'rb') as f:
+        budget = tomllib.load(f)
+    limits: Dict[str, float] = budget.get("modules", {})
+    lazy: List[str] = budget.get("lazy", {}).get("modules", [])
+
+    failures = 0
+    for module in args.module or list(limits):
+        runs = [import_times(module) for _ in range(args.runs)]
+        median_ms = statistics.median(run[module][1] for run in runs) / 1000
+        limit = limits.get(module)
+
+        if limit is None:
+            logger.info(f"{module}: {median_ms:.0f} ms (no budget)")
+        elif median_ms > limit:
+            logger.error(f"{module}: {median_ms:.0f} ms, over its {limit} ms budget")
+            failures += 1
+        else:
+            logger.info(f"{module}: {median_ms:.0f} ms (budget {limit} ms)")
+
+        eager = [name for name in lazy if is_imported(runs[-1], name)]
+        if eager:
+            logger.error(f"{module} imports {', '.join(eager)} at startup; these must be imported on first use")
+            failures += 1
+
+        slowest = sorted(runs[-1].items(), key=lambda item: -item[1][0])[:args.top]
+        for name, (own, cumulative) in slowest:
+            logger.info(f"    {own / 1000:8.1f} ms self {cumulative / 1000:8.1f} ms cumulative  {name}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
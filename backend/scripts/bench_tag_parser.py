@@ -0,0 +1,92 @@
+"""
+Benchmark the incremental tag parser against the old regex-based parse_string.
+
+Usage:
+    python -m backend.scripts.bench_tag_parser [--sizes 10000 100000 1000000] [--repeat 20]
+"""
+import argparse
+import json
+import re
+import timeit
+from backend.utils.logging_config import get_module_logger
+from backend.utils.tag_parser import TagStreamParser, parse_tags
+
+logger = get_module_logger('bench_tag_parser')
+
+
+def regex_parse(input_str: str) -> dict:
+    """The regex implementation parse_string used before the incremental parser."""
+    message_matches = re.findall(r"<message>(.*?)</message>", input_str, re.DOTALL)
+    document_matches = re.findall(r"<document>(.*?)</document>", input_str, re.DOTALL)
+
+    message_content = None
+    if message_matches:
+        cleaned_messages = [msg.strip() for msg in message_matches if msg.strip()]
+        if cleaned_messages:
+            message_content = "\n\n".join(cleaned_messages)
+
+    document_content = None
+    if document_matches:
+        for raw_doc in reversed(document_matches):
+            raw_doc = raw_doc.strip()
+            if raw_doc:
+                try:
+                    document_content = json.loads(raw_doc)
+                    break
+                except json.JSONDecodeError:
+                    continue
+        if document_content is None:
+            for raw_doc in reversed(document_matches):
+                raw_doc = raw_doc.strip()
+                if raw_doc:
+                    document_content = raw_doc
+                    break
+    if message_content and document_content:
+        return {"type": "both", "text": message_content, "document": document_content}
+    elif message_content:
+        return {"type": "message", "text": message_content}
+    elif document_content:
+        return {"type": "document", "document": document_content}
+    return {"type": "message", "text": input_str}
+
+
+def build_output(size: int) -> str:
+    """A model-like output of roughly size characters: a long message plus a document insert."""
+    paragraph = "The dragons of the northern reaches remember every bond they have ever broken. "
+    body = (paragraph * (size // len(paragraph) + 1))[:size]
+    document = json.dumps({
+        "tool": "insert",
+        "text": f"<h2><strong>Stage 22: Why They Oppose</strong></h2>\n<p>{body[:size // 4]}</p>\n\n"
+    })
+    return f"<message>{body}</message>\n<document>{document}</document>"
+
+
+def stream_parse(output: str, chunk_size: int = 64) -> dict:
+    parser = TagStreamParser()
+    for i in range(0, len(output), chunk_size):
+        parser.feed(output[i:i + chunk_size])
+    return parser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        output = build_output(size)
+        assert parse_tags(output) == regex_parse(output) == stream_parse(output)
+
+        regex_time = min(timeit.repeat(lambda: regex_parse(output), number=1, repeat=args.repeat))
+        single_time = min(timeit.repeat(lambda: parse_tags(output), number=1, repeat=args.repeat))
+        stream_time = min(timeit.repeat(lambda: stream_parse(output), number=1, repeat=args.repeat))
+
+        logger.info(
+            f"{len(output):>9} chars | regex {regex_time * 1000:8.2f} ms | "
+            f"single-pass {single_time * 1000:8.2f} ms | streamed (64-char chunks) {stream_time * 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Generate the precomputed tutorial corpus served by /tutorial.
+
+Runs the tutorial processor for every stage with the blank chat/doc context the frontend
+sends on stage entry, on a bounded pool of --workers threads, and merges the intros into
+the versioned JSON artifact (see backend/agents/tutorial_corpus.py): stages not generated
+in this run, including the ones that fail, keep their previous entries. Stages with no
+entry (or a stale one) are served by a live call.
+
+Usage:
+    python -m backend.scripts.build_tutorial_corpus [--workers 4] [--stages 0 1 2] [--output PATH]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from backend.agents.processor import Processor
+from backend.agents.tutorial_corpus import tutorial_corpus, write_corpus
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('build_tutorial_corpus')
+
+BLANK_CONTEXT = " "
+
+
+def generate_stage(processor: Processor, stage: int):
+    result = processor.get_tutorial_response(stage, BLANK_CONTEXT, BLANK_CONTEXT)
+    if not isinstance(result, tuple):
+        raise RuntimeError(result)
+    response, metadata = result
+    if metadata.get("precomputed"):
+        raise RuntimeError("served from the existing corpus")
+    return {"prompt_version": processor.tutorial_prompt_version(stage), "text": response}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent model calls")
+    parser.add_argument("--stages", type=int, nargs="+", help="Stages to generate (default: all)")
+    parser.add_argument("--output", default=str(tutorial_corpus.path), help="Artifact path")
+    parser.add_argument("--model", default="gemini")
+    args = parser.parse_args()
+
+    load_dotenv()
+    processor = Processor(args.model)
+    stages = args.stages or sorted(processor.agent_map.stage_map.keys())
+
+    # Never serve from the corpus being rebuilt
+    tutorial_corpus.clear()
+
+    start = time.perf_counter()
+    entries, failed = {}, []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(generate_stage, processor, stage): stage for stage in stages}
+        for future in as_completed(futures):
+            stage = futures[future]
+            try:
+                entries[stage] = future.result()
+                logger.info(f"Stage {stage}: {len(entries[stage]['text'])} characters")
+            except Exception as e:
+                failed.append(stage)
+                logger.error(f"Stage {stage} failed: {e}")
+
+    if not entries:
+        logger.error("No stages generated; corpus left unchanged")
+        sys.exit(1)
+
+    version = write_corpus(args.output, entries, args.model)
+    logger.info(
+        f"Merged into tutorial corpus v{version} at {args.output}: {len(entries)} stages generated in "
+        f"{time.perf_counter() - start:.1f}s with {args.workers} workers"
+    )
+    if failed:
+        logger.warning(f"Failed stages (previous entry kept, if any): {sorted(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Check that every agent in a process shares one Vertex AI client.
+
+Swaps the client pool used by backend/agents/agent.py for one built around a local fake
+GenerativeModel that counts its constructions, then drives --threads concurrent callers
+(each fetching the shared agent, building a per-request agent as get_agent does, and
+invoking both) plus --tasks concurrent ainvoke calls on an event loop. Exits non-zero
+unless exactly one client was constructed. Needs no Google credentials or network.
+
+Usage:
+    python -m backend.scripts.check_client_pool [--threads 64] [--calls 20] [--tasks 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from backend.agents import agent as agent_module
+from backend.agents.agent import Agent
+from backend.agents.client_pool import VertexClientPool
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('check_client_pool')
+
+
+class FakeGenerativeModel:
+    """Stands in for vertexai's GenerativeModel; counts how often it is constructed."""
+
+    constructed = 0
+    _lock = threading.Lock()
+
+    def __init__(self, model_name: str):
+        with FakeGenerativeModel._lock:
+            FakeGenerativeModel.constructed += 1
+        self.model_name = model_name
+        # Widen the window in which a racing caller could build a second client
+        time.sleep(0.01)
+
+    def generate_content(self, prompt: str, generation_config=None, stream: bool = False):
+        response = SimpleNamespace(text=f"<message>{len(prompt)}</message>")
+        return [response] if stream else response
+
+    async def generate_content_async(self, prompt: str, generation_config=None):
+        await asyncio.sleep(0)
+        return SimpleNamespace(text=f"<message>{len(prompt)}</message>")
+
+
+def drive_thread(calls: int, start: threading.Barrier, errors: list):
+    start.wait()
+    try:
+        for i in range(calls):
+            shared = Agent.get_shared_agent("gemini")
+            shared.invoke(f"turn {i}", "", "", system_prompt="Stage prompt {chat} {doc}")
+            # Per-request agents (tutorial prompts) must reuse the pooled client as well
+            Agent.get_agent("gemini", "Tutorial prompt {chat} {doc}", 0).invoke(f"turn {i}", "", "")
+    except Exception as e:
+        errors.append(e)
+
+
+async def drive_tasks(tasks: int):
+    agent = Agent.get_shared_agent("gemini")
+    await asyncio.gather(*(agent.ainvoke(f"turn {i}", "", "", system_prompt="{chat}{doc}") for i in range(tasks)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--calls", type=int, default=20, help="Calls per thread")
+    parser.add_argument("--tasks", type=int, default=200, help="Concurrent ainvoke calls")
+    args = parser.parse_args()
+
+    for name in ("GOOGLE_CLOUD_PROJECT", "GEMINI_LOCATION", "GEMINI_PRO_2_5_ID"):
+        os.environ.setdefault(name, name.lower())
+    pool = VertexClientPool(model_factory=FakeGenerativeModel)
+    agent_module.client_pool = pool
+    Agent._shared_agents.clear()
+
+    start = threading.Barrier(args.threads)
+    errors: list = []
+    threads = [threading.Thread(target=drive_thread, args=(args.calls, start, errors)) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    asyncio.run(drive_tasks(args.tasks))
+    elapsed = time.perf_counter() - started
+
+    invocations = args.threads * args.calls * 2 + args.tasks
+    logger.info(f"{invocations} invocations from {args.threads} threads and {args.tasks} tasks in {elapsed:.2f}s: "
+                f"{pool.created_count} client(s) created, {FakeGenerativeModel.constructed} constructed")
+    if errors:
+        logger.error(f"{len(errors)} threads failed, first: {errors[0]!r}")
+        sys.exit(1)
+    if pool.created_count != 1 or FakeGenerativeModel.constructed != 1:
+        logger.error("Expected exactly one client per process")
+        sys.exit(1)
+    logger.info("OK: one client per process")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 from dataclasses import replace
 from sys import getallocatedblocks
 from abc import ABCMeta, abstractmethod
-from openai import OpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 from backend.agents.agent import Agent
@@ -141,6 +140,9 @@ class call_ai:
             return "failed"
 
     def get_response(self, prompt, content):
+        # Imported here: the OpenAI SDK is slow to import and only this method uses it
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key)
         response = client.chat.completions.create(
             model="gpt-4.1-nano",
             messages=[
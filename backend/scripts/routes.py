@@ -1,7 +1,18 @@
+import hmac
 import os
+import time
+import uuid
 from datetime import datetime
+from functools import partial
+from typing import Any, Optional, Tuple
+from backend.agents.context_assembler import context_assembler
+from backend.agents.conversation_state import ConversationTurn, RevisionMismatch, conversation_state, record_tutorial
 from backend.agents.processor import Processor
-from flask import Flask, render_template, request, redirect, url_for, flash, current_app, jsonify, session
+from backend.agents.response_cache import tutorial_cache
+from backend.agents.single_flight import llm_single_flight
+from backend.agents.stage_summarizer import stage_summarizer
+from backend.agents.warmup import is_ready
+from flask import Flask, render_template, request, redirect, url_for, flash, current_app, jsonify, session, Response, stream_with_context, g
 from backend.scripts.forms import LoginForm
 from backend.scripts.dbmodels import SessionLocal, User
 from backend.scripts.llm import call_ai
@@ -9,8 +20,12 @@ import re
 from backend.scripts.prompts import PromptBuilder
 import json
 from backend.agents.current_agent import CurrentAgent
-from backend.utils.conversation_logger import conversation_logger
+from backend.utils.conversation_logger import conversation_logger, current_trace_id, start_trace
 from backend.utils.logging_config import get_logger
+from backend.utils.metrics import metrics, request_latency, requests_in_flight
+from backend.utils.profiler import PROFILE_HEADER, check_profile_token, make_profile_token, request_profiler
+from backend.utils.request_timing import RequestTiming, current_timing, resume_request_timing, span, start_request_timing, stop_request_timing
+from backend.utils.tag_parser import TagStreamParser, MESSAGE_DELTA, DOCUMENT, parse_tags
 from pathlib import Path
 
 PROJ = Path(__file__).resolve().parents[2]
@@ -41,6 +56,21 @@ ai = call_ai()
 
 # Conversation Session Management ________________________________
 
+def conversation_session_key(user_id) -> str:
+    return f"conversation_session_{user_id}"
+
+
+def _start_conversation(username: str) -> dict:
+    conversation_id = uuid.uuid4().hex
+    log_file = conversation_logger.start_conversation(conversation_id, username)
+    conversation_logger.activate(conversation_logger.resume_conversation(conversation_id))
+    return {
+        'conversation_id': conversation_id,
+        'log_file': log_file,
+        'start_time': datetime.now().isoformat()
+    }
+
+
 def start_new_conversation_session():
     """
     Always create a new conversation session and log file for the current user.
@@ -48,18 +78,15 @@ def start_new_conversation_session():
     """
     if current_user.is_authenticated:
         # End any existing session first
-        session_key = f"conversation_session_{current_user.id}"
-        if session_key in session:
-            conversation_logger.log_session_end()
+        session_key = conversation_session_key(current_user.id)
+        if session_key in session and 'conversation_id' in session[session_key]:
+            conversation_logger.end_conversation(session[session_key]['conversation_id'])
+            conversation_state.delete(session[session_key]['conversation_id'])
             
         # Always start a new conversation session
         username = current_user.email.split('@')[0]  # Use email prefix as username
-        log_file = conversation_logger.start_new_conversation(username)
-        session[session_key] = {
-            'log_file': log_file,
-            'start_time': datetime.now().isoformat()
-        }
-        logger.info(f"Started new conversation session for {username}: {log_file}")
+        session[session_key] = _start_conversation(username)
+        logger.info(f"Started new conversation session for {username}: {session[session_key]['log_file']}")
         
         return session[session_key]
     return None
@@ -70,22 +97,170 @@ def ensure_conversation_session():
     This is used by /llm and /tutorial routes to make sure logging is active.
     """
     if current_user.is_authenticated:
-        session_key = f"conversation_session_{current_user.id}"
+        session_key = conversation_session_key(current_user.id)
         
         # Check if we already have an active conversation session
-        if session_key not in session:
+        if 'conversation_id' not in session.get(session_key, {}):
             # This shouldn't happen if user came through /planning, but create one just in case
             username = current_user.email.split('@')[0]
-            log_file = conversation_logger.start_new_conversation(username)
-            session[session_key] = {
-                'log_file': log_file,
-                'start_time': datetime.now().isoformat()
-            }
-            logger.info(f"Created fallback conversation session for {username}: {log_file}")
+            session[session_key] = _start_conversation(username)
+            logger.info(f"Created fallback conversation session for {username}: {session[session_key]['log_file']}")
         
         return session[session_key]
     return None
 
+
+def current_conversation_id():
+    """Id of the session's conversation, if it has one."""
+    return session.get(conversation_session_key(session.get('_user_id')), {}).get('conversation_id')
+
+
+def finish_turn(turn: ConversationTurn, user_text: str, payload: dict) -> dict:
+    """Record the turn; once it completes its stage, summarize the stage in the background."""
+    payload = turn.finish(user_text, payload)
+    stage_summarizer.after_turn(turn, payload, processor.get_stage_title(turn.stage))
+    return payload
+
+
+def resync_payload(mismatch: RevisionMismatch) -> dict:
+    """Response asking the client to upload its full history and document again (HTTP 409)."""
+    return {"type": "resync", "revision": mismatch.revision, "reason": mismatch.reason}
+
+
+@app.before_request
+def activate_conversation_logger():
+    """Send this request's conversation logging to the session's own log file."""
+    start_trace(request.headers.get('X-Request-ID'))
+    # Read the user id straight from the session; no user lookup for static files
+    conversation = session.get(conversation_session_key(session.get('_user_id')))
+    if conversation and 'conversation_id' in conversation:
+        conversation_logger.activate(conversation_logger.resume_conversation(
+            conversation['conversation_id'], conversation.get('log_file', ''), conversation.get('start_time')
+        ))
+    else:
+        conversation_logger.activate(None)
+
+
+@app.teardown_request
+def deactivate_conversation_logger(exception=None):
+    # Request threads are reused; never leak one user's logger into the next request
+    conversation_logger.activate(None)
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = request.endpoint or "unknown"
+    g.metrics_start = time.perf_counter()
+    requests_in_flight.inc(endpoint=g.metrics_endpoint)
+
+
+def _finish_request_metrics(endpoint, start):
+    requests_in_flight.dec(endpoint=endpoint)
+    request_latency.observe(time.perf_counter() - start, endpoint=endpoint)
+
+
+@app.after_request
+def defer_streamed_request_metrics(response):
+    # A streamed response (/llm/stream) is still being sent after the view returns; measure
+    # it when the server closes the response instead, so it is measured end to end
+    if response.is_streamed and 'metrics_start' in g:
+        response.call_on_close(partial(_finish_request_metrics, g.metrics_endpoint, g.pop('metrics_start')))
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exception=None):
+    # pop: stream_with_context runs teardown a second time once the stream ends
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        _finish_request_metrics(g.metrics_endpoint, start)
+
+
+# Endpoints whose phases are timed (for a TRACE_SAMPLE_RATE fraction of requests)
+TIMED_ENDPOINTS = ("llm", "llm_stream", "tutorial")
+
+
+@app.before_request
+def start_phase_timing():
+    if request.endpoint in TIMED_ENDPOINTS and request.method == "POST":
+        g.request_timing = start_request_timing(request.endpoint)
+    else:
+        stop_request_timing()
+
+
+def log_request_timing(timing: RequestTiming):
+    """Write the request's phase timings to its conversation log."""
+    conversation_logger.log_request_timing(timing.endpoint, round(timing.total_ms(), 3), timing.record())
+
+
+@app.after_request
+def add_server_timing(response):
+    timing = g.get('request_timing')
+    if timing is not None:
+        # For a streamed response this covers the phases before the stream started
+        response.headers['Server-Timing'] = timing.server_timing()
+        if response.is_streamed:
+            # Logged by the stream itself once it has finished
+            g.pop('request_timing')
+    return response
+
+
+@app.teardown_request
+def finish_phase_timing(exception=None):
+    timing = g.pop('request_timing', None)
+    if timing is not None:
+        stop_request_timing()
+        log_request_timing(timing)
+
+
+# Per-request profiling is only available when ADMIN_TOKEN is set; the admin routes below
+# then require "Authorization: Bearer <ADMIN_TOKEN>"
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+# X-Profile tokens are signed with PROFILE_SECRET (default: ADMIN_TOKEN), never with
+# app.secret_key, which is in the repo and would let anyone mint them
+PROFILE_SECRET = os.getenv('PROFILE_SECRET') or ADMIN_TOKEN
+PROFILED_ENDPOINTS = ("llm", "tutorial")
+PROFILE_TOKEN_MAX_AGE = int(os.getenv('PROFILE_TOKEN_MAX_AGE', '3600'))
+
+
+def profile_requested(headers) -> bool:
+    """Profile this request? Yes for a valid signed X-Profile header, or if this worker is armed."""
+    token = headers.get(PROFILE_HEADER)
+    if token:
+        return bool(PROFILE_SECRET) and check_profile_token(PROFILE_SECRET, token, PROFILE_TOKEN_MAX_AGE)
+    return request_profiler.take_armed()
+
+
+def admin_authorized() -> bool:
+    header = request.headers.get('Authorization', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(header, f"Bearer {ADMIN_TOKEN}")
+
+
+@app.before_request
+def start_request_profile():
+    if not ADMIN_TOKEN or request.endpoint not in PROFILED_ENDPOINTS or request.method != "POST":
+        return
+    if profile_requested(request.headers):
+        g.profile_sampler = request_profiler.start()
+
+
+@app.after_request
+def finish_request_profile(response):
+    sampler = g.pop('profile_sampler', None)
+    if sampler is not None:
+        name = request_profiler.finish(sampler, request.endpoint, current_trace_id())
+        if name:
+            response.headers['X-Profile-Name'] = name
+    return response
+
+
+@app.teardown_request
+def stop_request_profile(exception=None):
+    # after_request is skipped when the view raised
+    sampler = g.pop('profile_sampler', None)
+    if sampler is not None:
+        request_profiler.finish(sampler, request.endpoint, current_trace_id())
+
 #
 # class WorldweaverRoutes():
 #     def __init__(self, llm:call_ai):
@@ -95,62 +270,228 @@ def ensure_conversation_session():
 # def shutdown_session(exception=None):
 #     SessionLocal.remove()
 def parse_string(input_str: str) -> str:
-    # Extract all instances of message and document tags using regex
-    message_matches = re.findall(r"<message>(.*?)</message>", input_str, re.DOTALL)
-    document_matches = re.findall(r"<document>(.*?)</document>", input_str, re.DOTALL)
-    
-    # Combine all message contents with newlines
-    message_content = None
-    if message_matches:
-        # Strip whitespace from each match and join with double newlines
-        cleaned_messages = [msg.strip() for msg in message_matches if msg.strip()]
-        if cleaned_messages:
-            message_content = "\n\n".join(cleaned_messages)
-    
-    # Handle document content - use the last valid JSON document
-    document_content = None
-    if document_matches:
-        # Try each document match from last to first to get the most recent valid one
-        for raw_doc in reversed(document_matches):
-            raw_doc = raw_doc.strip()
-            if raw_doc:
-                try:
-                    # Try to parse as JSON
-                    document_content = json.loads(raw_doc)
-                    break  # Use the first valid JSON we find (working backwards)
-                except json.JSONDecodeError:
-                    continue  # Try the next document match
-        
-        # If no valid JSON found, use the last non-empty document as plain string
-        if document_content is None:
-            for raw_doc in reversed(document_matches):
-                raw_doc = raw_doc.strip()
-                if raw_doc:
-                    document_content = raw_doc
-                    break
-    if message_content and document_content:
-        result = {
-            "type": "both",
-            "text": message_content,
-            "document": document_content
-        }
-    elif message_content:
-        result = {
-            "type": "message",
-            "text": message_content
-        }
-    elif document_content:
-        result = {
-            "type": "document",
-            "document": document_content
-        }
+    # Single pass over the output for <message> and <document> tags (see backend/utils/tag_parser.py)
+    with span("parse"):
+        return json.dumps(parse_tags(input_str), indent=2)
+
+
+def process_llm_output(raw_output: str, metadata: dict) -> dict:
+    """
+    Turn raw model output into the JSON payload returned to the frontend and
+    log it with the conversation logger.
+    """
+    # Try to parse the response as JSON first
+    try:
+        parsed_output = json.loads(raw_output)
+
+        # Validate that it has the expected structure
+        if isinstance(parsed_output, dict) and 'type' in parsed_output:
+            # It's already properly formatted JSON
+            conversation_logger.log_llm_response(
+                raw_output=raw_output,
+                processed_output=parsed_output,
+                processing_type="json_direct",
+                metadata=metadata
+            )
+            return parsed_output
+        else:
+            # It's JSON but not in our expected format
+            # Treat it as a message
+            json_output = {
+                "type": "message",
+                "text": raw_output
+            }
+            conversation_logger.log_llm_response(
+                raw_output=raw_output,
+                processed_output=json_output,
+                processing_type="json_wrapped",
+                metadata=metadata
+            )
+            return json_output
+
+    except json.JSONDecodeError:
+        # The LLM returned plain text, not JSON
+        # Wrap it in our message format
+        json_output_str = parse_string(raw_output)
+        try:
+            json_output = json.loads(json_output_str)
+            conversation_logger.log_llm_response(
+                raw_output=raw_output,
+                processed_output=json_output,
+                processing_type="string_parsed",
+                metadata=metadata
+            )
+            logger.debug(f"Received: {json_output_str}")
+            return json_output
+        except json.JSONDecodeError as parse_error:
+            # Fallback to basic message format
+            fallback_output = {
+                "type": "message",
+                "text": raw_output
+            }
+            conversation_logger.log_llm_response(
+                raw_output=raw_output,
+                processed_output=fallback_output,
+                processing_type="fallback",
+                metadata=metadata
+            )
+            conversation_logger.log_error(
+                error_type="JSON_PARSE_ERROR",
+                error_message=str(parse_error),
+                context={"raw_output": raw_output, "parsed_attempt": json_output_str, "metadata": metadata}
+            )
+            return fallback_output
+
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(parser_events):
+    """Turn TagStreamParser events into SSE frames for /llm/stream."""
+    for event, value in parser_events:
+        if event == MESSAGE_DELTA:
+            yield sse_event("message", {"text": value})
+        elif event == DOCUMENT:
+            yield sse_event("document", {"document": value})
+
+
+# Request handling shared by the Flask routes and the ASGI handlers (backend/scripts/asgi.py) ________________________________
+# Each front end reads the body and calls the processor (sync or async); everything from the
+# body to the JSON payload, including the conversation logging, is done here.
+
+def begin_tutorial(data: dict) -> Tuple[int, Any, Any]:
+    """Read and log a /tutorial request body. Returns (stage, chat_context, document_context)."""
+    stage = int(data.get('stage', ''))
+    chat_context = data.get('chat_context', '')
+    document_context = data.get('doc_context', '')
+    conversation_logger.log_tutorial_request(
+        stage=stage,
+        chat_context=chat_context,
+        document_context=document_context
+    )
+    return stage, chat_context, document_context
+
+
+def stub_tutorial_payload(stage: int) -> dict:
+    json_output = {
+        "type": "message",
+        "text": f"A tutorial for stage {stage}."
+    }
+    conversation_logger.log_tutorial_response(
+        raw_output=f"STUB: A tutorial for stage {stage}.",
+        processed_output=json_output,
+        metadata={"model": "stub", "prompt_name": f"tutorial_stage_{stage}", "stage": stage}
+    )
+    return json_output
+
+
+def tutorial_payload(stage: int, processor_result) -> dict:
+    """The /tutorial payload for the tutorial processor's result, logged."""
+    # Handle both old format (string) and new format (tuple)
+    if isinstance(processor_result, tuple):
+        raw_output, metadata = processor_result
     else:
-        result = {
-            "type": "message",
-            "text": input_str
+        raw_output = processor_result
+        metadata = {"model": "unknown", "prompt_name": f"tutorial_stage_{stage}", "stage": stage}
+
+    json_output = {
+        "type": "message",
+        "text": raw_output
+    }
+    conversation_logger.log_tutorial_response(
+        raw_output=raw_output,
+        processed_output=json_output,
+        metadata=metadata
+    )
+    return json_output
+
+
+def tutorial_error_payload(stage: int, chat_context, document_context, error: Exception) -> dict:
+    error_response = {
+        "type": "message",
+        "text": f"Sorry, I encountered an error with your introduction: {str(error)}"
+    }
+    conversation_logger.log_error(
+        error_type="TUTORIAL_ERROR",
+        error_message=str(error),
+        context={
+            "stage": stage,
+            "chat_context": chat_context,
+            "document_context": document_context
         }
+    )
+    conversation_logger.log_tutorial_response(
+        raw_output="ERROR_OCCURRED",
+        processed_output=error_response,
+        metadata={"stage": stage}
+    )
+    return error_response
 
-    return json.dumps(result, indent=2)
+
+def begin_llm_turn(data: dict, conversation_id) -> ConversationTurn:
+    """
+    Start an /llm turn from the request body and log the request. History and document come
+    from the server-side state unless the client sent them.
+
+    Raises:
+        RevisionMismatch: answer with resync_payload and HTTP 409
+    """
+    turn = ConversationTurn(conversation_state, conversation_id, int(data.get('stage', '')), data)
+    conversation_logger.log_llm_request(
+        user_message=data.get('text', ''),
+        chat_history=turn.chat_history,
+        document_context=turn.document,
+        frontend_stage=turn.stage
+    )
+    return turn
+
+
+def stub_llm_payload(user_text: str) -> dict:
+    output = ai.get_stub(user_text)
+    if isinstance(output, str) and output.startswith("<"):
+        return json.loads(parse_string(output))
+    if output == "failed":
+        return {"type": "message", "text": "error"}
+    return output
+
+
+def llm_payload(turn: ConversationTurn, user_text: str, processor_result) -> dict:
+    """The /llm payload for the processor's result, logged and recorded in the turn."""
+    # Handle both old format (string) and new format (tuple)
+    if isinstance(processor_result, tuple):
+        raw_output, metadata = processor_result
+    else:
+        raw_output = processor_result
+        metadata = {"model": "unknown", "prompt_name": "unknown", "stage": turn.stage}
+    return finish_turn(turn, user_text, process_llm_output(raw_output, metadata))
+
+
+def llm_error_payload(turn: ConversationTurn, user_text: str, error: Exception,
+                      metadata: Optional[dict] = None, partial_output: Optional[str] = None) -> dict:
+    error_response = {
+        "type": "message",
+        "text": f"Sorry, I encountered an error: {str(error)}"
+    }
+    context = {
+        "user_text": user_text,
+        "frontend_stage": turn.stage
+    }
+    if partial_output is not None:
+        context["partial_output"] = partial_output
+    conversation_logger.log_error(
+        error_type="LLM_ERROR",
+        error_message=str(error),
+        context=context
+    )
+    conversation_logger.log_llm_response(
+        raw_output="ERROR_OCCURRED",
+        processed_output=error_response,
+        processing_type="error",
+        metadata=metadata or {"stage": turn.stage}
+    )
+    return finish_turn(turn, user_text, error_response)
 
 
 @login_manager.user_loader
@@ -176,6 +517,9 @@ def welcome():
 
 @app.route('/health')
 def health():
+    # Not healthy until prompts and LLM clients are warm (see backend/agents/warmup.py)
+    if not is_ready():
+        return {"status": "warming", "service": "worldweaver"}, 503
     return {"status": "healthy", "service": "worldweaver"}, 200
 
 @app.route('/dashboard')
@@ -261,9 +605,13 @@ def prune():
     if request.method == "POST":
         data = request.get_json()
         logger.debug(f"Pruning: {data}")
+        stage = int(data.get('stage', 0))
+        context = context_assembler.assemble(stage, data.get('history', []), data.get('document', ''))
         json_output = {
             "type": "context",
-            "text": "A pruned context..."
+            "text": context.chat,
+            "doc": context.doc,
+            "stats": context.stats()
         }
         return jsonify(json_output)
 
@@ -274,80 +622,80 @@ def tutorial():
         # Ensure conversation session is active
         ensure_conversation_session()
         
-        data = request.get_json()
-        stage = data.get('stage', '')
-        int_stage = int(stage)
-        chat_context = data.get('chat_context', '')
-        document_context = data.get('doc_context', '')
-        
-        # Log the incoming tutorial request
-        conversation_logger.log_tutorial_request(
-            stage=int_stage,
-            chat_context=chat_context,
-            document_context=document_context
-        )
+        with span("read_body"):
+            data = request.get_json()
+        stage, chat_context, document_context = begin_tutorial(data)
         
         if current_app.config.get("STUB", False):
-            json_output = {
-                "type": "message",
-                "text": "A tutorial for stage {stage}.".format(stage=stage)
-            }
-            stub_metadata = {"model": "stub", "prompt_name": f"tutorial_stage_{stage}", "stage": int_stage}
-            conversation_logger.log_tutorial_response(
-                raw_output=f"STUB: A tutorial for stage {stage}.",
-                processed_output=json_output,
-                metadata=stub_metadata
-            )
-            return jsonify(json_output)
-        else:
-            try:
-                processor_result = processor.get_tutorial_response(int_stage, chat_context, document_context)
-                
-                # Handle both old format (string) and new format (tuple)
-                if isinstance(processor_result, tuple):
-                    raw_output, metadata = processor_result
-                else:
-                    raw_output = processor_result
-                    metadata = {"model": "unknown", "prompt_name": f"tutorial_stage_{int_stage}", "stage": int_stage}
-                
-                json_output = {
-                    "type": "message",
-                    "text": raw_output
-                }
-                
-                # Log the tutorial response
-                conversation_logger.log_tutorial_response(
-                    raw_output=raw_output,
-                    processed_output=json_output,
-                    metadata=metadata
-                )
-                
-                return jsonify(json_output)
-            except Exception as e:
-                # Handle any other errors
-                error_response = {
-                    "type": "message",
-                    "text": f"Sorry, I encountered an error with your introduction: {str(e)}"
-                }
-                
-                # Log the error
-                conversation_logger.log_error(
-                    error_type="TUTORIAL_ERROR",
-                    error_message=str(e),
-                    context={
-                        "stage": int_stage,
-                        "chat_context": chat_context,
-                        "document_context": document_context
-                    }
-                )
-                
-                conversation_logger.log_tutorial_response(
-                    raw_output="ERROR_OCCURRED",
-                    processed_output=error_response,
-                    metadata={"stage": int_stage}
-                )
-                
-                return jsonify(error_response)
+            return jsonify(record_tutorial(conversation_state, current_conversation_id(), stage, data, stub_tutorial_payload(stage)))
+        try:
+            json_output = tutorial_payload(stage, processor.get_tutorial_response(stage, chat_context, document_context))
+            return jsonify(record_tutorial(conversation_state, current_conversation_id(), stage, data, json_output))
+        except Exception as e:
+            return jsonify(tutorial_error_payload(stage, chat_context, document_context, e))
+
+@app.route('/tutorial/cache', methods=["GET"])
+@login_required
+def tutorial_cache_stats():
+    return jsonify(tutorial_cache.stats())
+
+@app.route('/llm/coalescing', methods=["GET"])
+@login_required
+def llm_coalescing_stats():
+    return jsonify(llm_single_flight.stats())
+
+@app.route('/metrics', methods=["GET"])
+def metrics_endpoint():
+    # Scraped by Prometheus; set METRICS_TOKEN to require "Authorization: Bearer <token>"
+    token = os.getenv('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/admin/profile/token', methods=["POST"])
+def admin_profile_token():
+    """Signed X-Profile header value; a request sending it within PROFILE_TOKEN_MAX_AGE seconds is profiled."""
+    if not admin_authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    if not PROFILE_SECRET:
+        return Response("Header profiling needs PROFILE_SECRET or ADMIN_TOKEN\n", status=404, mimetype="text/plain")
+    return jsonify({"header": PROFILE_HEADER, "token": make_profile_token(PROFILE_SECRET, "admin"),
+                    "max_age": PROFILE_TOKEN_MAX_AGE})
+
+@app.route('/admin/profile/arm', methods=["POST"])
+def admin_profile_arm():
+    """Profile the next N /llm or /tutorial requests handled by the worker serving this request."""
+    if not admin_authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    data = request.get_json(silent=True) or {}
+    armed = request_profiler.arm(int(data.get('requests', 1)))
+    return jsonify({"pid": os.getpid(), "armed": armed})
+
+@app.route('/admin/profiles', methods=["GET"])
+def admin_profiles():
+    if not admin_authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return jsonify(request_profiler.list_profiles())
+
+@app.route('/admin/profiles/<name>', methods=["GET"])
+def admin_profile(name):
+    """Folded stacks (feed to flamegraph.pl or speedscope), or ?format=top for a flat summary."""
+    if not admin_authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    if request.args.get('format') == 'top':
+        top = request_profiler.top(name, int(request.args.get('limit', 30)))
+        if top is None:
+            return Response("Not found\n", status=404, mimetype="text/plain")
+        return jsonify(top)
+    folded = request_profiler.folded(name)
+    if folded is None:
+        return Response("Not found\n", status=404, mimetype="text/plain")
+    return Response(folded, mimetype="text/plain")
+
+@app.route('/logs/stats', methods=["GET"])
+@login_required
+def conversation_log_stats():
+    return jsonify(conversation_logger.stats())
 
 @app.route('/llm', methods=["GET", "POST"])
 @login_required
@@ -356,130 +704,106 @@ def llm():
         # Ensure conversation session is active
         ensure_conversation_session()
         
-        data = request.get_json()
+        with span("read_body"):
+            data = request.get_json()
         user_text = data.get('text', '')
-        document = data.get('document', '')
-        chat_history = data.get('chat_history', '')
-        # stage = agent.get_agent()
-        frontend_stage = int(data.get('stage', ''))
-        
-        # Log the incoming LLM request
-        conversation_logger.log_llm_request(
-            user_message=user_text,
-            chat_history=chat_history,
-            document_context=document,
-            frontend_stage=frontend_stage
-        )
+
+        try:
+            turn = begin_llm_turn(data, current_conversation_id())
+        except RevisionMismatch as e:
+            return jsonify(resync_payload(e)), 409
         
         if current_app.config.get("STUB", False):
-            output = ai.get_stub(user_text)
-            if output.startswith("<"):
-                output = parse_string(output)
-            elif output == "failed":
-                return "error"
-            return output
+            return jsonify(stub_llm_payload(user_text))
 
-        else:
-            try:
-                # Get the raw response from your LLM
-                conversation_logger.log_message("Attempting llm call...")
-                processor_result = processor.get_llm_response(frontend_stage, user_text, chat_history, document)
-                
-                # Handle both old format (string) and new format (tuple)
-                if isinstance(processor_result, tuple):
-                    raw_output, metadata = processor_result
-                else:
-                    raw_output = processor_result
-                    metadata = {"model": "unknown", "prompt_name": "unknown", "stage": frontend_stage}
-
-                # Try to parse the response as JSON first
-                try:
-                    parsed_output = json.loads(raw_output)
-
-                    # Validate that it has the expected structure
-                    if isinstance(parsed_output, dict) and 'type' in parsed_output:
-                        # It's already properly formatted JSON
-                        conversation_logger.log_llm_response(
-                            raw_output=raw_output,
-                            processed_output=parsed_output,
-                            processing_type="json_direct",
-                            metadata=metadata
-                        )
-                        return jsonify(parsed_output)
-                    else:
-                        # It's JSON but not in our expected format
-                        # Treat it as a message
-                        json_output = {
-                            "type": "message",
-                            "text": raw_output
-                        }
-                        conversation_logger.log_llm_response(
-                            raw_output=raw_output,
-                            processed_output=json_output,
-                            processing_type="json_wrapped",
-                            metadata=metadata
-                        )
-                        return jsonify(json_output)
-
-                except json.JSONDecodeError:
-                    # The LLM returned plain text, not JSON
-                    # Wrap it in our message format
-                    json_output_str = parse_string(raw_output)
-                    try:
-                        json_output = json.loads(json_output_str)
-                        conversation_logger.log_llm_response(
-                            raw_output=raw_output,
-                            processed_output=json_output,
-                            processing_type="string_parsed",
-                            metadata=metadata
-                        )
-                        logger.debug(f"Received: {json_output_str}")
-                        return jsonify(json_output)
-                    except json.JSONDecodeError as parse_error:
-                        # Fallback to basic message format
-                        fallback_output = {
-                            "type": "message",
-                            "text": raw_output
-                        }
-                        conversation_logger.log_llm_response(
-                            raw_output=raw_output,
-                            processed_output=fallback_output,
-                            processing_type="fallback",
-                            metadata=metadata
-                        )
-                        conversation_logger.log_error(
-                            error_type="JSON_PARSE_ERROR",
-                            error_message=str(parse_error),
-                            context={"raw_output": raw_output, "parsed_attempt": json_output_str, "metadata": metadata}
-                        )
-                        return jsonify(fallback_output)
-
-            except Exception as e:
-                # Handle any other errors
-                error_response = {
-                    "type": "message",
-                    "text": f"Sorry, I encountered an error: {str(e)}"
-                }
-                conversation_logger.log_error(
-                    error_type="LLM_ERROR",
-                    error_message=str(e),
-                    context={
-                        "user_text": user_text,
-                        "frontend_stage": frontend_stage
-                    }
-                )
-                conversation_logger.log_llm_response(
-                    raw_output="ERROR_OCCURRED",
-                    processed_output=error_response,
-                    processing_type="error",
-                    metadata={"stage": frontend_stage}
-                )
-                return jsonify(error_response)
-        #
-        # return json
+        try:
+            conversation_logger.log_message("Attempting llm call...")
+            processor_result = processor.get_llm_response(turn.stage, user_text, turn.chat_history, turn.prompt_document,
+                                                          turn.summaries, turn.story_facts)
+            return jsonify(llm_payload(turn, user_text, processor_result))
+        except Exception as e:
+            return jsonify(llm_error_payload(turn, user_text, e))
     else:
         return render_template("llm.html")
 
+@app.route('/llm/stream', methods=["POST"])
+@login_required
+def llm_stream():
+    """
+    Streaming variant of /llm. Responds with server-sent events:
+    - "message": {"text": ...} <message> text deltas as they arrive
+    - "document": {"document": ...} each document tool payload once its closing tag arrives
+    - "done": the same final JSON payload /llm would have returned
+    A revision mismatch (see backend/agents/conversation_state.py) is answered with a plain
+    409 resync response instead of a stream.
+    """
+    # Ensure conversation session is active (before streaming starts, while the session can still be saved)
+    ensure_conversation_session()
+
+    with span("read_body"):
+        data = request.get_json()
+    user_text = data.get('text', '')
+
+    # Checked before the stream starts, while a 409 can still be sent
+    try:
+        turn = begin_llm_turn(data, current_conversation_id())
+    except RevisionMismatch as e:
+        return jsonify(resync_payload(e)), 409
+
+    # The view's teardown runs before the stream is sent; carry the request's conversation
+    # logger and timing into the generator so its events still land in the right place
+    conversation = conversation_logger.current()
+    timing = current_timing()
+
+    def generate():
+        conversation_logger.activate(conversation)
+        resume_request_timing(timing)
+        try:
+            yield from generate_events()
+        finally:
+            if timing is not None:
+                log_request_timing(timing)
+            stop_request_timing()
+            conversation_logger.activate(None)
+
+    def generate_events():
+        if current_app.config.get("STUB", False):
+            output = ai.get_stub(user_text)
+            if isinstance(output, str) and output.startswith("<"):
+                parser = TagStreamParser()
+                for i in range(0, len(output), 16):
+                    for frame in stream_events(parser.feed(output[i:i + 16])):
+                        yield frame
+                output = parser.close()
+            elif output == "failed":
+                output = {"type": "message", "text": "error"}
+            yield sse_event("done", output)
+            return
+
+        raw_chunks = []
+        metadata = {"model": "unknown", "prompt_name": "unknown", "stage": turn.stage}
+        try:
+            conversation_logger.log_message("Attempting streamed llm call...")
+            chunks, metadata = processor.stream_llm_response(turn.stage, user_text, turn.chat_history, turn.prompt_document,
+                                                             turn.summaries, turn.story_facts)
+            parser = TagStreamParser()
+            for chunk in chunks:
+                raw_chunks.append(chunk)
+                for frame in stream_events(parser.feed(chunk)):
+                    yield frame
+
+            # The logger gets the full response once the stream is complete
+            yield sse_event("done", finish_turn(turn, user_text, process_llm_output("".join(raw_chunks), metadata)))
+
+        except Exception as e:
+            yield sse_event("done", llm_error_payload(turn, user_text, e, metadata, "".join(raw_chunks)))
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Tell nginx not to buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
 
 
 
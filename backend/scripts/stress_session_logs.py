@@ -0,0 +1,92 @@
+"""
+Stress test for per-session conversation logging.
+
+Starts --sessions conversations at once, each driven by its own thread that activates its
+conversation and logs --events records through the global-style conversation_logger proxy,
+the same way request handlers and Processor do. The writer is limited to --max-open-files
+handles so LRU closing and reopening is exercised. Afterwards every log file is checked to
+contain exactly its own session's records and nobody else's.
+
+Usage:
+    python -m backend.scripts.stress_session_logs [--sessions 500] [--events 20] [--max-open-files 32]
+"""
+import argparse
+import logging
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from backend.utils.conversation_logger import ConversationLoggerRegistry
+from backend.utils.log_writer import AsyncLogWriter
+from backend.utils.logging_config import get_module_logger
+
+logger = get_module_logger('stress_session_logs')
+
+_MARKER = re.compile(r"SESSION-(\d+)-EVENT-(\d+)")
+
+
+def drive_session(registry: ConversationLoggerRegistry, index: int, events: int, start: threading.Barrier):
+    conversation_id = f"{index:032x}"
+    registry.start_conversation(conversation_id, f"user{index}")
+    start.wait()
+    for event in range(events):
+        # Resume + activate per "request", as the before_request hook does
+        registry.activate(registry.resume_conversation(conversation_id))
+        if event % 2:
+            registry.log_message(f"session-{index}-event-{event}")
+        else:
+            registry.log_llm_request(f"SESSION-{index}-EVENT-{event}", [], "", 1)
+        registry.activate(None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--max-open-files", type=int, default=32)
+    args = parser.parse_args()
+
+    get_module_logger('conversation').setLevel(logging.WARNING)
+    log_dir = Path(tempfile.mkdtemp(prefix="worldweaver_stress_"))
+    writer = AsyncLogWriter(max_queue=args.sessions * args.events * 2, max_open_files=args.max_open_files)
+    registry = ConversationLoggerRegistry(log_dir, writer=writer)
+
+    start = threading.Barrier(args.sessions)
+    threads = [
+        threading.Thread(target=drive_session, args=(registry, i, args.events, start))
+        for i in range(args.sessions)
+    ]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    registry.flush()
+    elapsed = time.perf_counter() - began
+
+    errors = 0
+    files = sorted(log_dir.glob("*_conversation.log"))
+    if len(files) != args.sessions:
+        logger.error(f"Expected {args.sessions} log files, found {len(files)}")
+        errors += 1
+    for path in files:
+        owner = int(re.search(r"_user(\d+)_", path.name).group(1))
+        seen = Counter(int(session) for session, _ in _MARKER.findall(path.read_text(encoding='utf-8').upper()))
+        if set(seen) != {owner} or seen[owner] != args.events:
+            logger.error(f"{path.name}: expected {args.events} records of session {owner}, found {dict(seen)}")
+            errors += 1
+
+    stats = registry.stats()
+    logger.info(
+        f"{args.sessions} sessions x {args.events} events in {elapsed:.2f}s: "
+        f"{stats['flushed']} records written, {stats['dropped']} dropped, "
+        f"{stats['opened_files']} file opens (cap {args.max_open_files}), {errors} bad files ({log_dir})"
+    )
+    sys.exit(1 if errors or stats['dropped'] else 0)
+
+
+if __name__ == "__main__":
+    main()
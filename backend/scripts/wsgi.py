@@ -0,0 +1,36 @@
+"""
+Production entry point for WorldWeaver (used by gunicorn.conf.py)
+
+Importing this module loads the Flask app and warms every prompt. gunicorn preloads it in
+the master process before forking workers, so the parsed prompts are shared copy-on-write;
+each worker then builds its own LLM clients in the post_worker_init hook.
+
+Environment:
+    STUB=1  enable stub mode (same as main.py --stub)
+    ASGI=1  also expose asgi_application (async /llm and /tutorial, see asgi.py)
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.agents.warmup import begin_warmup, warm_prompts
+from backend.scripts.routes import app, processor
+from backend.utils.logging_config import get_logger
+from main import create_test_user
+
+logger = get_logger('wsgi')
+
+app.config["STUB"] = os.environ.get("STUB", "0") == "1"
+logger.info(f"Stub mode: {app.config['STUB']}")
+
+create_test_user()
+
+# Workers report 503 on /health until their own post-fork warmup has finished
+begin_warmup()
+warm_prompts(processor)
+
+application = app
+
+if os.environ.get("ASGI", "0") == "1":
+    from backend.scripts.asgi import application as asgi_application
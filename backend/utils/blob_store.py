@@ -0,0 +1,77 @@
+"""
+Content-addressed blob store for WorldWeaver logs
+
+Large values repeated across log records (document snapshots, chat histories) are stored
+once, gzipped, under <root>/<hash[:2]>/<hash>.json.gz, and log records refer to them by
+hash. Writing a value that is already stored costs a hash and nothing else.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Set
+
+def canonical_json(value: Any) -> str:
+    # Key order is kept (not sorted) so a blob reads back exactly as it was logged; the
+    # frontend serializes a given document the same way every time, so hashes still match
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def blob_hash(value: Any) -> str:
+    return hashlib.sha256(canonical_json(value).encode("utf-8")).hexdigest()[:32]
+
+
+class BlobStore:
+    """Write-once store of JSON values keyed by the hash of their canonical serialization."""
+
+    _stores: Dict[Path, "BlobStore"] = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._known: Set[str] = set()
+        self.written = 0
+        self.deduplicated = 0
+
+    @classmethod
+    def for_dir(cls, root: Path) -> "BlobStore":
+        """One shared store per directory per process."""
+        root = Path(root)
+        with cls._stores_lock:
+            store = cls._stores.get(root)
+            if store is None:
+                store = cls._stores[root] = cls(root)
+            return store
+
+    def put(self, value: Any) -> str:
+        """Store value (if not stored yet) and return its hash."""
+        serialized = canonical_json(value)
+        key = hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:32]
+        if key in self._known:
+            self.deduplicated += 1
+            return key
+
+        path = self._path(key)
+        if path.exists():
+            self.deduplicated += 1
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so concurrent writers never expose a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(serialized.encode("utf-8"))
+            os.replace(tmp_path, path)
+            self.written += 1
+        self._known.add(key)
+        return key
+
+    def get(self, key: str) -> Any:
+        """Load a stored value. Raises FileNotFoundError for unknown hashes."""
+        with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
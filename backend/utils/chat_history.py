@@ -0,0 +1,123 @@
+"""
+Normalized chat history for prompts
+
+The planner posts its React messages state as chat_history (see MessageItem.jsx): every
+message carries an id, a timestamp and its type, tool messages carry the tool call's full
+params (the HTML inserted into the document, which the prompt already gets through {doc}),
+error messages are UI only, and revisiting a stage adds its tutorial message again. Prompts
+only need who said what, so the history is reduced to (role, text) turns first:
+
+- user and assistant messages keep their role and text, with runs of blank lines and
+  trailing spaces squeezed out
+- consecutive tool messages collapse into one "tool" turn naming each call and what it
+  added ("insert (Stage 15: Everyday Life)")
+- error messages and empty messages are dropped
+- a tutorial-sized assistant message (MIN_DEDUP_CHARS or more) repeated verbatim, i.e. a
+  stage's tutorial shown again when the stage is revisited, is kept only where it last
+  occurs; short replies ("Great choice!") are kept every time they were given
+"""
+import html
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# (role, text)
+Turn = Tuple[str, str]
+
+# Longest label kept per tool call in a tool turn
+MAX_TOOL_LABEL_CHARS = 80
+# Shortest assistant message that is deduplicated; tutorials are far longer
+MIN_DEDUP_CHARS = 200
+
+_HEADING = re.compile(r"<h[1-6][^>]*>(.*?)</h[1-6]>", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]+>")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_TRAILING_SPACE = re.compile(r"[ \t]+\n")
+
+
+def parse_history(chat_history: Any) -> Optional[List[Any]]:
+    """The message list in chat_history (a list or its JSON), or None if it is plain text."""
+    if isinstance(chat_history, list):
+        return chat_history
+    if isinstance(chat_history, str) and chat_history.lstrip().startswith("["):
+        try:
+            messages = json.loads(chat_history)
+        except ValueError:
+            return None
+        return messages if isinstance(messages, list) else None
+    return None
+
+
+def _clean(text: str) -> str:
+    # Most messages need neither substitution; the substring checks are much cheaper
+    if "\n" not in text:
+        return text.strip()
+    if " \n" in text or "\t\n" in text:
+        text = _TRAILING_SPACE.sub("\n", text)
+    if "\n\n\n" in text:
+        text = _BLANK_LINES.sub("\n\n", text)
+    return text.strip()
+
+
+def _tool_label(params: Any) -> Optional[str]:
+    """One tool call as "tool (what it did)": its description, else the heading it inserted."""
+    if isinstance(params, list):
+        labels = [label for label in (_tool_label(item) for item in params) if label]
+        return "; ".join(labels) or None
+    if not isinstance(params, dict) or not params.get("tool"):
+        return None
+    detail = params.get("description")
+    if not detail:
+        text = params.get("text")
+        text = "".join(text) if isinstance(text, list) else text
+        heading = _HEADING.search(text) if isinstance(text, str) else None
+        detail = html.unescape(_TAG.sub("", heading.group(1))) if heading else None
+    label = f"{params['tool']} ({' '.join(str(detail).split())})" if detail else str(params["tool"])
+    return label if len(label) <= MAX_TOOL_LABEL_CHARS else label[:MAX_TOOL_LABEL_CHARS - 4].rstrip() + " ..."
+
+
+def _turn(message: Any) -> Optional[Turn]:
+    if not isinstance(message, dict):
+        text = _clean(str(message)) if message else ""
+        return ("message", text) if text else None
+    kind = message.get("type") or "message"
+    if kind == "error":
+        return None
+    if kind == "tool":
+        params = message.get("params")
+        if not params and message.get("tool"):
+            params = {"tool": message.get("tool"), "description": message.get("description")}
+        label = _tool_label(params)
+        return ("tool", label) if label else None
+    content = message.get("content", "")
+    if content is None:
+        return None
+    text = _clean(content if isinstance(content, str) else json.dumps(content, ensure_ascii=False))
+    return (kind, text) if text else None
+
+
+def normalize_history(messages: List[Any]) -> List[Turn]:
+    """The planner's messages as (role, text) turns, in order."""
+    turns = [turn for turn in map(_turn, messages) if turn is not None]
+    last_seen: Dict[str, int] = {
+        text: i for i, (role, text) in enumerate(turns) if role == "assistant" and len(text) >= MIN_DEDUP_CHARS
+    }
+
+    normalized: List[Turn] = []
+    for i, (role, text) in enumerate(turns):
+        if role == "assistant" and last_seen.get(text, i) != i:
+            continue
+        # Tool runs are merged after deduplication, which can make two of them adjacent
+        if role == "tool" and normalized and normalized[-1][0] == "tool":
+            normalized[-1] = ("tool", f"{normalized[-1][1]}; {text}")
+        else:
+            normalized.append((role, text))
+    return normalized
+
+
+def history_lines(chat_history: Any) -> Optional[List[str]]:
+    """chat_history as "role: text" lines, or None if it is plain text."""
+    messages = parse_history(chat_history)
+    if messages is None:
+        return None
+    return [f"{role}: {text}" for role, text in normalize_history(messages)]
@@ -0,0 +1,143 @@
+"""
+Reader for JSONL conversation logs
+
+Turns the structured logs written with CONVERSATION_LOG_FORMAT=jsonl back into the
+human-readable text format, on demand. Rotated (<file>.<n>[.gz]) and finalized (<file>.gz)
+segments of a conversation are read in order. Document and chat fields stored as blob
+references, chat deltas or document operations are resolved from the blob store next to the logs.
+
+Usage:
+    python -m backend.utils.conversation_log_reader LOG_FILE [LOG_FILE ...] [--trace TRACE_ID]
+"""
+import argparse
+import gzip
+import json
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from .blob_store import BlobStore
+from .conversation_logger import ConversationLogger, SCHEMA_VERSION, _CHAT_FIELDS, _DOCUMENT_FIELDS
+from .document_delta import DeltaError, apply_ops, is_document
+from .logging_config import get_module_logger
+
+logger = get_module_logger('conversation_log_reader')
+
+# Fields every record carries; the rest are the event's own fields
+_ENVELOPE = {"schema", "type", "ts", "elapsed_s", "conversation_id", "trace_id", "trace_elapsed_ms"}
+
+
+def segment_paths(log_file: Path) -> List[Path]:
+    """All segments of a conversation log, oldest first. log_file may name any of them."""
+    log_file = Path(log_file)
+    base = re.sub(r"(\.\d+)?(\.gz)?$", "", log_file.name)
+    pattern = re.compile(re.escape(base) + r"\.(\d+)(\.gz)?$")
+
+    rotated = []
+    for path in log_file.parent.iterdir():
+        match = pattern.match(path.name)
+        if match:
+            rotated.append((int(match.group(1)), path))
+    segments = [path for _, path in sorted(rotated)]
+    for name in (base, base + ".gz"):
+        if (log_file.parent / name).exists():
+            segments.append(log_file.parent / name)
+    return segments
+
+
+def read_records(log_file: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the records of every segment of log_file in order."""
+    for path in segment_paths(log_file):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    # A crash can leave a partial last line
+                    logger.warning(f"Skipping unreadable record {path}:{line_number}: {e}")
+                    continue
+                if record.get("schema", 0) > SCHEMA_VERSION:
+                    logger.warning(f"{path}:{line_number} uses newer schema {record['schema']}; rendering anyway")
+                yield record
+
+
+class SnapshotResolver:
+    """Turns blob references, chat deltas and document operations back into values. Feed it records in log order."""
+
+    def __init__(self, blob_dir: Path):
+        self.blob_store = BlobStore(blob_dir)
+        self._chats: Dict[str, List[Any]] = {}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+
+    def resolve(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        record = dict(record)
+        for field in _DOCUMENT_FIELDS + _CHAT_FIELDS:
+            if isinstance(record.get(field), dict):
+                record[field] = self._value(record[field])
+        return record
+
+    def _value(self, snapshot: Dict[str, Any]) -> Any:
+        if "inline" in snapshot:
+            return snapshot["inline"]
+        if "blob" in snapshot:
+            value = self.blob_store.get(snapshot["blob"])
+            if isinstance(value, list):
+                self._chats[snapshot["blob"]] = value
+            elif is_document(value):
+                self._documents[snapshot["blob"]] = value
+            return value
+        if "ops" in snapshot:
+            base = self._documents.get(snapshot["base"])
+            try:
+                value = apply_ops(base, snapshot["ops"])
+            except DeltaError as e:
+                logger.warning(f"Document operations do not apply to {snapshot['base']} ({e}); showing the operations")
+                return {"ops": snapshot["ops"]}
+            self._documents[snapshot["hash"]] = value
+            return value
+        if "base" in snapshot:
+            base = self._chats.get(snapshot["base"])
+            if base is None:
+                logger.warning(f"Chat delta refers to unknown history {snapshot['base']}; showing appended messages only")
+                base = []
+            value = base + snapshot["append"]
+            self._chats[snapshot["hash"]] = value
+            return value
+        # Not a snapshot (e.g. a log written before snapshots existed)
+        return snapshot
+
+
+def render_record(record: Dict[str, Any]) -> str:
+    """Render one (resolved) JSONL record exactly as the text format would have written it."""
+    fields = {key: value for key, value in record.items() if key not in _ENVELOPE}
+    return ConversationLogger.render_text(record["type"], datetime.fromisoformat(record["ts"]), fields)
+
+
+def render_text(log_file: Path, trace_id: Optional[str] = None, blob_dir: Optional[Path] = None) -> Iterator[str]:
+    resolver = SnapshotResolver(blob_dir or Path(log_file).parent / "blobs")
+    for record in read_records(log_file):
+        # Resolve every record, even filtered ones: later chat deltas build on them
+        record = resolver.resolve(record)
+        if trace_id and record.get("trace_id") != trace_id:
+            continue
+        yield render_record(record)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render JSONL conversation logs as text")
+    parser.add_argument("log_files", nargs="+", type=Path)
+    parser.add_argument("--trace", help="Only events of this trace id")
+    parser.add_argument("--blobs", type=Path, help="Blob store directory (default: blobs/ next to each log)")
+    args = parser.parse_args()
+
+    for log_file in args.log_files:
+        for text in render_text(log_file, args.trace, args.blobs):
+            sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
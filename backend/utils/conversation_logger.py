@@ -2,14 +2,102 @@
 Conversation Logger for WorldWeaver
 
 This module provides comprehensive logging functionality for user conversations,
-including chat interactions and tutorial sessions.
+including chat interactions and tutorial sessions. Each conversation logs to its own
+file through ConversationLoggerRegistry.
 """
 import os
 import json
+import threading
+import time
+import uuid
+from contextvars import ContextVar, Token
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from .logging_config import get_module_logger
+from .log_writer import AsyncLogWriter
+from .blob_store import BlobStore, blob_hash, canonical_json
+from .document_delta import DeltaError, diff_ops, is_document
+from .metrics import llm_outcomes
+from .request_timing import span
+
+
+TEXT_FORMAT = "text"
+JSONL_FORMAT = "jsonl"
+# Bump when the meaning of existing JSONL fields changes
+SCHEMA_VERSION = 1
+
+_TEXT_RENDERERS = {
+    "session_start": "_render_header",
+    "llm_request": "_render_llm_request",
+    "llm_response": "_render_llm_response",
+    "tutorial_request": "_render_tutorial_request",
+    "tutorial_response": "_render_tutorial_response",
+    "error": "_render_error",
+    "session_end": "_render_session_end",
+    "message": "_render_message",
+    "request_timing": "_render_request_timing",
+}
+
+# JSONL fields stored in the blob store instead of inline (chat fields, and TipTap documents
+# after the first, are written as deltas)
+_DOCUMENT_FIELDS = ("document_context",)
+_CHAT_FIELDS = ("chat_history", "chat_context")
+# Values up to this many characters stay inline
+INLINE_LIMIT = 256
+
+# (trace id, perf_counter at start) of the request being handled in this context
+_trace: ContextVar[Optional[Tuple[str, float]]] = ContextVar("conversation_trace", default=None)
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    """Start timing a request in the current context; its log events carry the trace id."""
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    _trace.set((trace_id, time.perf_counter()))
+    return trace_id
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace[0] if trace else None
+
+
+def _json_line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, default=str, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+_prepared_log_dirs: Dict[str, Path] = {}
+
+
+def _prepare_log_dir(log_dir, logger) -> Path:
+    """Resolve the log directory and check it is writable (once per directory per process)."""
+    if log_dir is None:
+        # Use LOGGING_DIR env var first, then fall back
+        log_dir = os.getenv('LOGGING_DIR')
+        if not log_dir:
+            project_root = Path(__file__).resolve().parents[2]
+            log_dir = project_root / "backend" / "logs"
+
+    key = str(log_dir)
+    if key in _prepared_log_dirs:
+        return _prepared_log_dirs[key]
+
+    log_dir = Path(log_dir)
+    try:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        # Test write permissions
+        test_file = log_dir / f"test_write_{os.getpid()}.tmp"
+        test_file.touch()
+        test_file.unlink()
+    except (PermissionError, OSError) as e:
+        logger.warning(f"Cannot write to log directory {log_dir}: {e}")
+        # Fall back to a temp directory
+        import tempfile
+        log_dir = Path(tempfile.gettempdir()) / "worldweaver_logs"
+        log_dir.mkdir(exist_ok=True)
+        logger.info(f"Using fallback log directory: {log_dir}")
+    _prepared_log_dirs[key] = log_dir
+    return log_dir
 
 
 class ConversationLogger:
@@ -18,11 +106,16 @@ class ConversationLogger:
     Uses Python logger that writes to files in LOGGING_DIR locally and stdout in production.
     """
     
-    def __init__(self, log_dir: str = None):
+    def __init__(self, log_dir: str = None, writer: Optional[AsyncLogWriter] = None, conversation_id: Optional[str] = None,
+                 log_format: str = None):
         """Initialize the conversation logger.
         
         Args:
             log_dir: Directory to store log files. Uses LOGGING_DIR env var or falls back to backend/logs
+            writer: Background writer to share with other loggers (a new one by default)
+            conversation_id: Id of the conversation this logger belongs to, if any
+            log_format: "text" (pretty, human-oriented) or "jsonl" (one JSON event per line).
+                Uses CONVERSATION_LOG_FORMAT env var or "text"
         """
         # Get dedicated logger for conversations
         self.logger = get_module_logger('conversation')
@@ -32,33 +125,25 @@ class ConversationLogger:
         
         if not self.is_deployed:
             # When running locally, also maintain detailed file logging
-            if log_dir is None:
-                # Use LOGGING_DIR env var first, then fall back
-                log_dir = os.getenv('LOGGING_DIR')
-                if not log_dir:
-                    project_root = Path(__file__).resolve().parents[2]
-                    log_dir = project_root / "backend" / "logs"
-            
-            self.log_dir = Path(log_dir)
-            try:
-                self.log_dir.mkdir(parents=True, exist_ok=True)
-                # Test write permissions
-                test_file = self.log_dir / "test_write.tmp"
-                test_file.touch()
-                test_file.unlink()
-            except (PermissionError, OSError) as e:
-                self.logger.warning(f"Cannot write to log directory {self.log_dir}: {e}")
-                # Fall back to a temp directory
-                import tempfile
-                self.log_dir = Path(tempfile.gettempdir()) / "worldweaver_logs"
-                self.log_dir.mkdir(exist_ok=True)
-                self.logger.info(f"Using fallback log directory: {self.log_dir}")
+            self.log_dir = _prepare_log_dir(log_dir, self.logger)
             self.current_log_file = None
         else:
             self.log_dir = None
             self.current_log_file = None
         
+        self.conversation_id = conversation_id
+        self.log_format = log_format or os.getenv('CONVERSATION_LOG_FORMAT', TEXT_FORMAT)
+        # JSONL logs keep document / chat snapshots in a content-addressed store next to the logs
+        self.blob_store = None
+        if self.log_format == JSONL_FORMAT and self.log_dir is not None:
+            self.blob_store = BlobStore.for_dir(self.log_dir / "blobs")
+        self._last_chat = None
+        self._last_chat_hash = None
+        self._last_document = None
+        self._last_document_hash = None
         self.session_start_time = None
+        # File output goes through a background writer so requests never wait on disk I/O
+        self.writer = writer if writer is not None else AsyncLogWriter()
     
     def _log_conversation_event(self, level: str, message: str):
         """Helper method for logging conversation events."""
@@ -81,54 +166,157 @@ class ConversationLogger:
         if not self.is_deployed:
             # Create detailed conversation log file for local environment
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{timestamp}_{username}_conversation.log"
+            if self.conversation_id:
+                # Several conversations can start in the same second
+                filename = f"{timestamp}_{username}_{self.conversation_id[:8]}_conversation{self._suffix}"
+            else:
+                filename = f"{timestamp}_{username}_conversation{self._suffix}"
             self.current_log_file = self.log_dir / filename
             
             # Create the log file with header
-            with open(self.current_log_file, 'w', encoding='utf-8') as f:
-                f.write(self._get_session_header(username))
+            self._emit("session_start", truncate=True, username=username, log_file=filename)
             
             self._log_conversation_event('info', f"Created conversation log file: {self.current_log_file}")
             return str(self.current_log_file)
         else:
             return ""
     
-    def _get_session_header(self, username: str) -> str:
+    @property
+    def _suffix(self) -> str:
+        return ".jsonl" if self.log_format == JSONL_FORMAT else ".log"
+
+    def _emit(self, event_type: str, truncate: bool = False, finalize: bool = False, **fields):
+        """Queue an event for the background writer; formatting happens off the request thread."""
+        with span("log"):
+            timestamp = datetime.now()
+            if self.log_format == JSONL_FORMAT:
+                record = self._jsonl_record(event_type, timestamp, fields)
+                self.writer.submit(self.current_log_file, self._render_jsonl, record, truncate=truncate, finalize=finalize)
+            else:
+                self.writer.submit(self.current_log_file, self.render_text, event_type, timestamp, fields, truncate=truncate)
+
+    def _jsonl_record(self, event_type: str, timestamp: datetime, fields: Dict[str, Any]) -> Dict[str, Any]:
+        record = {
+            "schema": SCHEMA_VERSION,
+            "type": event_type,
+            "ts": timestamp.isoformat(),
+            "elapsed_s": round((timestamp - self.session_start_time).total_seconds(), 6) if self.session_start_time else None,
+            "conversation_id": self.conversation_id,
+            "trace_id": None,
+        }
+        trace = _trace.get()
+        if trace is not None:
+            record["trace_id"] = trace[0]
+            record["trace_elapsed_ms"] = round((time.perf_counter() - trace[1]) * 1000, 3)
+        record.update(fields)
+        return record
+
+    def _render_jsonl(self, record: Dict[str, Any]) -> str:
+        # Runs on the writer thread, in submission order, so the chat delta state needs no lock
+        if self.blob_store is not None:
+            for field in _DOCUMENT_FIELDS:
+                if field in record:
+                    record[field] = self._document_snapshot(record[field])
+            for field in _CHAT_FIELDS:
+                if field in record:
+                    record[field] = self._chat_snapshot(record[field])
+        return _json_line(record)
+
+    def _snapshot(self, value: Any) -> Dict[str, Any]:
+        """Reference to value: inline when small, else a blob hash."""
+        if len(canonical_json(value)) <= INLINE_LIMIT:
+            return {"inline": value}
+        return {"blob": self.blob_store.put(value)}
+
+    def _chat_snapshot(self, chat: Any) -> Dict[str, Any]:
+        """
+        Chat histories only grow between turns: write just the messages appended since the
+        previous record of this conversation, referencing the previous history by hash.
+        """
+        if not isinstance(chat, list):
+            return self._snapshot(chat)
+        chat_hash = blob_hash(chat)
+        last = self._last_chat
+        if last is not None and len(chat) >= len(last) and chat[:len(last)] == last:
+            snapshot = {"base": self._last_chat_hash, "append": chat[len(last):], "hash": chat_hash}
+        else:
+            # First history of this logger, or the history was edited: store it whole
+            snapshot = {"blob": self.blob_store.put(chat)}
+        self._last_chat = chat
+        self._last_chat_hash = chat_hash
+        return snapshot
+
+    def _document_snapshot(self, document: Any) -> Dict[str, Any]:
+        """
+        A planning document usually changes by a block or two between turns: write only the
+        block operations from the previous document of this conversation (see document_delta).
+        """
+        if not is_document(document):
+            return self._snapshot(document)
+        document_hash = blob_hash(document)
+        try:
+            if self._last_document is None:
+                raise DeltaError("No previous document")
+            snapshot = {"base": self._last_document_hash, "ops": diff_ops(self._last_document, document),
+                        "hash": document_hash}
+        except DeltaError:
+            # First document of this logger, or one the operations cannot express: store it whole
+            snapshot = {"blob": self.blob_store.put(document)}
+        self._last_document = document
+        self._last_document_hash = document_hash
+        return snapshot
+
+    @classmethod
+    def render_text(cls, event_type: str, timestamp: datetime, fields: Dict[str, Any]) -> str:
+        """Render one event in the human-readable text format."""
+        return getattr(cls, _TEXT_RENDERERS[event_type])(timestamp, **fields)
+
+    @staticmethod
+    def _render_header(timestamp: datetime, username: str, log_file: str) -> str:
         """Generate the session header for log files."""
         header = f"""
 {'='*80}
                         WORLDWEAVER CONVERSATION LOG
 {'='*80}
 User: {username}
-Session Start: {self.session_start_time.strftime('%Y-%m-%d %H:%M:%S')}
-Log File: {self.current_log_file.name}
+Session Start: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}
+Log File: {log_file}
 {'='*80}
 
 """
         return header
-    
-    def _write_separator(self, title: str = "", char: str = "-", width: int = 80):
-        """Write a formatted separator to the log file."""
-        if not self.current_log_file:
-            return
-            
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            if title:
-                f.write(f"\n{char * width}\n")
-                f.write(f" {title.upper()} ".center(width, char))
-                f.write(f"\n{char * width}\n")
-            else:
-                f.write(f"\n{char * width}\n")
-    
-    def _write_timestamp(self):
-        """Write current timestamp to log file."""
-        if not self.current_log_file:
-            return
-            
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            f.write(f"\n[{timestamp}] ")
-    
+
+    @staticmethod
+    def _separator(title: str = "", char: str = "-", width: int = 80) -> str:
+        """Formatted separator for the log file."""
+        if title:
+            return f"\n{char * width}\n" + f" {title.upper()} ".center(width, char) + f"\n{char * width}\n"
+        return f"\n{char * width}\n"
+
+    @staticmethod
+    def _timestamp(timestamp: datetime) -> str:
+        return f"\n[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] "
+
+    @staticmethod
+    def _pretty_json(value: Any) -> str:
+        """Pretty print JSON (or a JSON string); anything else as str()."""
+        try:
+            data = json.loads(value) if isinstance(value, str) else value
+            return json.dumps(data, indent=2)
+        except:
+            return str(value)
+
+    @staticmethod
+    def _metadata_lines(metadata: Optional[Dict[str, Any]]) -> str:
+        lines = ""
+        if metadata:
+            lines += f"Model: {metadata.get('model', 'unknown')}\n"
+            lines += f"Prompt Name: {metadata.get('prompt_name', 'unknown')}\n"
+            lines += f"Stage: {metadata.get('stage', 'unknown')}\n"
+            if 'stage_title' in metadata:
+                lines += f"Stage Title: {metadata.get('stage_title')}\n"
+        return lines + "\n"
+
     def log_llm_request(self, user_message: str, chat_history: str,
                        document_context: str, frontend_stage: int):
         """
@@ -148,40 +336,34 @@ Log File: {self.current_log_file.name}
             
         if not self.current_log_file:
             return
-            
-        self._write_separator("LLM REQUEST")
-        self._write_timestamp()
-        
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            f.write("LLM REQUEST RECEIVED\n")
-            f.write(f"Stage: {frontend_stage}\n")
-
-            f.write("USER MESSAGE:\n")
-            f.write("-" * 40 + "\n")
-            f.write(f"{user_message}\n")
-            f.write("-" * 40 + "\n\n")
-            
-            if document_context:
-                f.write("DOCUMENT CONTEXT:\n")
-                f.write("-" * 40 + "\n")
-                try:
-                    # Try to pretty print if it's JSON
-                    doc_data = json.loads(document_context) if isinstance(document_context, str) else document_context
-                    f.write(json.dumps(doc_data, indent=2))
-                except:
-                    f.write(str(document_context))
-                f.write("\n" + "-" * 40 + "\n\n")
-            
-            if chat_history:
-                f.write("CHAT HISTORY:\n")
-                f.write("-" * 40 + "\n")
-                try:
-                    # Try to pretty print if it's JSON
-                    chat_data = json.loads(chat_history) if isinstance(chat_history, str) else chat_history
-                    f.write(json.dumps(chat_data, indent=2))
-                except:
-                    f.write(str(chat_history))
-                f.write("\n" + "-" * 40 + "\n\n")
+
+        self._emit("llm_request", user_message=user_message, chat_history=chat_history,
+                   document_context=document_context, frontend_stage=frontend_stage)
+
+    @classmethod
+    def _render_llm_request(cls, timestamp: datetime, user_message: str, chat_history: Any,
+                            document_context: Any, frontend_stage: int) -> str:
+        text = cls._separator("LLM REQUEST") + cls._timestamp(timestamp)
+        text += "LLM REQUEST RECEIVED\n"
+        text += f"Stage: {frontend_stage}\n"
+
+        text += "USER MESSAGE:\n"
+        text += "-" * 40 + "\n"
+        text += f"{user_message}\n"
+        text += "-" * 40 + "\n\n"
+
+        if document_context:
+            text += "DOCUMENT CONTEXT:\n"
+            text += "-" * 40 + "\n"
+            text += cls._pretty_json(document_context)
+            text += "\n" + "-" * 40 + "\n\n"
+
+        if chat_history:
+            text += "CHAT HISTORY:\n"
+            text += "-" * 40 + "\n"
+            text += cls._pretty_json(chat_history)
+            text += "\n" + "-" * 40 + "\n\n"
+        return text
     
     def log_llm_response(self, raw_output: str, processed_output: Dict[str, Any], 
                         processing_type: str = "success", metadata: Optional[Dict[str, Any]] = None):
@@ -198,37 +380,35 @@ Log File: {self.current_log_file.name}
         model = metadata.get('model', 'unknown') if metadata else 'unknown'
         stage = metadata.get('stage', 'unknown') if metadata else 'unknown'
         self._log_conversation_event('info', f"LLM RESPONSE - {model} Stage {stage} ({processing_type}): {len(raw_output)} chars")
+        # Every /llm outcome (json_direct, json_wrapped, string_parsed, fallback, error) passes through here
+        llm_outcomes.inc(processing_type=processing_type)
         
         if self.is_deployed:
             return
             
         if not self.current_log_file:
             return
-            
-        self._write_separator("LLM RESPONSE")
-        self._write_timestamp()
-        
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            f.write(f"LLM RESPONSE PROCESSED ({processing_type.upper()})\n")
-            
-            # Add metadata section if provided
-            if metadata:
-                f.write(f"Model: {metadata.get('model', 'unknown')}\n")
-                f.write(f"Prompt Name: {metadata.get('prompt_name', 'unknown')}\n")
-                f.write(f"Stage: {metadata.get('stage', 'unknown')}\n")
-                if 'stage_title' in metadata:
-                    f.write(f"Stage Title: {metadata.get('stage_title')}\n")
-            f.write("\n")
-            
-            f.write("RAW LLM OUTPUT:\n")
-            f.write("=" * 50 + "\n")
-            f.write(f"{raw_output}\n")
-            f.write("=" * 50 + "\n\n")
-            
-            f.write("PROCESSED JSON OUTPUT:\n")
-            f.write("=" * 50 + "\n")
-            f.write(json.dumps(processed_output, indent=2))
-            f.write("\n" + "=" * 50 + "\n\n")
+
+        self._emit("llm_response", raw_output=raw_output, processed_output=processed_output,
+                   processing_type=processing_type, metadata=metadata)
+
+    @classmethod
+    def _render_llm_response(cls, timestamp: datetime, raw_output: str, processed_output: Dict[str, Any],
+                             processing_type: str, metadata: Optional[Dict[str, Any]]) -> str:
+        text = cls._separator("LLM RESPONSE") + cls._timestamp(timestamp)
+        text += f"LLM RESPONSE PROCESSED ({processing_type.upper()})\n"
+        text += cls._metadata_lines(metadata)
+
+        text += "RAW LLM OUTPUT:\n"
+        text += "=" * 50 + "\n"
+        text += f"{raw_output}\n"
+        text += "=" * 50 + "\n\n"
+
+        text += "PROCESSED JSON OUTPUT:\n"
+        text += "=" * 50 + "\n"
+        text += json.dumps(processed_output, indent=2)
+        text += "\n" + "=" * 50 + "\n\n"
+        return text
     
     def log_tutorial_request(self, stage: int, chat_context: str, document_context: str):
         """
@@ -247,33 +427,27 @@ Log File: {self.current_log_file.name}
             
         if not self.current_log_file:
             return
-            
-        self._write_separator("TUTORIAL REQUEST")
-        self._write_timestamp()
-        
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            f.write("TUTORIAL REQUEST RECEIVED\n")
-            f.write(f"Stage: {stage}\n\n")
-            
-            if chat_context:
-                f.write("CHAT CONTEXT:\n")
-                f.write("-" * 40 + "\n")
-                try:
-                    chat_data = json.loads(chat_context) if isinstance(chat_context, str) else chat_context
-                    f.write(json.dumps(chat_data, indent=2))
-                except:
-                    f.write(str(chat_context))
-                f.write("\n" + "-" * 40 + "\n\n")
-            
-            if document_context:
-                f.write("DOCUMENT CONTEXT:\n")
-                f.write("-" * 40 + "\n")
-                try:
-                    doc_data = json.loads(document_context) if isinstance(document_context, str) else document_context
-                    f.write(json.dumps(doc_data, indent=2))
-                except:
-                    f.write(str(document_context))
-                f.write("\n" + "-" * 40 + "\n\n")
+
+        self._emit("tutorial_request", stage=stage, chat_context=chat_context, document_context=document_context)
+
+    @classmethod
+    def _render_tutorial_request(cls, timestamp: datetime, stage: int, chat_context: Any, document_context: Any) -> str:
+        text = cls._separator("TUTORIAL REQUEST") + cls._timestamp(timestamp)
+        text += "TUTORIAL REQUEST RECEIVED\n"
+        text += f"Stage: {stage}\n\n"
+
+        if chat_context:
+            text += "CHAT CONTEXT:\n"
+            text += "-" * 40 + "\n"
+            text += cls._pretty_json(chat_context)
+            text += "\n" + "-" * 40 + "\n\n"
+
+        if document_context:
+            text += "DOCUMENT CONTEXT:\n"
+            text += "-" * 40 + "\n"
+            text += cls._pretty_json(document_context)
+            text += "\n" + "-" * 40 + "\n\n"
+        return text
     
     def log_tutorial_response(self, raw_output: str, processed_output: Dict[str, Any], 
                              metadata: Optional[Dict[str, Any]] = None):
@@ -294,31 +468,26 @@ Log File: {self.current_log_file.name}
             
         if not self.current_log_file:
             return
-            
-        self._write_separator("TUTORIAL RESPONSE")
-        self._write_timestamp()
-        
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            f.write("TUTORIAL RESPONSE GENERATED\n")
-            
-            # Add metadata section if provided
-            if metadata:
-                f.write(f"Model: {metadata.get('model', 'unknown')}\n")
-                f.write(f"Prompt Name: {metadata.get('prompt_name', 'unknown')}\n")
-                f.write(f"Stage: {metadata.get('stage', 'unknown')}\n")
-                if 'stage_title' in metadata:
-                    f.write(f"Stage Title: {metadata.get('stage_title')}\n")
-            f.write("\n")
-            
-            f.write("RAW TUTORIAL OUTPUT:\n")
-            f.write("=" * 50 + "\n")
-            f.write(f"{raw_output}\n")
-            f.write("=" * 50 + "\n\n")
-            
-            f.write("PROCESSED JSON OUTPUT:\n")
-            f.write("=" * 50 + "\n")
-            f.write(json.dumps(processed_output, indent=2))
-            f.write("\n" + "=" * 50 + "\n\n")
+
+        self._emit("tutorial_response", raw_output=raw_output, processed_output=processed_output, metadata=metadata)
+
+    @classmethod
+    def _render_tutorial_response(cls, timestamp: datetime, raw_output: str, processed_output: Dict[str, Any],
+                                  metadata: Optional[Dict[str, Any]]) -> str:
+        text = cls._separator("TUTORIAL RESPONSE") + cls._timestamp(timestamp)
+        text += "TUTORIAL RESPONSE GENERATED\n"
+        text += cls._metadata_lines(metadata)
+
+        text += "RAW TUTORIAL OUTPUT:\n"
+        text += "=" * 50 + "\n"
+        text += f"{raw_output}\n"
+        text += "=" * 50 + "\n\n"
+
+        text += "PROCESSED JSON OUTPUT:\n"
+        text += "=" * 50 + "\n"
+        text += json.dumps(processed_output, indent=2)
+        text += "\n" + "=" * 50 + "\n\n"
+        return text
     
     def log_error(self, error_type: str, error_message: str, context: Optional[Dict[str, Any]] = None):
         """
@@ -337,20 +506,52 @@ Log File: {self.current_log_file.name}
             
         if not self.current_log_file:
             return
-            
-        self._write_separator("ERROR", char="!")
-        self._write_timestamp()
-        
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            f.write(f"ERROR OCCURRED: {error_type}\n")
-            f.write(f"Error Message: {error_message}\n\n")
-            
-            if context:
-                f.write("ERROR CONTEXT:\n")
-                f.write("-" * 40 + "\n")
-                f.write(json.dumps(context, indent=2, default=str))
-                f.write("\n" + "-" * 40 + "\n\n")
+
+        self._emit("error", error_type=error_type, error_message=error_message, context=context)
+
+    @classmethod
+    def _render_error(cls, timestamp: datetime, error_type: str, error_message: str,
+                      context: Optional[Dict[str, Any]]) -> str:
+        text = cls._separator("ERROR", char="!") + cls._timestamp(timestamp)
+        text += f"ERROR OCCURRED: {error_type}\n"
+        text += f"Error Message: {error_message}\n\n"
+
+        if context:
+            text += "ERROR CONTEXT:\n"
+            text += "-" * 40 + "\n"
+            text += json.dumps(context, indent=2, default=str)
+            text += "\n" + "-" * 40 + "\n\n"
+        return text
     
+    def log_request_timing(self, endpoint: str, total_ms: float, spans: Dict[str, Dict[str, float]]):
+        """
+        Log how long each phase of a (sampled) request took.
+
+        Args:
+            endpoint: Flask endpoint name of the request
+            total_ms: Wall time of the request in milliseconds
+            spans: Phase name -> {"ms": ..., "count": ...} (see backend/utils/request_timing.py)
+        """
+        # Log to Python logger, so timings are visible when deployed too
+        phases = ", ".join(f"{name}={span['ms']:.1f}ms" for name, span in spans.items())
+        self._log_conversation_event('info', f"REQUEST TIMING - {endpoint} {total_ms:.1f}ms: {phases}")
+
+        if self.is_deployed:
+            return
+
+        if not self.current_log_file:
+            return
+
+        self._emit("request_timing", endpoint=endpoint, total_ms=total_ms, spans=spans)
+
+    @classmethod
+    def _render_request_timing(cls, timestamp: datetime, endpoint: str, total_ms: float,
+                               spans: Dict[str, Dict[str, float]]) -> str:
+        text = cls._timestamp(timestamp) + f"REQUEST TIMING ({endpoint}): {total_ms:.1f} ms\n"
+        for name, phase in spans.items():
+            text += f"  {name}: {phase['ms']:.1f} ms ({phase['count']}x)\n"
+        return text
+
     def log_session_end(self):
         """Log the end of a conversation session."""
         # Log to Python logger
@@ -363,19 +564,22 @@ Log File: {self.current_log_file.name}
             
         if not self.current_log_file:
             return
-            
-        self._write_separator("SESSION END")
-        
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            end_time = datetime.now()
-            duration = end_time - self.session_start_time if self.session_start_time else None
-            
-            f.write(f"Session End: {end_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            if duration:
-                f.write(f"Session Duration: {duration}\n")
-            f.write("\n" + "=" * 80 + "\n")
-            f.write("END OF LOG")
-            f.write("\n" + "=" * 80 + "\n")
+
+        self._emit("session_end", finalize=True,
+                   session_start=self.session_start_time.isoformat() if self.session_start_time else None)
+
+    @classmethod
+    def _render_session_end(cls, end_time: datetime, session_start: Optional[str]) -> str:
+        duration = end_time - datetime.fromisoformat(session_start) if session_start else None
+
+        text = cls._separator("SESSION END")
+        text += f"Session End: {end_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        if duration:
+            text += f"Session Duration: {duration}\n"
+        text += "\n" + "=" * 80 + "\n"
+        text += "END OF LOG"
+        text += "\n" + "=" * 80 + "\n"
+        return text
 
     def log_message(self, message: str):
         # Log to Python logger
@@ -386,14 +590,152 @@ Log File: {self.current_log_file.name}
             
         if not self.current_log_file:
             return
+
+        self._emit("message", message=message)
+
+    @staticmethod
+    def _render_message(timestamp: datetime, message: str) -> str:
         char = "*"
         width = 80
-        with open(self.current_log_file, 'a', encoding='utf-8') as f:
-            if message:
-                f.write(f" \n{message.upper()} \n".center(width, char))
+        if message:
+            return f" \n{message.upper()} \n".center(width, char)
+        return f"\n{char * width}\n"
+
+    def flush(self):
+        """Write out everything queued so far (e.g. at shutdown)."""
+        self.writer.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Background writer counters (submitted, flushed, dropped, failed, queued)."""
+        return self.writer.stats()
+
+
+_active_logger: ContextVar[Optional[ConversationLogger]] = ContextVar("active_conversation_logger", default=None)
+
+
+class ConversationLoggerRegistry:
+    """
+    One ConversationLogger per conversation, keyed by the conversation id kept in the Flask
+    session, so concurrent users each log to their own file.
+
+    Request handlers activate their conversation's logger for the current context (request
+    thread or asyncio task); every other attribute access, e.g. conversation_logger.log_message(),
+    is forwarded to the active logger, or to a file-less logger outside any conversation.
+    All loggers share one background writer, which opens files lazily and caps open handles.
+    Loggers unused for idle_timeout seconds are evicted and transparently resumed from the
+    log file path stored in the session on the next request.
+    """
+
+    def __init__(self, log_dir: str = None, idle_timeout: float = None, writer: Optional[AsyncLogWriter] = None,
+                 log_format: str = None):
+        """
+        Args:
+            log_dir: Directory to store log files (see ConversationLogger)
+            idle_timeout: Seconds before an unused logger is evicted. Uses LOG_SESSION_IDLE_TIMEOUT env var or 1800
+            writer: Background writer shared by all loggers (a new one by default)
+            log_format: "text" or "jsonl" (see ConversationLogger). JSONL files are rotated after
+                LOG_ROTATE_BYTES (default 10 MB) or LOG_ROTATE_SECONDS (default one day) and gzipped
+                when closed unless LOG_COMPRESS=0
+        """
+        self.log_dir = log_dir
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv('LOG_SESSION_IDLE_TIMEOUT', '1800'))
+        self.log_format = log_format or os.getenv('CONVERSATION_LOG_FORMAT', TEXT_FORMAT)
+        if writer is None:
+            if self.log_format == JSONL_FORMAT:
+                writer = AsyncLogWriter(
+                    rotate_bytes=int(os.getenv('LOG_ROTATE_BYTES', str(10 * 1024 * 1024))),
+                    rotate_seconds=float(os.getenv('LOG_ROTATE_SECONDS', '86400')),
+                    compress=os.getenv('LOG_COMPRESS', '1') == '1',
+                )
             else:
-                f.write(f"\n{char * width}\n")
+                writer = AsyncLogWriter()
+        self.writer = writer
+        self._fallback = self._new_logger()
+        self._loggers: Dict[str, ConversationLogger] = {}
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.evicted = 0
+
+    def start_conversation(self, conversation_id: str, username: str) -> str:
+        """
+        Create the logger (and log file) for a new conversation.
+
+        Returns:
+            The path to the created log file (or empty string when deployed)
+        """
+        conversation = self._new_logger(conversation_id)
+        log_file = conversation.start_new_conversation(username)
+        with self._lock:
+            self._loggers[conversation_id] = conversation
+            self._last_used[conversation_id] = time.monotonic()
+        self._sweep()
+        return log_file
+
+    def resume_conversation(self, conversation_id: str, log_file: str = "", start_time: Optional[str] = None) -> ConversationLogger:
+        """Logger for an existing conversation; rebuilt from its log file if this process does not hold it."""
+        with self._lock:
+            conversation = self._loggers.get(conversation_id)
+            if conversation is None:
+                # Evicted, or the conversation started in another worker process
+                conversation = self._new_logger(conversation_id)
+                if log_file and not conversation.is_deployed:
+                    conversation.current_log_file = Path(log_file)
+                if start_time:
+                    conversation.session_start_time = datetime.fromisoformat(start_time)
+                self._loggers[conversation_id] = conversation
+            self._last_used[conversation_id] = time.monotonic()
+        self._sweep()
+        return conversation
+
+    def end_conversation(self, conversation_id: str):
+        """Write the session end record and forget the conversation."""
+        with self._lock:
+            conversation = self._loggers.pop(conversation_id, None)
+            self._last_used.pop(conversation_id, None)
+        if conversation is not None:
+            conversation.log_session_end()
+
+    def activate(self, conversation: Optional[ConversationLogger]) -> Token:
+        """Route logging in the current context to conversation; pass the token to deactivate()."""
+        return _active_logger.set(conversation)
+
+    def deactivate(self, token: Token):
+        _active_logger.reset(token)
+
+    def current(self) -> ConversationLogger:
+        conversation = _active_logger.get()
+        return conversation if conversation is not None else self._fallback
+
+    def __getattr__(self, name: str):
+        return getattr(self.current(), name)
+
+    def flush(self):
+        """Write out everything queued so far (e.g. at shutdown)."""
+        self.writer.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Background writer counters plus active / evicted conversation counts."""
+        with self._lock:
+            conversations = len(self._loggers)
+        return dict(self.writer.stats(), conversations=conversations, evicted_conversations=self.evicted)
+
+    def _new_logger(self, conversation_id: Optional[str] = None) -> ConversationLogger:
+        return ConversationLogger(self.log_dir, writer=self.writer, conversation_id=conversation_id, log_format=self.log_format)
+
+    def _sweep(self):
+        now = time.monotonic()
+        # Check at most once a minute; eviction only frees memory, the writer closes idle files itself
+        if now - self._last_sweep < min(60.0, self.idle_timeout):
+            return
+        with self._lock:
+            self._last_sweep = now
+            cutoff = now - self.idle_timeout
+            for conversation_id in [cid for cid, last in self._last_used.items() if last < cutoff]:
+                del self._loggers[conversation_id]
+                del self._last_used[conversation_id]
+                self.evicted += 1
 
 
-# Global logger instance
-conversation_logger = ConversationLogger()
\ No newline at end of file
+# Global logger registry; use it like a ConversationLogger
+conversation_logger = ConversationLoggerRegistry()
\ No newline at end of file
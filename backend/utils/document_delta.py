@@ -0,0 +1,85 @@
+"""
+Block-level deltas for TipTap planning documents
+
+A TipTap document is {"type": "doc", "content": [block, ...]}. Edits are described as
+operations on that top-level block list, which keeps them cheap to compute on both sides
+(compare blocks, no ProseMirror positions) and small for the usual edit of one paragraph:
+
+    {"op": "insert",  "index": i, "nodes": [block, ...]}
+    {"op": "delete",  "index": i, "count": n}
+    {"op": "replace", "index": i, "count": n, "nodes": [block, ...]}
+
+Indexes refer to the document as left by the previous operation.
+"""
+import copy
+from typing import Any, Dict, List, Optional
+
+
+class DeltaError(ValueError):
+    """Operations that do not apply to the document (it is not the one they were made against)."""
+
+
+def is_document(value: Any) -> bool:
+    return isinstance(value, dict) and value.get("type") == "doc"
+
+
+def apply_ops(document: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return a copy of document with ops applied; document itself is not changed."""
+    if not is_document(document):
+        raise DeltaError("Base is not a TipTap document")
+    if not isinstance(ops, list):
+        raise DeltaError("Operations must be a list")
+
+    blocks = list(document.get("content", []))
+    for op in ops:
+        kind = op.get("op") if isinstance(op, dict) else None
+        index = op.get("index") if kind else None
+        if not isinstance(index, int) or not 0 <= index <= len(blocks):
+            raise DeltaError(f"Bad operation {op!r} for a document of {len(blocks)} blocks")
+        count = op.get("count", 0)
+        nodes = op.get("nodes", [])
+        if kind not in ("insert", "delete", "replace") or not isinstance(count, int) or not isinstance(nodes, list) \
+                or count < 0 or index + count > len(blocks):
+            raise DeltaError(f"Bad operation {op!r} for a document of {len(blocks)} blocks")
+        if kind == "insert":
+            count = 0
+        elif kind == "delete":
+            nodes = []
+        blocks[index:index + count] = copy.deepcopy(nodes)
+
+    result = dict(document)
+    result["content"] = blocks
+    return result
+
+
+def diff_ops(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Operations turning old into new: the blocks between their common prefix and suffix
+    are replaced (or just inserted / deleted). Both must be TipTap documents.
+    """
+    if not (is_document(old) and is_document(new)):
+        raise DeltaError("Both sides must be TipTap documents")
+    if {k: v for k, v in old.items() if k != "content"} != {k: v for k, v in new.items() if k != "content"}:
+        raise DeltaError("Documents differ outside their content")
+    a, b = old.get("content", []), new.get("content", [])
+
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[len(a) - 1 - end] == b[len(b) - 1 - end]:
+        end += 1
+
+    removed = len(a) - start - end
+    added = b[start:len(b) - end]
+    if not removed and not added:
+        return []
+    if not removed:
+        return [{"op": "insert", "index": start, "nodes": added}]
+    if not added:
+        return [{"op": "delete", "index": start, "count": removed}]
+    return [{"op": "replace", "index": start, "count": removed, "nodes": added}]
+
+
+def block_count(document: Any) -> Optional[int]:
+    return len(document.get("content", [])) if is_document(document) else None
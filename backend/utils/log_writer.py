@@ -0,0 +1,345 @@
+"""
+Asynchronous log file writer for WorldWeaver
+
+Request threads hand the writer a lightweight record (target path, a render function and
+its arguments) on a bounded queue and return immediately. A single background thread
+renders the records, appends them to files it keeps open, and flushes once per batch.
+When the queue is full new records are dropped and counted rather than blocking the
+request. Everything still queued is written by close(), which runs at interpreter exit.
+
+File handles are opened on first write and kept open, up to max_open_files (least recently
+written closed first); handles that see no writes for idle_close seconds are closed too, so
+many concurrent conversations do not exhaust file descriptors.
+
+Optionally files are rotated once they reach rotate_bytes or have been written for
+rotate_seconds: the full segment is renamed to <file>.<n> and gzipped to <file>.<n>.gz
+when compress is set. A record submitted with finalize=True closes its file afterwards
+(compressing it to <file>.gz), e.g. at the end of a conversation.
+
+Every gunicorn worker has its own writer, and a conversation's requests can land on any of
+them, so each batch of records for a file is written and flushed under an exclusive flock on
+the file, and rotation and finalizing happen under that lock too. A writer that takes the
+lock on a handle whose file was meanwhile renamed or unlinked by another worker reopens the
+path instead of writing into the old inode.
+"""
+import atexit
+import gzip
+import os
+import shutil
+import queue
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Optional
+from .logging_config import get_module_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+logger = get_module_logger('log_writer')
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    """Bounded-queue, single-thread writer for append-only log files."""
+
+    def __init__(self, max_queue: int = None, batch_size: int = 256, flush_interval: float = 0.5,
+                 max_open_files: int = None, idle_close: float = 60.0,
+                 rotate_bytes: int = 0, rotate_seconds: float = 0, compress: bool = False):
+        """
+        Args:
+            max_queue: Records buffered before new ones are dropped. Uses LOG_QUEUE_SIZE env var or 10000
+            batch_size: Most records written between two flushes
+            flush_interval: Seconds the writer waits for more records before flushing a partial batch
+            max_open_files: Most file handles kept open. Uses LOG_MAX_OPEN_FILES env var or 128
+            idle_close: Seconds without writes after which a file handle is closed
+            rotate_bytes: Rotate a file once it holds this many characters (0: never)
+            rotate_seconds: Rotate a file once its segment is this old (0: never)
+            compress: Gzip rotated and finalized files
+        """
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_open_files = max(1, max_open_files if max_open_files is not None else int(os.getenv('LOG_MAX_OPEN_FILES', '128')))
+        self.idle_close = idle_close
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+
+        self._sizes: Dict[Path, int] = {}
+        self._segment_started: Dict[Path, float] = {}
+        self._handles: "OrderedDict[Path, IO[str]]" = OrderedDict()
+        self._last_write: Dict[Path, float] = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.opened = 0
+        self.rotated = 0
+        atexit.register(self.close)
+
+    def submit(self, path: Path, render: Callable[..., str], *args: Any, truncate: bool = False, finalize: bool = False) -> bool:
+        """
+        Queue render(*args) to be written to path. Never blocks.
+
+        Args:
+            path: Target log file
+            render: Called on the writer thread; returns the text to write
+            truncate: Start the file afresh instead of appending
+            finalize: Close (and compress) the file after this record
+
+        Returns:
+            False if the record was dropped because the queue is full
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((Path(path), render, args, truncate, finalize))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Write everything still queued, then close all files."""
+        with self._lock:
+            thread, q = self._thread, self._queue
+            if thread is None or self._pid != os.getpid():
+                return
+            self._thread = None
+        # Blocking put: the stop marker must not be dropped
+        q.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Log writer did not drain within {timeout}s ({q.qsize()} records left)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "open_files": len(self._handles),
+            "opened_files": self.opened,
+            "rotated_files": self.rotated,
+        }
+
+    def _ensure_started(self):
+        # Started lazily, and again in a forked child: threads do not survive a fork
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._handles = OrderedDict()
+            self._last_write = {}
+            self._sizes = {}
+            self._segment_started = {}
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name="log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self, q: queue.Queue):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [q.get(timeout=self.idle_close)]
+            except queue.Empty:
+                self._close_idle()
+                continue
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(q.get(timeout=self.flush_interval) if len(batch) == 1 else q.get_nowait())
+            except queue.Empty:
+                pass
+
+            if _STOP in batch:
+                stopping = True
+                # Keep draining whatever was queued before the stop marker
+                batch = [record for record in batch if record is not _STOP]
+                while True:
+                    try:
+                        record = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is not _STOP:
+                        batch.append(record)
+            self._write_batch(batch)
+            self._close_idle()
+
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+        self._last_write.clear()
+
+    def _write_batch(self, batch):
+        # Each file's records are written in submission order under one hold of its lock
+        by_path: Dict[Path, list] = {}
+        for path, *record in batch:
+            by_path.setdefault(path, []).append(record)
+        for path, records in by_path.items():
+            self._write_file(path, records)
+
+    def _write_file(self, path: Path, records):
+        locked = False
+        try:
+            for render, args, truncate, finalize in records:
+                try:
+                    text = render(*args)
+                    if not locked:
+                        self._acquire(path)
+                        locked = True
+                    if truncate:
+                        self._truncate(path)
+                    elif self._due_for_rotation(path):
+                        # Rotating closes the handle, which releases the lock
+                        locked = False
+                        self._rotate(path)
+                        self._acquire(path)
+                        locked = True
+                    self._handles[path].write(text)
+                    self._sizes[path] += len(text)
+                    self.flushed += 1
+                    if finalize:
+                        locked = False
+                        self._finalize(path)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to write log record to {path}: {e}")
+                    locked = locked and path in self._handles
+        finally:
+            if locked:
+                self._release(path)
+
+    def _acquire(self, path: Path) -> IO[str]:
+        """
+        The handle for path, holding the file's lock. Reopens the path if another process
+        rotated or finalized the file since the handle was opened.
+        """
+        while True:
+            handle = self._handle(path)
+            if fcntl is None:
+                break
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.stat(path).st_ino == os.fstat(handle.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            self._close(path)  # closing releases the lock on the old inode
+        # Other processes append too, so the size is taken from the file on every acquire
+        self._sizes[path] = os.fstat(handle.fileno()).st_size
+        self._segment_started.setdefault(path, time.monotonic())
+        return handle
+
+    def _release(self, path: Path):
+        handle = self._handles.get(path)
+        if handle is None:
+            return
+        try:
+            handle.flush()
+        except OSError as e:
+            logger.error(f"Failed to flush {path}: {e}")
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _truncate(self, path: Path):
+        self._handles[path].truncate(0)
+        self._sizes[path] = 0
+        self._segment_started[path] = time.monotonic()
+
+    def _due_for_rotation(self, path: Path) -> bool:
+        if not (self.rotate_bytes or self.rotate_seconds) or not self._sizes[path]:
+            return False
+        if self.rotate_bytes and self._sizes[path] >= self.rotate_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.monotonic() - self._segment_started[path] >= self.rotate_seconds
+
+    def _rotate(self, path: Path):
+        """Rename the locked file to its next segment and close it (releasing the lock)."""
+        self._handles[path].flush()
+        index = 1
+        while self._segment_path(path, index).exists() or Path(f"{self._segment_path(path, index)}.gz").exists():
+            index += 1
+        segment = self._segment_path(path, index)
+        try:
+            # Renamed while still locked: processes waiting for the lock then see a new inode
+            os.replace(path, segment)
+        except FileNotFoundError:
+            # Already gone; the record starts a new file instead of being dropped
+            self._close(path)
+            return
+        self._close(path)
+        self._segment_started[path] = time.monotonic()
+        self.rotated += 1
+        if self.compress:
+            self._gzip(segment)
+
+    def _finalize(self, path: Path):
+        """Compress the locked file if compress is set, then close it (releasing the lock)."""
+        self._handles[path].flush()
+        try:
+            if self.compress and path.exists():
+                self._gzip(path)
+        finally:
+            self._close(path)
+            self._segment_started.pop(path, None)
+
+    @staticmethod
+    def _segment_path(path: Path, index: int) -> Path:
+        return path.with_name(f"{path.name}.{index}")
+
+    @staticmethod
+    def _gzip(path: Path):
+        target = path.with_name(path.name + ".gz")
+        tmp = path.with_name(path.name + ".gz.tmp")
+        with open(tmp, 'wb') as out:
+            # A file finalized again (another worker wrote to it afterwards) is added to the
+            # existing archive as a further gzip member; gzip readers concatenate members
+            if target.exists():
+                with open(target, 'rb') as previous:
+                    shutil.copyfileobj(previous, out)
+            with open(path, 'rb') as source, gzip.GzipFile(fileobj=out, mode='wb') as compressed:
+                shutil.copyfileobj(source, compressed)
+        os.replace(tmp, target)
+        path.unlink()
+
+    def _handle(self, path: Path) -> IO[str]:
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+            self._last_write[path] = time.monotonic()
+            return handle
+        while len(self._handles) >= self.max_open_files:
+            self._close(next(iter(self._handles)))
+        # Always appended to: truncating records empty the file under its lock instead
+        handle = self._handles[path] = open(path, 'a', encoding='utf-8')
+        self._last_write[path] = time.monotonic()
+        self.opened += 1
+        return handle
+
+    def _close(self, path: Path):
+        handle = self._handles.pop(path)
+        self._last_write.pop(path, None)
+        self._sizes.pop(path, None)  # re-read from disk if the file is reopened
+        try:
+            handle.close()
+        except OSError as e:
+            logger.error(f"Failed to close {path}: {e}")
+
+    def _close_idle(self):
+        cutoff = time.monotonic() - self.idle_close
+        for path in [path for path, last in self._last_write.items() if last < cutoff]:
+            if path in self._handles:
+                self._close(path)
@@ -8,6 +8,7 @@ This module provides logging setup that follows the requirements:
 import os
 import logging
 import sys
+from functools import lru_cache
 from pathlib import Path
 from logging.handlers import RotatingFileHandler
 from typing import Optional
@@ -87,9 +88,11 @@ def setup_logging(logger_name: str = "worldweaver", level: str = "INFO") -> logg
     return logger
 
 
+@lru_cache(maxsize=None)
 def _is_containerized_environment() -> bool:
     """
     Detect if running in a containerized environment (Docker, Kubernetes, etc.)
+    Cached: every module logger asks, and the answer cannot change while running.
     
     Returns:
         True if running in a container, False otherwise
@@ -157,8 +160,12 @@ def _get_log_directory() -> Optional[Path]:
         Path to log directory or None if creation fails
     """
     # Check for LOGGING_DIR environment variable first
-    logging_dir = os.getenv('LOGGING_DIR')
-    
+    return _prepare_log_directory(os.getenv('LOGGING_DIR'))
+
+
+@lru_cache(maxsize=None)
+def _prepare_log_directory(logging_dir: Optional[str]) -> Optional[Path]:
+    """Create and test the log directory, once per directory."""
     if logging_dir:
         log_dir = Path(logging_dir)
     else:
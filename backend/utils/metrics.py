@@ -0,0 +1,305 @@
+"""
+Metrics for WorldWeaver
+
+A small in-process registry of counters, gauges and histograms rendered in the Prometheus
+text exposition format by the /metrics route.
+
+Multiple worker processes: when METRICS_DIR is set (gunicorn.conf.py sets it), every
+process writes a snapshot of its metrics to METRICS_DIR/metrics_<pid>.json at most every
+METRICS_FLUSH_INTERVAL seconds (default 1), and a scrape served by any worker sums the
+snapshots of all processes. Counters and histograms of exited workers keep counting
+toward the totals; gauges only include live processes.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .logging_config import get_module_logger
+
+logger = get_module_logger('metrics')
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SIZE_BUCKETS = (500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000)
+
+_COUNTER = "counter"
+_GAUGE = "gauge"
+_HISTOGRAM = "histogram"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = [[list(key), value if not isinstance(value, list) else list(value)]
+                       for key, value in self._values.items()]
+        return {"type": self.kind, "help": self.documentation, "labels": list(self.labelnames), "samples": samples}
+
+
+class Counter(_Metric):
+    kind = _COUNTER
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.changed()
+
+
+class Gauge(_Metric):
+    kind = _GAUGE
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.changed()
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+        self.registry.changed()
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Count the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = _HISTOGRAM
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-2] += value
+            state[-1] += 1
+        self.registry.changed()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them, merged across worker processes."""
+
+    def __init__(self, metrics_dir: Optional[str] = None, flush_interval: float = None):
+        metrics_dir = metrics_dir or os.getenv('METRICS_DIR')
+        self.metrics_dir = Path(metrics_dir) if metrics_dir else None
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))
+        self._metrics: Dict[str, _Metric] = {}
+        self._dirty = threading.Event()
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self._write_snapshot)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def changed(self):
+        if self.metrics_dir is None:
+            return
+        self._ensure_flusher()
+        self._dirty.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def render(self) -> str:
+        """Prometheus text exposition of all processes' metrics."""
+        merged = self._merge(self._all_snapshots())
+        lines: List[str] = []
+        for name, metric in sorted(merged.items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in sorted(metric["samples"].items()):
+                labels = list(zip(metric["labels"], key))
+                if metric["type"] != _HISTOGRAM:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric["buckets"] + ["+Inf"], value[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+    # Multi-process ________________________________
+
+    def _all_snapshots(self) -> List[Tuple[Dict[str, Any], bool]]:
+        """(snapshot, process alive) for this process and every other process in metrics_dir."""
+        snapshots = [(self.snapshot(), True)]
+        if self.metrics_dir is None or not self.metrics_dir.is_dir():
+            return snapshots
+        own = f"metrics_{os.getpid()}.json"
+        for path in self.metrics_dir.glob("metrics_*.json"):
+            if path.name == own:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((snapshot, _pid_alive(int(path.stem.split("_")[1]))))
+        return snapshots
+
+    @staticmethod
+    def _merge(snapshots: List[Tuple[Dict[str, Any], bool]]) -> Dict[str, Any]:
+        merged: Dict[str, Any] = {}
+        for snapshot, alive in snapshots:
+            for name, metric in snapshot.items():
+                if metric["type"] == _GAUGE and not alive:
+                    continue
+                target = merged.setdefault(name, dict(metric, samples={}))
+                for key, value in metric["samples"]:
+                    key = tuple(key)
+                    if key not in target["samples"]:
+                        target["samples"][key] = list(value) if isinstance(value, list) else value
+                    elif isinstance(value, list):
+                        target["samples"][key] = [a + b for a, b in zip(target["samples"][key], value)]
+                    else:
+                        target["samples"][key] += value
+        return merged
+
+    def _ensure_flusher(self):
+        # Started lazily, and again in a forked worker: threads do not survive a fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._dirty = threading.Event()
+            self._thread = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            self._write_snapshot()
+            time.sleep(self.flush_interval)
+
+    def _write_snapshot(self):
+        if self.metrics_dir is None or self._pid != os.getpid():
+            return
+        try:
+            self.metrics_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.metrics_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self.metrics_dir / f"metrics_{os.getpid()}.json")
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _labels(pairs: List[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# Global registry and the application's metrics
+metrics = MetricsRegistry()
+
+llm_latency = metrics.histogram(
+    "worldweaver_llm_latency_seconds", "Upstream model call latency", ("stage", "model"))
+prompt_size = metrics.histogram(
+    "worldweaver_prompt_chars", "Characters sent to the model per call", ("stage", "model"), SIZE_BUCKETS)
+response_size = metrics.histogram(
+    "worldweaver_response_chars", "Characters received from the model per call", ("stage", "model"), SIZE_BUCKETS)
+llm_outcomes = metrics.counter(
+    "worldweaver_llm_responses_total", "LLM responses by how their output was processed", ("processing_type",))
+llm_calls_in_flight = metrics.gauge(
+    "worldweaver_llm_calls_in_flight", "Upstream model calls currently running", ("model",))
+request_latency = metrics.histogram(
+    "worldweaver_request_latency_seconds", "Request latency by endpoint", ("endpoint",))
+requests_in_flight = metrics.gauge(
+    "worldweaver_requests_in_flight", "Requests currently being handled", ("endpoint",))
+stage_summaries = metrics.counter(
+    "worldweaver_stage_summaries_total", "Background stage summaries by outcome", ("outcome",))
+summarized_tokens = metrics.counter(
+    "worldweaver_summarized_tokens_total", "Estimated tokens of summarized stage chats (kind=chat) and of their summaries (kind=summary)", ("kind",))
@@ -0,0 +1,215 @@
+"""
+Opt-in per-request profiler for WorldWeaver
+
+A statistical profiler: while a profiled request runs, a sampler thread records the
+request thread's Python stack every PROFILE_INTERVAL_MS milliseconds (default 5). When
+the request ends, the samples are written to PROFILE_DIR as a folded-stacks file
+(<name>.folded, one "outer;...;inner count" line per distinct stack) which flamegraph.pl,
+speedscope and similar tools read directly, plus a small <name>.json with request details.
+
+Profiling is requested per request, either with an X-Profile header signed with
+PROFILE_SECRET or ADMIN_TOKEN (see make_profile_token) or by arming the next N requests
+of a worker process from the admin routes. Nothing is sampled unless a request asks for
+it; unprofiled requests pay one header lookup.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from .logging_config import get_module_logger
+
+logger = get_module_logger('profiler')
+
+PROFILE_HEADER = "X-Profile"
+_TOKEN_SALT = "worldweaver-profile"
+
+
+def make_profile_token(secret_key: str, issued_by: str = "") -> str:
+    """Signed, timestamped value for the X-Profile header."""
+    return URLSafeTimedSerializer(secret_key, salt=_TOKEN_SALT).dumps({"by": issued_by})
+
+
+def check_profile_token(secret_key: str, token: str, max_age: int) -> bool:
+    try:
+        URLSafeTimedSerializer(secret_key, salt=_TOKEN_SALT).loads(token, max_age=max_age)
+        return True
+    except BadSignature:
+        return False
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", Path(code.co_filename).stem)
+    # No line numbers: a function should be one box in a flamegraph
+    return f"{module}:{code.co_name}"
+
+
+class _Sampler:
+    """Samples one thread's stack on a background thread until stopped."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        return time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            # Folded stacks are written root first
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class RequestProfiler:
+    """Profiles individual requests on demand and keeps the results in profile_dir."""
+
+    def __init__(self, profile_dir: Optional[str] = None, interval_ms: float = None, max_profiles: int = None):
+        """
+        Args:
+            profile_dir: Where profiles are written. Uses PROFILE_DIR env var or <tmp>/worldweaver_profiles
+            interval_ms: Sampling interval. Uses PROFILE_INTERVAL_MS env var or 5
+            max_profiles: Oldest profiles beyond this many are deleted. Uses PROFILE_MAX_PROFILES env var or 100
+        """
+        self.profile_dir = Path(profile_dir or os.getenv('PROFILE_DIR') or Path(tempfile.gettempdir()) / "worldweaver_profiles")
+        self.interval = (interval_ms if interval_ms is not None else float(os.getenv('PROFILE_INTERVAL_MS', '5'))) / 1000
+        self.max_profiles = max_profiles if max_profiles is not None else int(os.getenv('PROFILE_MAX_PROFILES', '100'))
+        self._armed = 0
+        self._lock = threading.Lock()
+
+    def arm(self, requests: int) -> int:
+        """Profile the next `requests` eligible requests handled by this process."""
+        with self._lock:
+            self._armed = max(0, requests)
+            return self._armed
+
+    @property
+    def armed(self) -> int:
+        return self._armed
+
+    def take_armed(self) -> bool:
+        """Consume one armed request, if any."""
+        if not self._armed:
+            return False
+        with self._lock:
+            if not self._armed:
+                return False
+            self._armed -= 1
+            return True
+
+    def start(self, thread_id: Optional[int] = None) -> _Sampler:
+        """Start sampling thread_id (the calling thread by default)."""
+        sampler = _Sampler(thread_id or threading.get_ident(), self.interval)
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler: _Sampler, endpoint: str, trace_id: Optional[str] = None) -> Optional[str]:
+        """Stop sampling and write the profile. Returns the profile's name."""
+        duration = sampler.stop()
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{endpoint}_{os.getpid()}"
+        details = {
+            "name": name,
+            "endpoint": endpoint,
+            "trace_id": trace_id,
+            "pid": os.getpid(),
+            "duration_ms": round(duration * 1000, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": sampler.samples,
+        }
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.profile_dir / f"{name}.folded", 'w', encoding='utf-8') as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            with open(self.profile_dir / f"{name}.json", 'w', encoding='utf-8') as f:
+                json.dump(details, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Failed to write profile {name}: {e}")
+            return None
+        logger.info(f"Profiled {endpoint} ({details['duration_ms']:.0f} ms, {sampler.samples} samples): {name}")
+        self._prune()
+        return name
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Details of the stored profiles, newest first."""
+        profiles = []
+        for path in sorted(self.profile_dir.glob("*.json"), reverse=True):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def folded(self, name: str) -> Optional[str]:
+        """The profile's folded stacks, or None if there is no such profile."""
+        path = self._profile_path(name)
+        if path is None:
+            return None
+        return path.read_text(encoding='utf-8')
+
+    def top(self, name: str, limit: int = 30) -> Optional[List[Dict[str, Any]]]:
+        """Functions by self and total samples (a flat view of the folded stacks)."""
+        folded = self.folded(name)
+        if folded is None:
+            return None
+        own, total = Counter(), Counter()
+        samples = 0
+        for line in folded.splitlines():
+            stack, _, count = line.rpartition(" ")
+            frames = stack.split(";")
+            count = int(count)
+            samples += count
+            own[frames[-1]] += count
+            # Count each function once per stack, even when it recurses
+            for frame in set(frames):
+                total[frame] += count
+        return [
+            {"frame": frame, "self": own[frame], "total": count,
+             "self_pct": round(100 * own[frame] / samples, 1), "total_pct": round(100 * count / samples, 1)}
+            for frame, count in sorted(total.items(), key=lambda item: (-own[item[0]], -item[1]))[:limit]
+        ]
+
+    def _profile_path(self, name: str) -> Optional[Path]:
+        # Names come from URLs: only accept plain file names
+        if not name or Path(name).name != name:
+            return None
+        path = self.profile_dir / f"{name}.folded"
+        return path if path.is_file() else None
+
+    def _prune(self):
+        profiles = sorted(self.profile_dir.glob("*.folded"))
+        for path in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            for stale in (path, path.with_suffix(".json")):
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+
+
+# Global profiler
+request_profiler = RequestProfiler()
@@ -0,0 +1,116 @@
+"""
+Per-request phase timing for WorldWeaver
+
+A sampled request gets a RequestTiming in its context (request thread or asyncio task);
+code anywhere below the route wraps a phase in `with span("name"):` and the time is added
+to that phase. Phases that run more than once (e.g. logging) are summed. The route turns
+the result into a Server-Timing response header and a request_timing conversation log event.
+
+Requests that are not sampled have no RequestTiming, and span() returns a shared no-op
+context manager, so instrumented code costs one ContextVar lookup per span.
+
+TRACE_SAMPLE_RATE sets the fraction of requests timed (default 0.01; 1 times every request).
+"""
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+
+class RequestTiming:
+    """Accumulated phase durations of one request."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}
+        # Spans may end on worker threads (asyncio.to_thread, single-flight leaders)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            total = self.spans.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, phases in the order they first ran, plus the total so far."""
+        with self._lock:
+            parts = [f"{name};dur={seconds * 1000:.1f}" for name, (seconds, _) in self.spans.items()]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+    def record(self) -> Dict[str, Dict[str, float]]:
+        """Phase name -> {"ms": total milliseconds, "count": times it ran}."""
+        with self._lock:
+            return {name: {"ms": round(seconds * 1000, 3), "count": count} for name, (seconds, count) in self.spans.items()}
+
+
+class _Span:
+    __slots__ = ("timing", "name", "start")
+
+    def __init__(self, timing: RequestTiming, name: str):
+        self.timing = timing
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timing.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+
+
+def start_request_timing(endpoint: str, sample_rate: Optional[float] = None) -> Optional[RequestTiming]:
+    """Time the request handled in the current context if it is sampled; returns its RequestTiming or None."""
+    rate = SAMPLE_RATE if sample_rate is None else sample_rate
+    timing = RequestTiming(endpoint) if rate > 0 and random.random() < rate else None
+    _timing.set(timing)
+    return timing
+
+
+def resume_request_timing(timing: Optional[RequestTiming]):
+    """Continue timing a request in another context (e.g. a generator run after the view returned)."""
+    _timing.set(timing)
+
+
+def stop_request_timing() -> Optional[RequestTiming]:
+    """Stop timing in the current context and return what was recorded, if anything."""
+    timing = _timing.get()
+    _timing.set(None)
+    return timing
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _timing.get()
+
+
+def span(name: str):
+    """Context manager adding the block's duration to phase name of the current request, if timed."""
+    timing = _timing.get()
+    if timing is None:
+        return _NO_SPAN
+    return _Span(timing, name)
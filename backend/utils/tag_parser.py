@@ -0,0 +1,178 @@
+"""
+Incremental <message>/<document> tag parser for WorldWeaver
+
+Single-pass state machine that accepts model output in chunks (as it streams from the
+model) and emits message text deltas and finished document tool payloads as soon as
+their tags allow. close() produces the same {"type": "both"|"message"|"document"}
+result that the old regex-based parse_string produced for the complete output.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MESSAGE_DELTA = "message_delta"
+MESSAGE = "message"
+DOCUMENT = "document"
+
+_NO_JSON = object()
+
+
+def _partial_suffix(buf: str, start: int, tag: str) -> int:
+    """Length of the longest suffix of buf[start:] that is a proper prefix of tag."""
+    # Tags contain a single "<", so a partial tag can only start at the last "<"
+    i = buf.rfind("<", max(start, len(buf) - len(tag) + 1))
+    if i == -1 or not tag.startswith(buf[i:]):
+        return 0
+    return len(buf) - i
+
+
+class _TagScanner:
+    """
+    Finds <tag>...</tag> spans in a chunked stream. Matches the semantics of
+    re.findall(r"<tag>(.*?)</tag>", text, re.DOTALL) over the concatenated input.
+    """
+    __slots__ = ("open_tag", "close_tag", "inside", "pending", "parts")
+
+    def __init__(self, tag: str):
+        self.open_tag = f"<{tag}>"
+        self.close_tag = f"</{tag}>"
+        self.inside = False
+        self.pending = ""
+        self.parts: List[str] = []
+
+    def feed(self, chunk: str, on_text: Optional[Callable[[str], None]] = None) -> List[str]:
+        """
+        Consume a chunk.
+
+        Args:
+            chunk: Next piece of model output
+            on_text: Called with content text as soon as it is known to be inside the tag
+
+        Returns:
+            Contents of every span closed by this chunk
+        """
+        buf = self.pending + chunk if self.pending else chunk
+        pos = 0
+        completed = []
+        while True:
+            if not self.inside:
+                i = buf.find(self.open_tag, pos)
+                if i == -1:
+                    keep = _partial_suffix(buf, pos, self.open_tag)
+                    self.pending = buf[len(buf) - keep:] if keep else ""
+                    return completed
+                pos = i + len(self.open_tag)
+                self.inside = True
+            else:
+                i = buf.find(self.close_tag, pos)
+                if i == -1:
+                    # Hold back anything that could be the start of the closing tag
+                    keep = _partial_suffix(buf, pos, self.close_tag)
+                    end = len(buf) - keep
+                    if end > pos:
+                        text = buf[pos:end]
+                        self.parts.append(text)
+                        if on_text:
+                            on_text(text)
+                    self.pending = buf[end:] if keep else ""
+                    return completed
+                if i > pos:
+                    text = buf[pos:i]
+                    self.parts.append(text)
+                    if on_text:
+                        on_text(text)
+                completed.append("".join(self.parts))
+                self.parts = []
+                pos = i + len(self.close_tag)
+                self.inside = False
+
+
+class TagStreamParser:
+    """
+    Incremental parser for model output containing <message> and <document> tags.
+
+    feed() returns a list of (event, value) tuples:
+    - ("message_delta", text): message text as it arrives (unstripped)
+    - ("message", text): a complete, stripped message
+    - ("document", payload): a complete document; parsed JSON when valid, else the stripped string
+    """
+
+    def __init__(self):
+        self._messages = _TagScanner("message")
+        self._documents = _TagScanner("document")
+        self._chunks: List[str] = []
+        self._streamed_message = False
+        self._message_texts: List[str] = []
+        self._document_payloads: List[Tuple[str, Any]] = []  # (stripped raw, parsed JSON or _NO_JSON)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        events: List[Tuple[str, Any]] = []
+
+        def on_message_text(text: str):
+            # Separate consecutive messages the same way the final result joins them
+            if len(self._messages.parts) == 1 and self._streamed_message:
+                text = "\n\n" + text
+            self._streamed_message = True
+            events.append((MESSAGE_DELTA, text))
+
+        for message in self._messages.feed(chunk, on_message_text):
+            message = message.strip()
+            if message:
+                self._message_texts.append(message)
+                events.append((MESSAGE, message))
+
+        for raw_doc in self._documents.feed(chunk):
+            raw_doc = raw_doc.strip()
+            if not raw_doc:
+                continue
+            try:
+                parsed = json.loads(raw_doc)
+            except json.JSONDecodeError:
+                parsed = _NO_JSON
+            self._document_payloads.append((raw_doc, parsed))
+            events.append((DOCUMENT, raw_doc if parsed is _NO_JSON else parsed))
+
+        return events
+
+    def close(self) -> Dict[str, Any]:
+        """Return the final result for everything fed so far."""
+        message_content = "\n\n".join(self._message_texts) if self._message_texts else None
+
+        # Use the last valid JSON document, else the last non-empty document as plain string
+        document_content = None
+        for raw_doc, parsed in reversed(self._document_payloads):
+            if parsed is not _NO_JSON:
+                document_content = parsed
+                break
+        if document_content is None and self._document_payloads:
+            document_content = self._document_payloads[-1][0]
+
+        if message_content and document_content:
+            return {
+                "type": "both",
+                "text": message_content,
+                "document": document_content
+            }
+        elif message_content:
+            return {
+                "type": "message",
+                "text": message_content
+            }
+        elif document_content:
+            return {
+                "type": "document",
+                "document": document_content
+            }
+        return {
+            "type": "message",
+            "text": "".join(self._chunks)
+        }
+
+
+def parse_tags(input_str: str) -> Dict[str, Any]:
+    """Parse a complete model output in one pass."""
+    parser = TagStreamParser()
+    parser.feed(input_str)
+    return parser.close()
@@ -0,0 +1,111 @@
+"""
+Compact text rendering of TipTap planning documents
+
+The planner sends its document as TipTap (ProseMirror) JSON, which is mostly structure:
+"type", "content", "attrs" and "marks" wrappers around a little text. Prompts only need the
+text and its outline, so documents are rendered as markdown-like text before they reach a
+model: "#" headings (which keep "Stage N: ..." section headings recognizable), "- " and
+"1. " list items, "> " quotes, fenced code blocks and "---" rules. Marks are dropped.
+
+Every node type of the editor's StarterKit is handled; unknown nodes contribute their text.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+
+def parse_document(document: Any) -> Optional[Dict[str, Any]]:
+    """The TipTap document in document (a dict or its JSON), or None if it is not one."""
+    if isinstance(document, str):
+        if not document.lstrip().startswith("{"):
+            return None
+        try:
+            document = json.loads(document)
+        except ValueError:
+            return None
+    if isinstance(document, dict) and document.get("type") == "doc":
+        return document
+    return None
+
+
+def _inline(node: Dict[str, Any]) -> str:
+    parts = []
+    for child in node.get("content", ()):
+        kind = child.get("type")
+        if kind == "text":
+            parts.append(child.get("text", ""))
+        elif kind == "hardBreak":
+            parts.append("\n")
+        elif "content" in child:
+            parts.append(_inline(child))
+    return "".join(parts)
+
+
+def _render(node: Dict[str, Any], lines: List[str]):
+    """Append node's lines to lines."""
+    kind = node.get("type")
+    if kind == "paragraph":
+        text = _inline(node).strip()
+        if text:
+            lines.extend(text.split("\n"))
+    elif kind == "heading":
+        text = " ".join(_inline(node).split())
+        if text:
+            level = (node.get("attrs") or {}).get("level") or 1
+            lines.append("#" * level + " " + text)
+    elif kind in ("bulletList", "orderedList", "taskList"):
+        number = (node.get("attrs") or {}).get("start") or 1
+        for item in node.get("content", ()):
+            if kind == "orderedList":
+                marker = f"{number}. "
+                number += 1
+            elif kind == "taskList":
+                marker = "- [x] " if (item.get("attrs") or {}).get("checked") else "- [ ] "
+            else:
+                marker = "- "
+            item_lines: List[str] = []
+            for child in item.get("content", ()):
+                _render(child, item_lines)
+            if item_lines:
+                indent = " " * len(marker)
+                lines.append(marker + item_lines[0])
+                lines.extend(indent + line for line in item_lines[1:])
+    elif kind == "blockquote":
+        quoted: List[str] = []
+        for child in node.get("content", ()):
+            _render(child, quoted)
+        lines.extend("> " + line for line in quoted)
+    elif kind == "codeBlock":
+        language = (node.get("attrs") or {}).get("language") or ""
+        lines.append("```" + language)
+        lines.extend(_inline(node).split("\n"))
+        lines.append("```")
+    elif kind == "horizontalRule":
+        lines.append("---")
+    elif kind == "text":
+        text = node.get("text", "").strip()
+        if text:
+            lines.extend(text.split("\n"))
+    elif "content" in node:
+        for child in node["content"]:
+            _render(child, lines)
+
+
+def block_text(node: Dict[str, Any]) -> str:
+    """One node (usually a top-level block) as compact text, without a trailing newline."""
+    lines: List[str] = []
+    _render(node, lines)
+    return "\n".join(lines)
+
+
+def document_text(document: Dict[str, Any]) -> str:
+    """A whole TipTap document as compact text, one line per paragraph, heading or list item."""
+    lines: List[str] = []
+    for child in document.get("content", ()):
+        _render(child, lines)
+    return "\n".join(lines)
+
+
+def compact_document(document: Any) -> Any:
+    """document as compact text if it is a TipTap document (or its JSON), else unchanged."""
+    node = parse_document(document)
+    return document if node is None else document_text(node)
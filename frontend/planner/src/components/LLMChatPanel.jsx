@@ -3,6 +3,7 @@ import MessageList from './llm_components/MessageList.jsx';
 import ChatInput from './llm_components/ChatInput.jsx';
 import { createUserMessage, createAssistantMessage, createToolMessage, createErrorMessage } from './llm_components/MessageItem';
 import { useStage, useStageEvents, STAGE_EVENTS } from '../StageContext.jsx';
+import { documentOps } from './llm_components/documentDelta.js';
 
 const ChatPanel = ({ editorRef, onLoadingChange }) => {
     // This is the shared state that both components will use
@@ -15,6 +16,11 @@ const ChatPanel = ({ editorRef, onLoadingChange }) => {
     const { linearStage } = useStage();
     const stageHistoryRef = useRef({});
     const globalHistoryRef = useRef(null);
+    // The server keeps the conversation; we send only what it has not seen.
+    // revisionRef is the server's revision we last saw (null = upload everything),
+    // sentDocRef the serialized document the server has.
+    const revisionRef = useRef(null);
+    const sentDocRef = useRef(null);
     // Function to add a message to the list
     const addMessage = (message) => {
         setMessages(prev => [...prev, message]);
@@ -71,15 +77,19 @@ const ChatPanel = ({ editorRef, onLoadingChange }) => {
                 body: JSON.stringify({
                     stage: newStage.linear,
                     chat_context: " ",
-                    doc_context: " "
+                    doc_context: " ",
+                    revision: revisionRef.current
                 })
             });
             if (!response.ok) {
                 throw new Error(`Server error: ${response.status}`);
             }
             else {
-                // response should be { type: "message", text:"tutorial text..."}
+                // response should be { type: "message", text:"tutorial text...", revision }
                 const tutorialMessage = await response.json();
+                if (tutorialMessage.revision !== undefined) {
+                    revisionRef.current = tutorialMessage.revision;
+                }
                 return tutorialMessage.text;
             }
         } catch (error) {
@@ -150,6 +160,66 @@ const ChatPanel = ({ editorRef, onLoadingChange }) => {
     });
 
 
+    // Read a server-sent event stream, calling onEvent(event, data) per frame
+    const readEventStream = async (response, onEvent) => {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                for (const line of frame.split('\n')) {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+    };
+
+    // POST a chat turn. In sync with the server only the new message (and the document's
+    // changes, if any) is sent; otherwise, or when the server answers 409, the full history too.
+    const postTurn = async (userInput, history, docContext) => {
+        const docJSON = JSON.stringify(docContext ?? null);
+        const send = (full) => {
+            const body = { text: userInput, stage: linearStage, revision: full ? null : revisionRef.current };
+            if (full) {
+                body.chat_history = history;
+                body.document = docContext;
+            } else if (docJSON !== sentDocRef.current) {
+                // Usually a block or two changed: send just those, unless that is no smaller
+                const ops = sentDocRef.current ? documentOps(JSON.parse(sentDocRef.current), docContext) : null;
+                if (ops && JSON.stringify(ops).length < docJSON.length) {
+                    body.document_ops = ops;
+                    body.document_length = docContext.content?.length ?? 0;
+                } else {
+                    body.document = docContext;
+                }
+            }
+            return fetch('/llm/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(body)
+            });
+        };
+
+        let response = await send(revisionRef.current === null);
+        if (response.status === 409) {
+            // Out of sync with the server (another tab, or it lost our state): resync
+            response = await send(true);
+        }
+        return { response, docJSON };
+    };
+
     // Function that ChatInput will call when user sends a message
     const handleSendMessage = async (userInput) => {
         // 1. Add user message to the chat
@@ -159,30 +229,65 @@ const ChatPanel = ({ editorRef, onLoadingChange }) => {
         // 2. Set loading state
         setIsLoading(true);
 
+        // Placeholder assistant message that is filled in as the response streams
+        const streamingMessage = createAssistantMessage('');
+        let streamingShown = false;
+        const updateStreamingMessage = (content) => {
+            if (!streamingShown) {
+                streamingShown = true;
+                setMessages(prev => [...prev, { ...streamingMessage, content }]);
+            } else {
+                setMessages(prev => prev.map(msg => msg.id === streamingMessage.id ? { ...msg, content } : msg));
+            }
+        };
+        const removeStreamingMessage = () => {
+            if (streamingShown) {
+                setMessages(prev => prev.filter(msg => msg.id !== streamingMessage.id));
+                streamingShown = false;
+            }
+        };
+
         try {
             // 3. Get document context from editor (if available)
             const docContext = editorRef?.current?.getJSON();
 
-            // 4. Send to your /llm endpoint
+            // 4. Send to the streaming /llm endpoint
             // console.log("Current Stage: ", linearStage);
-            const response = await fetch('/llm', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    text: userInput,
-                    document: docContext,
-                    chat_history: messages,
-                    stage: linearStage
-                })
-            });
+            const { response, docJSON } = await postTurn(userInput, messages, docContext);
 
             if (!response.ok) {
                 throw new Error(`Server error: ${response.status}`);
             }
 
-            const data = await response.json();
+            let streamedText = '';
+            let data = null;
+            await readEventStream(response, (event, payload) => {
+                if (event === 'message') {
+                    // <message> text deltas, already stripped of tags by the server
+                    streamedText += payload.text;
+                    if (streamedText.trim()) {
+                        setIsLoading(false);
+                        updateStreamingMessage(streamedText.trim());
+                    }
+                } else if (event === 'done') {
+                    data = payload;
+                }
+            });
+
+            if (!data) {
+                throw new Error('Stream ended without a response');
+            }
+
+            if (data.revision !== undefined) {
+                // The server recorded this turn, and has the document we sent
+                revisionRef.current = data.revision;
+                sentDocRef.current = docJSON;
+            } else {
+                revisionRef.current = null;
+            }
+
+            // The final payload replaces whatever was streamed
+            removeStreamingMessage();
 
             // 5. Handle different response types
             if (data.type === 'tool') {
@@ -226,6 +331,7 @@ const ChatPanel = ({ editorRef, onLoadingChange }) => {
 
         } catch (error) {
             console.error('Error sending message:', error);
+            removeStreamingMessage();
 
             // Add error message to chat
             const errorMessage = createErrorMessage(
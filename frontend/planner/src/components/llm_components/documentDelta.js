@@ -0,0 +1,32 @@
+// Block-level operations between two TipTap documents, in the format the server applies
+// (backend/utils/document_delta.py): the top-level blocks between the common prefix and
+// suffix of the two documents are replaced. Returns null when only a full upload will do.
+export const documentOps = (oldDoc, newDoc) => {
+    if (oldDoc?.type !== 'doc' || newDoc?.type !== 'doc') {
+        return null;
+    }
+    const a = (oldDoc.content ?? []).map(block => JSON.stringify(block));
+    const b = (newDoc.content ?? []).map(block => JSON.stringify(block));
+
+    let start = 0;
+    while (start < a.length && start < b.length && a[start] === b[start]) {
+        start++;
+    }
+    let end = 0;
+    while (end < a.length - start && end < b.length - start && a[a.length - 1 - end] === b[b.length - 1 - end]) {
+        end++;
+    }
+
+    const count = a.length - start - end;
+    const nodes = (newDoc.content ?? []).slice(start, b.length - end);
+    if (!count && !nodes.length) {
+        return [];
+    }
+    if (!count) {
+        return [{ op: 'insert', index: start, nodes }];
+    }
+    if (!nodes.length) {
+        return [{ op: 'delete', index: start, count }];
+    }
+    return [{ op: 'replace', index: start, count, nodes }];
+};
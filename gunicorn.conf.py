@@ -0,0 +1,85 @@
+"""
+gunicorn configuration for running WorldWeaver in production.
+
+    gunicorn -c gunicorn.conf.py
+
+Environment:
+    PORT             port to bind (default 5002)
+    WEB_CONCURRENCY  worker processes (default: one per CPU core)
+    GUNICORN_THREADS request threads per worker (default 8, sync mode only)
+    GUNICORN_TIMEOUT worker timeout in seconds (default 300, matches nginx proxy_read_timeout)
+    ASGI=1           run uvicorn workers serving async /llm and /tutorial
+    METRICS_DIR      where workers share metrics snapshots for /metrics (default: a fresh temp dir)
+    METRICS_TOKEN    require "Authorization: Bearer <token>" on /metrics. Unset, /metrics is
+                     public and exposes per-stage traffic and model names: set it, or keep
+                     /metrics off the public proxy
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+asgi_mode = os.environ.get("ASGI", "0") == "1"
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5002')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app (and parse every prompt) once in the master, then fork
+preload_app = True
+
+if asgi_mode:
+    wsgi_app = "backend.scripts.wsgi:asgi_application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "backend.scripts.wsgi:application"
+    worker_class = "gthread"
+
+# Every worker writes its metrics here so /metrics can report all of them
+if "METRICS_DIR" not in os.environ:
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="worldweaver_metrics_")
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    """Drop metrics left by a previous run so counters start from zero."""
+    metrics_dir = os.environ["METRICS_DIR"]
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "metrics_*.json")):
+        os.remove(path)
+
+
+def when_ready(server):
+    """
+    Import the model SDK once in the master (it is otherwise imported on first use), so
+    forked workers share it instead of each importing it while warming up. Only the import
+    happens here; clients and their channels are still built per worker.
+    """
+    from backend.agents.client_pool import vertex_sdk
+
+    try:
+        vertex_sdk()
+    except ImportError as e:
+        server.log.warning(f"Model SDK not preloaded: {e}")
+
+
+def post_worker_init(worker):
+    """Build this worker's LLM clients before it starts accepting requests."""
+    from backend.agents.warmup import finish_warmup, warm_clients
+    from backend.scripts.routes import app, processor
+
+    warm_clients(processor, stub=app.config.get("STUB", False))
+    finish_warmup()
+    worker.log.info("Worker warm")
+
+
+def worker_exit(server, worker):
+    """Write out any conversation log records still queued in this worker."""
+    from backend.utils.conversation_logger import conversation_logger
+
+    conversation_logger.flush()
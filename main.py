@@ -1,4 +1,5 @@
-from backend.scripts.routes import app
+from backend.scripts.routes import app, processor
+from backend.agents.warmup import warmup
 from backend.scripts.dbmodels import SessionLocal, User
 from backend.utils.logging_config import get_logger
 import argparse
@@ -44,18 +45,28 @@ if __name__ == "__main__":
         
         parser = argparse.ArgumentParser()
         parser.add_argument("--stub", action="store_true", help="Enable stub mode")
+        parser.add_argument("--asgi", action="store_true", help="Serve /llm and /tutorial asynchronously under uvicorn")
         args = parser.parse_args()
 
         # put the stub flag into Flask's config
         app.config["STUB"] = args.stub
         logger.info(f"Stub mode: {args.stub}")
 
+        # Load all stage prompts and build the LLM clients before taking traffic
+        warmup(processor, stub=args.stub)
+
         import os
         port = int(os.environ.get("PORT", 5002))
         logger.info(f"Starting server on 0.0.0.0:{port}")
         logger.info(f"DEV_MODE: {os.environ.get('DEV_MODE', 'not set')}")
         
-        app.run(host="0.0.0.0", port=port, debug=False)
+        if args.asgi or os.environ.get("ASGI", "0") == "1":
+            import uvicorn
+            from backend.scripts.asgi import application
+            logger.info("Serving in ASGI mode (async /llm and /tutorial)")
+            uvicorn.run(application, host="0.0.0.0", port=port)
+        else:
+            app.run(host="0.0.0.0", port=port, debug=False)
     except Exception as e:
         logger.error(f"Failed to start application: {e}")
         import traceback